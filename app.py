@@ -1,22 +1,28 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import os
+import queue
 import threading
-import fitz  # PyMuPDF
 
-# 
-def extract_text_from_pdf(file_path):
+from jobs import JobQueue, QueueFull
+
+# summarizer (pandas, matplotlib, weasyprint...) pencere açıldıktan sonra arka planda yükleniyor
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+def load_summarizer():
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            import summarizer
+            _summarizer = summarizer
+    return _summarizer
+
+def prewarm():
     try:
-        doc = fitz.open(file_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text
+        load_summarizer().warm_up()
     except Exception as e:
-        return "" # Hata durumunda boş string döndürecek
-
-# summarizer.pydan fonksiyonları import etme
-from summarizer import summarize_10k_report, summarize_8k_report
+        print(f"Prewarm error: {e}")
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -30,6 +36,7 @@ class ReportSummarizerApp(ctk.CTk):
 
         #dosya yolu
         self.selected_file = None
+        self.last_report = None
         self.report_type = ctk.StringVar(value="10-K")
 
         # Başlık
@@ -47,53 +54,97 @@ class ReportSummarizerApp(ctk.CTk):
         self.select_button.pack(pady=15)
 
         # Generate butonu
-        self.generate_button = ctk.CTkButton(self, text="Generate Report", command=self.generate_report_threaded)
+        self.generate_button = ctk.CTkButton(self, text="Generate Report", command=self.generate_report)
         self.generate_button.pack(pady=15)
 
+        # Cancel butonu: çalışan işi (extraction / model çağrısı) iptal ediyor
+        self.cancel_button = ctk.CTkButton(self, text="Cancel", command=self.cancel_report, state="disabled")
+        self.cancel_button.pack(pady=5)
+
         # Status label
         self.status_label = ctk.CTkLabel(self, text="", font=("Arial", 14))
         self.status_label.pack(pady=10)
+        self.queue_label = ctk.CTkLabel(self, text="", font=("Arial", 12))
+        self.queue_label.pack(pady=5)
+
+        # Tek worker thread + sınırlı kuyruk; worker widget'lara dokunmuyor,
+        # olaylar self.events üzerinden after() ile ana thread'de işleniyor
+        self.events = queue.Queue()
+        self.jobs = JobQueue(on_event=self.events.put)
+        self.after(100, self.poll_jobs)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Ağır modülleri pencere göründükten sonra yükle
+        self.after(100, lambda: threading.Thread(target=prewarm, daemon=True).start())
 
     def select_file(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("PDF Files", "*.pdf")]
+            filetypes=[("Filings", "*.pdf *.htm *.html"), ("PDF Files", "*.pdf"), ("iXBRL / HTML", "*.htm *.html")]
         )
         if file_path:
             self.selected_file = file_path
             self.status_label.configure(text=f"Selected: {os.path.basename(file_path)}")
 
-    def generate_report_threaded(self):
-        # Thread kullanarak UI donmasını önlüyoz
-        thread = threading.Thread(target=self.generate_report)
-        thread.start()
-
     def generate_report(self):
         if not self.selected_file:
             messagebox.showerror("Error", "Please select a PDF file first.")
             return
-
-        self.status_label.configure(text="Processing... Please wait.")
-
-        # PDFten metin çıkarma
-        extracted_text = extract_text_from_pdf(self.selected_file)
-
-        # Metin boş veya çok kısaysa hata alma dummy pdfler için
-        if len(extracted_text.strip()) < 50: # avg karakter sayısını tespit edersem düzenlerim
-            messagebox.showerror("Error", "The selected PDF is empty or does not contain enough text for analysis.")
-            self.status_label.configure(text="❌ Error occurred")
+        try:
+            job, created = self.jobs.submit(self.selected_file, self.report_type.get())
+        except QueueFull as e:
+            messagebox.showerror("Error", f"The queue is full. {e}")
             return
-
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not read the file:\n{e}")
+            return
+        if not created:
+            # Aynı dosya zaten kuyrukta / çalışıyor, ikinci model çağrısı yok
+            self.status_label.configure(text=f"{job.name} is already queued.")
+        self.refresh_status()
+
+    def cancel_report(self):
+        job = self.jobs.cancel()
+        if job is not None:
+            self.status_label.configure(text=f"Cancelling {job.name}...")
+
+    def poll_jobs(self):
+        # Ana thread: worker'dan gelen olayları uygula
+        finished = []
         try:
-            if self.report_type.get() == "10-K":
-                summarize_10k_report(self.selected_file)
-            else:
-                summarize_8k_report(self.selected_file)
-
-            self.status_label.configure(text="✅ Report generated successfully!")
+            while True:
+                job = self.events.get_nowait()
+                if job.finished and job not in finished:
+                    finished.append(job)
+        except queue.Empty:
+            pass
+        self.refresh_status(finished)
+        for job in finished:
+            if job.state == "failed":
+                messagebox.showerror("Error", f"{job.name}: an error occurred:\n{job.error}")
+        if any(job.state == "done" for job in finished) and self.jobs.running is None and not self.jobs.pending():
             messagebox.showinfo("Success", "Report has been generated and saved.")
-        except Exception as e:
-            self.status_label.configure(text="❌ Error occurred")
-            messagebox.showerror("Error", f"An error occurred:\n{e}")
+        self.after(100, self.poll_jobs)
+
+    def refresh_status(self, finished=()):
+        running = self.jobs.running
+        pending = self.jobs.pending()
+        for job in finished:
+            if job.state == "done":
+                # Sonuç summarizer tarafından results store'a da kaydediliyor
+                self.last_report = job.result
+                self.status_label.configure(text=f"✅ {job.name}: report generated successfully!")
+            elif job.state == "cancelled":
+                self.status_label.configure(text=f"Cancelled {job.name}")
+            else:
+                self.status_label.configure(text=f"❌ {job.name}: error occurred")
+        if running is not None:
+            self.status_label.configure(text=f"{running.name}: {running.stage_label or 'Starting'}...")
+        self.queue_label.configure(text=f"{len(pending)} queued" if pending else "")
+        self.cancel_button.configure(state="normal" if running is not None else "disabled")
+
+    def on_close(self):
+        self.jobs.close()
+        self.destroy()
 
 if __name__ == "__main__":
     app = ReportSummarizerApp()
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from extraction import FilingDocument, extract_document
+from ixbrl import HTML_SUFFIXES
+import rendering
+from summarizer import (MIN_TEXT_CHARS, PACK_MAX_FILINGS, analyze_8k_reports_packed, analyze_stage, is_empty_report,
+                        render_stage, save_stage)
+
+
+_FORM_RE = re.compile(r"\bFORM\s+(10-K|8-K)\b", re.IGNORECASE)
+
+
+# Input discovery
+# ------------------------------
+def detect_report_type(document: FilingDocument, path: str) -> str:
+    # The cover page names the form first; later "Form 10-K" mentions in an 8-K don't count
+    doc_type = (document.facts or {}).get("document_type")
+    if doc_type in ("10-K", "8-K"):
+        return doc_type
+    head = "".join(document.pages[:3])[:20000]
+    m = _FORM_RE.search(head)
+    if m:
+        return m.group(1).upper()
+    name = Path(path).name.lower().replace("-", "").replace("_", "")
+    return "8-K" if "8k" in name else "10-K"
+
+
+def collect_inputs(source: str) -> List[Tuple[str, Optional[str]]]:
+    # A directory of PDFs / iXBRL .htm files, or a manifest file with one "path[,type]" per line
+    src = Path(source)
+    if src.is_dir():
+        return [(str(p.resolve()), None) for p in sorted(src.iterdir())
+                if p.suffix.lower() in (".pdf",) + HTML_SUFFIXES]
+    items = []
+    for line in src.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        path, _, kind = line.partition(",")
+        p = Path(path.strip())
+        if not p.is_absolute():
+            p = src.parent / p
+        items.append((str(p.resolve()), kind.strip().upper() or None))
+    return items
+
+
+# Status manifest
+# ------------------------------
+class BatchStatus:
+    # Per-file progress persisted as JSON after every change so an interrupted
+    # batch can be resumed; a file is redone if its size or mtime changed.
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            self.entries: Dict[str, dict] = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.entries = {}
+
+    @staticmethod
+    def _fingerprint(file_path: str) -> dict:
+        st = os.stat(file_path)
+        return {"size": st.st_size, "mtime": st.st_mtime}
+
+    def is_done(self, file_path: str) -> bool:
+        entry = self.entries.get(file_path)
+        if not entry or entry.get("status") != "done":
+            return False
+        try:
+            fp = self._fingerprint(file_path)
+        except FileNotFoundError:
+            return False
+        return entry.get("size") == fp["size"] and entry.get("mtime") == fp["mtime"]
+
+    def update(self, file_path: str, **fields) -> None:
+        with self._lock:
+            entry = self.entries.setdefault(file_path, {})
+            entry.update(fields)
+            entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+            if fields.get("status") == "done":
+                entry.update(self._fingerprint(file_path))
+                entry.pop("error", None)
+            self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+# Pipeline stages
+# ------------------------------
+def _warm_worker() -> None:
+    # A failed warm-up (missing fonts / pango) must not break the pool: extraction still works
+    # and rendering reports its own error per file
+    try:
+        rendering.warm_up()
+    except Exception as e:
+        print(f"Worker warm-up error: {e}")
+
+
+def _extract_stage(path: str) -> Tuple[FilingDocument, str]:
+    document = extract_document(path)
+    return document, detect_report_type(document, path)
+
+
+def _analyze_stage(kind: str, document: FilingDocument, refresh: bool):
+    return analyze_stage(kind, document, refresh=refresh)
+
+
+def _analyze_8k_pack_stage(documents: List[FilingDocument], refresh: bool) -> List[Optional[object]]:
+    # Several 8-Ks per model request; None marks a filing that still got no usable result
+    return [None if is_empty_report(report) else report
+            for report in analyze_8k_reports_packed(documents, refresh=refresh)]
+
+
+def _render_stage(kind: str, report, output_dir: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    return render_stage(kind, report, output_dir)
+
+
+def _save_stage(kind: str, report, document: FilingDocument, pdf_path: str) -> str:
+    save_stage(kind, report, document, pdf_path)
+    return pdf_path
+
+
+def run_batch(inputs: List[Tuple[str, Optional[str]]], output_dir: str, status_path: str,
+              cpu_workers: Optional[int] = None, model_workers: int = 4, refresh: bool = False,
+              resume: bool = True, pack_8k: bool = False) -> Dict[str, dict]:
+    # Extraction and rendering run in a process pool, model calls in a thread pool;
+    # the stages of different files overlap. At most `max_inflight` files are held
+    # in memory between stages. pack_8k=True collects extracted 8-Ks and analyzes
+    # up to PACK_MAX_FILINGS of them per model request.
+    status = BatchStatus(Path(status_path))
+    queue = [(p, k) for p, k in inputs if not (resume and status.is_done(p))]
+    skipped = len(inputs) - len(queue)
+    if skipped:
+        print(f"Skipping {skipped} already processed file(s)")
+
+    cpu_workers = cpu_workers or os.cpu_count() or 1
+    max_inflight = cpu_workers + model_workers * 2 + (PACK_MAX_FILINGS if pack_8k else 0)
+    forced_types = dict(queue)
+    queue.reverse()
+
+    # CPU workers parse the report stylesheets and fonts once, at startup
+    with ProcessPoolExecutor(max_workers=cpu_workers, initializer=_warm_worker) as cpu, ThreadPoolExecutor(max_workers=model_workers) as io:
+        pending = {}
+        pack: List[Tuple[str, FilingDocument]] = []  # extracted 8-Ks waiting for a packed request
+        # Held from extraction / analysis until the result is saved with its PDF path
+        documents: Dict[str, FilingDocument] = {}
+        reports: Dict[str, object] = {}
+
+        def feed():
+            while queue and len(pending) + len(pack) < max_inflight:
+                path, _ = queue.pop()
+                status.update(path, status="extracting")
+                pending[cpu.submit(_extract_stage, path)] = ("extract", path, None)
+
+        def flush_pack():
+            # Full pack, or nothing left to extract that could join it
+            extracting = any(stage == "extract" for stage, _, _ in pending.values())
+            if pack and (len(pack) >= PACK_MAX_FILINGS or not extracting):
+                paths = [p for p, _ in pack]
+                pending[io.submit(_analyze_8k_pack_stage, [d for _, d in pack], refresh)] = ("pack", paths, "8-K")
+                pack.clear()
+
+        feed()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, path, kind = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    for p in (path if stage == "pack" else [path]):
+                        print(f"[{stage}] {os.path.basename(p)} failed: {e}")
+                        status.update(p, status="failed", error=f"{stage}: {e}")
+                        documents.pop(p, None)
+                        reports.pop(p, None)
+                    continue
+
+                if stage == "extract":
+                    document, detected = result
+                    kind = forced_types.get(path) or detected
+                    status.update(path, status="analyzing", type=kind, pages=document.page_count)
+                    documents[path] = document
+                    # Too-short filings take the single path, which rejects them like everywhere else
+                    if pack_8k and kind == "8-K" and len(document.text.strip()) >= MIN_TEXT_CHARS:
+                        pack.append((path, document))
+                    else:
+                        pending[io.submit(_analyze_stage, kind, document, refresh)] = ("analyze", path, kind)
+                elif stage in ("analyze", "pack"):
+                    for p, report in (zip(path, result) if stage == "pack" else [(path, result)]):
+                        if report is None:
+                            print(f"[{stage}] {os.path.basename(p)} failed: model returned no usable result")
+                            status.update(p, status="failed", error=f"{stage}: model returned no usable result")
+                            documents.pop(p, None)
+                            continue
+                        status.update(p, status="rendering")
+                        reports[p] = report
+                        out = os.path.join(output_dir, Path(p).stem)
+                        pending[cpu.submit(_render_stage, kind, report, out)] = ("render", p, kind)
+                elif stage == "render":
+                    save = io.submit(_save_stage, kind, reports.pop(path), documents.pop(path), result)
+                    pending[save] = ("save", path, kind)
+                else:
+                    status.update(path, status="done", output=result)
+                    print(f"Done: {os.path.basename(path)}")
+            feed()
+            flush_pack()
+    return status.entries
+
+
+# CLI
+# ------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Summarize a directory or manifest of 10-K / 8-K filings.")
+    parser.add_argument("source", help="directory of PDFs, or a manifest file with one 'path[,type]' per line")
+    parser.add_argument("-o", "--output-dir", default="reports", help="where PDF reports are written")
+    parser.add_argument("--status", help="status manifest path (default: <output-dir>/batch_status.json)")
+    parser.add_argument("--type", choices=["auto", "10-K", "8-K"], default="auto", help="force the report type")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="processes for extraction and rendering")
+    parser.add_argument("--model-workers", type=int, default=4, help="concurrent model calls")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached model responses")
+    parser.add_argument("--no-resume", action="store_true", help="reprocess files already marked done")
+    parser.add_argument("--pack-8k", action="store_true", help="analyze several small 8-Ks per model request")
+    args = parser.parse_args(argv)
+
+    inputs = collect_inputs(args.source)
+    if args.type != "auto":
+        inputs = [(p, args.type) for p, _ in inputs]
+    status_path = args.status or os.path.join(args.output_dir, "batch_status.json")
+    entries = run_batch(inputs, args.output_dir, status_path, args.cpu_workers, args.model_workers,
+                        args.refresh, not args.no_resume, args.pack_8k)
+
+    failed = [p for p, _ in inputs if entries.get(p, {}).get("status") != "done"]
+    print(f"{len(inputs) - len(failed)}/{len(inputs)} filings done, status in {status_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks import synthetic  # noqa: E402  (works as a script and as benchmarks.pipeline)
+
+
+STAGES = ["extraction", "financials", "normalize", "tokenization", "model_call", "validation",
+          "charting", "html_render", "pdf_write"]
+# Timed (with peak memory) around the pipeline calls themselves
+PHASES = ["extraction", "analyze", "render"]
+
+# A stage only counts as a regression past both limits (noise floor for tiny stages)
+DEFAULT_TOLERANCE = 0.25
+MIN_DELTA_SECONDS = 0.02
+
+DEFAULT_CASES = ["10-K:60", "10-K:250", "8-K:4"]
+
+
+class StageTimer:
+    # Wall time and peak traced allocation per stage
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.memory:
+            tracemalloc.reset_peak()
+            start_mem = tracemalloc.get_traced_memory()[0]
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = {"seconds": time.perf_counter() - t}
+            if self.memory:
+                entry["peak_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - start_mem)
+            self.stages[name] = entry
+
+
+class SpanCollector:
+    # Keeps every span the pipeline emits (tracing exporter); stage times are read from them
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span) -> None:
+        self.spans.append(span)
+
+    def close(self) -> None:
+        pass
+
+    def seconds(self, name: str) -> float:
+        return sum(s.duration for s in self.spans if s.name == name)
+
+    def total(self, name: str, attr: str) -> int:
+        return sum(s.attrs.get(attr) or 0 for s in self.spans if s.name == name)
+
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        t = self.seconds
+        seconds = {
+            "extraction": t("extract"),
+            "financials": t("financials"),
+            "normalize": t("normalize"),
+            # Section selection and preflight token counting
+            "tokenization": t("prompt"),
+            "model_call": t("generate"),
+            "validation": t("validate"),
+            "charting": t("charts"),
+            # The render span also holds the charts and the PDF write
+            "html_render": max(0.0, t("render") - t("charts") - t("pdf")),
+            "pdf_write": t("pdf"),
+        }
+        return {name: {"seconds": seconds[name]} for name in STAGES}
+
+
+# One pipeline run, stage by stage
+# ------------------------------
+def run_once(kind: str, pdf_path: str, out_dir: str, memory: bool = True) -> Dict[str, Any]:
+    # The real analyze / render stages with the caches off, so every stage does its full work;
+    # per-stage times come from the pipeline's own tracing spans
+    import cache
+    import summarizer
+    import tracing
+    from extraction import extract_document
+
+    collector = SpanCollector()
+    tracing.set_exporters([collector])
+    timer = StageTimer(memory)
+    try:
+        with timer.stage("extraction"):
+            document = extract_document(pdf_path, use_cache=False)
+        # Token counts are cached on disk (in main's temporary REPORT_CACHE_DIR); drop them so
+        # every run counts the pages again
+        shutil.rmtree(cache.CACHE_DIR / "text", ignore_errors=True)
+        with timer.stage("analyze"):
+            report = summarizer.analyze_stage(kind, document, use_cache=False)
+        with timer.stage("render"):
+            summarizer.render_stage(kind, report, out_dir)
+    finally:
+        tracing.set_exporters(None)
+
+    return {
+        "pages": document.page_count,
+        "prompt_tokens": collector.total("route", "prompt_tokens"),
+        "stages": collector.stages(),
+        "phases": timer.stages,
+    }
+
+
+def run_case(case: str, work_dir: Path, repeat: int, memory: bool, latency: float) -> Dict[str, Any]:
+    kind, _, pages = case.partition(":")
+    pages = int(pages or (100 if kind == "10-K" else 4))
+    pdf_path = str(work_dir / f"synthetic_{kind}_{pages}.pdf")
+    if kind == "10-K":
+        synthetic.make_10k(pdf_path, pages)
+    else:
+        synthetic.make_8k(pdf_path, pages)
+
+    runs = []
+    for _ in range(repeat):
+        runs.append(run_once(kind, pdf_path, str(work_dir), memory))
+
+    stages = {name: {"seconds": statistics.median(r["stages"][name]["seconds"] for r in runs)}
+              for name in STAGES}
+    phases = {}
+    for name in PHASES:
+        entry = {"seconds": statistics.median(r["phases"][name]["seconds"] for r in runs)}
+        if memory:
+            entry["peak_bytes"] = max(r["phases"][name]["peak_bytes"] for r in runs)
+        phases[name] = entry
+    return {
+        "case": f"{kind}:{pages}",
+        "kind": kind,
+        "pages": runs[0]["pages"],
+        "prompt_tokens": runs[0]["prompt_tokens"],
+        "model_latency": latency,
+        "stages": stages,
+        "phases": phases,
+        "total_seconds": sum(p["seconds"] for p in phases.values()),
+    }
+
+
+def max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+# Baseline comparison
+# ------------------------------
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    previous = {c["case"]: c for c in baseline.get("cases", [])}
+    for case in results["cases"]:
+        base = previous.get(case["case"])
+        if base is None:
+            continue
+        for name, entry in case["stages"].items():
+            old = base["stages"].get(name, {}).get("seconds")
+            if old is None:
+                continue
+            new = entry["seconds"]
+            if new > old * (1 + tolerance) and new - old > MIN_DELTA_SECONDS:
+                regressions.append(f"{case['case']} {name}: {old * 1000:.0f} ms -> {new * 1000:.0f} ms")
+    return regressions
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    for case in results["cases"]:
+        print(f"\n{case['case']}  pages={case['pages']}  prompt_tokens={case['prompt_tokens']}")
+        for name, entry in case["stages"].items():
+            print(f"  {name:<13} {entry['seconds'] * 1000:9.1f} ms")
+        for name, entry in case.get("phases", {}).items():
+            mem = entry.get("peak_bytes")
+            mem_text = f"  peak {mem / 2**20:7.1f} MB" if mem is not None else ""
+            print(f"  {'[' + name + ']':<13} {entry['seconds'] * 1000:9.1f} ms{mem_text}")
+        print(f"  {'total':<13} {case['total_seconds'] * 1000:9.1f} ms")
+    if results["max_rss_mb"] is not None:
+        print(f"\nmax RSS {results['max_rss_mb']:.0f} MB")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on synthetic filings.")
+    parser.add_argument("--case", action="append",
+                        help="KIND:PAGES, e.g. 10-K:250 or 8-K:4 (default: %s)" % ", ".join(DEFAULT_CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated model latency in seconds")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (lower timing overhead)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier commit to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    memory = not args.no_memory
+    with tempfile.TemporaryDirectory() as tmp:
+        # Nothing touches the user's cache; must be set before the first repo module is imported
+        os.environ["REPORT_CACHE_DIR"] = str(Path(tmp) / "cache")
+        import llm
+        llm.set_backend(llm.FakeBackend(latency=args.latency))
+        llm.set_rate_limits(rpm=1e9, tpm=1e12)
+
+        if memory:
+            tracemalloc.start()
+        cases = [run_case(c, Path(tmp), args.repeat, memory, args.latency) for c in args.case or DEFAULT_CASES]
+        if memory:
+            tracemalloc.stop()
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "max_rss_mb": max_rss_mb(),
+        "cases": cases,
+    }
+    print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions against {baseline.get('revision') or args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
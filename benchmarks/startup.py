@@ -0,0 +1,54 @@
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cold import budgets in seconds (median of fresh interpreters)
+DEFAULT_THRESHOLDS = {
+    "summarizer": 0.8,
+    "app": 1.5,
+}
+
+_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def measure_import(module: str, runs: int = 5) -> float:
+    # Each run is a fresh interpreter so nothing is already in sys.modules
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _SNIPPET.format(module=module)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fail if cold import time regresses past a threshold.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", action="append", help="module to time (default: summarizer and app)")
+    parser.add_argument("--max-seconds", type=float, help="override the threshold for every module")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.module or list(DEFAULT_THRESHOLDS):
+        limit = args.max_seconds or DEFAULT_THRESHOLDS.get(module, 1.0)
+        try:
+            elapsed = measure_import(module, args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{module}: import failed\n{e.stderr}")
+            failed = True
+            continue
+        ok = elapsed <= limit
+        failed |= not ok
+        print(f"{module}: {elapsed * 1000:.0f} ms (limit {limit * 1000:.0f} ms) {'OK' if ok else 'REGRESSION'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+import random
+from pathlib import Path
+from typing import List
+
+import fitz  # PyMuPDF
+
+
+_WORDS = ("revenue growth customers platform segment operating margin risk regulatory competition "
+          "advertising cloud infrastructure capital expenditures liquidity cash flow demand pricing "
+          "supply chain cybersecurity litigation acquisition integration guidance outlook employees "
+          "international currency inflation interest rates debt facility dividend repurchase").split()
+
+_PAGE = fitz.paper_rect("letter")
+_MARGIN = 72
+
+
+def _paragraphs(rnd: random.Random, words: int) -> str:
+    out, line = [], []
+    for i in range(words):
+        line.append(rnd.choice(_WORDS))
+        if len(line) >= rnd.randint(60, 120):
+            out.append(" ".join(line).capitalize() + ".")
+            line = []
+    if line:
+        out.append(" ".join(line).capitalize() + ".")
+    return "\n\n".join(out)
+
+
+def _text_page(doc: fitz.Document, title: str, body: str) -> None:
+    page = doc.new_page(width=_PAGE.width, height=_PAGE.height)
+    page.insert_text((_MARGIN, _MARGIN), title, fontsize=12)
+    rect = fitz.Rect(_MARGIN, _MARGIN + 20, _PAGE.width - _MARGIN, _PAGE.height - _MARGIN)
+    page.insert_textbox(rect, body, fontsize=9)
+
+
+def _statement_page(doc: fitz.Document, title: str, years: List[int], rows: List[tuple]) -> None:
+    # Label column plus one right-hand column per year, like a real statement page
+    page = doc.new_page(width=_PAGE.width, height=_PAGE.height)
+    page.insert_text((_MARGIN, _MARGIN), title, fontsize=11)
+    page.insert_text((_MARGIN, _MARGIN + 16), "(In millions, except per share amounts)", fontsize=8)
+    y = _MARGIN + 48
+    cols = [330 + 80 * i for i in range(len(years))]
+    for x, year in zip(cols, years):
+        page.insert_text((x, y), str(year), fontsize=9)
+    for label, values in rows:
+        y += 16
+        page.insert_text((_MARGIN, y), label, fontsize=9)
+        for x, v in zip(cols, values):
+            text = f"({abs(v):,})" if v < 0 else f"{v:,}"
+            page.insert_text((x, y), text, fontsize=9)
+
+
+def make_10k(path: str, pages: int = 100, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    doc = fitz.open()
+    _text_page(doc, "UNITED STATES SECURITIES AND EXCHANGE COMMISSION",
+               "FORM 10-K\n\nANNUAL REPORT PURSUANT TO SECTION 13 OR 15(d)\n\n"
+               f"Synthetic Holdings, Inc.\nCommission File Number 001-{seed:05d}\nCIK 000{1000000 + seed}\n"
+               "For the fiscal year ended December 31, 2023")
+    _text_page(doc, "Table of Contents",
+               "PART I\nItem 1. Business 3\nItem 1A. Risk Factors 10\nPART II\n"
+               "Item 7. Management's Discussion and Analysis 30\nItem 8. Financial Statements 50\n"
+               "PART IV\nItem 15. Exhibits 90")
+
+    years = [2023, 2022, 2021]
+    revenue = [rnd.randint(50_000, 150_000) for _ in years]
+    income = [int(r * rnd.uniform(0.05, 0.3)) for r in revenue]
+    narrative = max(4, pages - 6)
+    items = [("PART I\nItem 1. Business", 0.3), ("Item 1A. Risk Factors", 0.3),
+             ("PART II\nItem 7. Management's Discussion and Analysis", 0.25),
+             ("Item 8. Financial Statements and Supplementary Data", 0.15)]
+    for title, share in items:
+        for i in range(max(1, int(narrative * share))):
+            _text_page(doc, title if i == 0 else "", _paragraphs(rnd, 450))
+        if title.startswith("Item 8"):
+            _statement_page(doc, "CONSOLIDATED STATEMENTS OF OPERATIONS", years,
+                            [("Revenue", revenue), ("Costs and expenses", [r - n for r, n in zip(revenue, income)]),
+                             ("Net income", income)])
+            _statement_page(doc, "CONSOLIDATED BALANCE SHEETS", years[:2],
+                            [("Cash and cash equivalents", [r // 4 for r in revenue[:2]]),
+                             ("Total assets", [r * 2 for r in revenue[:2]]),
+                             ("Total liabilities", [int(r * 0.8) for r in revenue[:2]]),
+                             ("Total stockholders' equity", [int(r * 1.2) for r in revenue[:2]])])
+            _statement_page(doc, "CONSOLIDATED STATEMENTS OF CASH FLOWS", years,
+                            [("Net income", income),
+                             ("Net cash provided by operating activities", [int(n * 1.6) for n in income])])
+    _text_page(doc, "PART IV\nItem 15. Exhibits", "Exhibit index.\n\nSIGNATURES\n\nPursuant to the requirements...")
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+def make_8k(path: str, pages: int = 3, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    doc = fitz.open()
+    _text_page(doc, "UNITED STATES SECURITIES AND EXCHANGE COMMISSION",
+               f"FORM 8-K\n\nCURRENT REPORT\n\nSynthetic Holdings, Inc.\nCIK 000{1000000 + seed}\n"
+               "Date of Report: February 1, 2024")
+    for i in range(max(1, pages - 2)):
+        title = "Item 2.02 Results of Operations and Financial Condition" if i == 0 else ""
+        _text_page(doc, title, _paragraphs(rnd, 400))
+    _text_page(doc, "Item 9.01 Financial Statements and Exhibits",
+               "99.1 Press release.\n\nSIGNATURES\n\nPursuant to the requirements of the Securities Exchange Act...")
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
@@ -0,0 +1,235 @@
+import math
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from extraction import EXTRACTOR_VERSION, FilingDocument
+from sections import CHARS_PER_TOKEN, index_sections
+
+
+# Whole-prompt budget for a single model call (Gemini 2.0 Flash takes ~1M input tokens)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "900000"))
+
+# "exact" tokenizes every page, "estimate" uses a calibrated chars/token ratio,
+# "auto" switches to the estimate above FAST_COUNT_CHARS characters
+TOKEN_COUNT_MODE = os.getenv("TOKEN_COUNT_MODE", "auto")
+FAST_COUNT_CHARS = int(os.getenv("FAST_COUNT_CHARS", "2000000"))
+# Pages tokenized exactly to calibrate the estimate
+CALIBRATION_PAGES = 16
+
+# How much a page is worth keeping, by the section it sits in (higher survives trimming longer)
+SECTION_VALUE_10K: Dict[str, float] = {"cover": 1.0, "7": 1.0, "8": 0.9, "1A": 0.7, "1": 0.6, "default": 0.1}
+SECTION_VALUE_8K: Dict[str, float] = {"cover": 1.0, "9.01": 0.1, "default": 0.8}
+
+# "=== Item 7 ===" headers added by build_prompt_text, and cap / gap markers added when trimming
+_HEADER_RE = re.compile(r"^===.*===$")
+_MARKER_RE = re.compile(r"\[\.\.\.truncated\]|\[\.\.\. \d+ pages omitted \.\.\.\]")
+
+
+# Token counting
+# ------------------------------
+class TokenCounter:
+    # tiktoken for OpenAI models; for other models (Gemini has no local tokenizer)
+    # o200k_base is the closest general-purpose BPE. Without tiktoken it falls
+    # back to CHARS_PER_TOKEN.
+
+    def __init__(self, model: str, mode: str = TOKEN_COUNT_MODE):
+        self.model = model
+        self.mode = mode
+        self._encoding = None
+        try:
+            import tiktoken
+            if model.startswith(("gpt-", "o1", "o3", "o4")):
+                self._encoding = tiktoken.encoding_for_model(model)
+            else:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            pass
+
+    @property
+    def name(self) -> str:
+        return self._encoding.name if self._encoding is not None else f"chars{CHARS_PER_TOKEN}"
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def use_estimate(self, total_chars: int) -> bool:
+        if self._encoding is None or self.mode == "estimate":
+            return True
+        return self.mode == "auto" and total_chars > FAST_COUNT_CHARS
+
+    def chars_per_token(self, pages: List[str]) -> float:
+        # Calibrates on evenly spaced non-empty pages
+        sample = [p for p in pages if p.strip()]
+        if self._encoding is None or not sample:
+            return float(CHARS_PER_TOKEN)
+        step = max(1, len(sample) // CALIBRATION_PAGES)
+        sample = sample[::step][:CALIBRATION_PAGES]
+        tokens = sum(self.count(p) for p in sample)
+        return sum(len(p) for p in sample) / tokens if tokens else float(CHARS_PER_TOKEN)
+
+    def count_pages(self, pages: List[str]) -> Tuple[List[int], bool]:
+        # Returns (counts, estimated)
+        if self.use_estimate(sum(len(p) for p in pages)):
+            ratio = self.chars_per_token(pages)
+            return [math.ceil(len(p) / ratio) for p in pages], True
+        return [self.count(p) for p in pages], False
+
+
+_counters: Dict[Tuple[str, str], TokenCounter] = {}
+
+
+def get_counter(model: str, mode: str = TOKEN_COUNT_MODE) -> TokenCounter:
+    if (model, mode) not in _counters:
+        _counters[(model, mode)] = TokenCounter(model, mode)
+    return _counters[(model, mode)]
+
+
+def page_token_counts(document: FilingDocument, counter: TokenCounter) -> List[int]:
+    # Memoized on the document and cached on disk next to its extracted text
+    from cache import get_text_cache
+
+    estimated = counter.use_estimate(len(document.text))
+    key = counter.name + ("-est" if estimated else "")
+    if key in document.token_counts:
+        return document.token_counts[key]
+
+    version = EXTRACTOR_VERSION + (f"+{document.variant}" if document.variant else "")
+    cache = get_text_cache() if document.sha256 else None
+    counts = cache.get_token_counts(document.sha256, version, key) if cache else None
+    if counts is None or len(counts) != document.page_count:
+        counts, _ = counter.count_pages(document.pages)
+        if cache is not None:
+            try:
+                cache.put_token_counts(document.sha256, version, key, counts)
+            except Exception as e:
+                print(f"Token count cache write error: {e}")
+    document.token_counts[key] = counts
+    return counts
+
+
+def estimate_text_tokens(text: str, document: FilingDocument, counts: List[int]) -> int:
+    # Tokens of text derived from the document, at the document's own chars/token ratio
+    chars = len(document.text)
+    if not chars:
+        return 0
+    return math.ceil(len(text) * sum(counts) / chars)
+
+
+# Adaptive trimming
+# ------------------------------
+def page_values(document: FilingDocument, kind: str = "10-K",
+                caps: Optional[Dict[str, int]] = None) -> List[float]:
+    # Section value, a small bonus for pages that open a section and for numeric density
+    weights = SECTION_VALUE_8K if kind == "8-K" else SECTION_VALUE_10K
+    values = [weights["default"]] * document.page_count
+    sections = [s for s in index_sections(document.text, kind) if not s.id.startswith("PART")]
+    if document.page_count:
+        values[0] = weights["cover"]
+    for sec in sections:
+        weight = weights.get(sec.id, weights["default"])
+        if caps is not None and caps.get(sec.id, caps.get("default", 0)) <= 0:
+            weight = min(weight, weights["default"])
+        start, end = document.page_at(sec.start), document.page_at(max(sec.start, sec.end - 1))
+        for n, i in enumerate(range(start, end + 1)):
+            values[i] = max(values[i], weight + 0.1 / (1 + n))
+
+    for i, page in enumerate(document.pages):
+        if page:
+            digits = sum(c.isdigit() for c in page)
+            values[i] += 0.1 * min(1.0, 5 * digits / len(page))
+    return values
+
+
+def protected_pages(document: FilingDocument, include_statements: bool = True) -> Set[int]:
+    # The cover page and the financial statement pages are never dropped
+    from financials import find_statement_pages
+
+    keep = {0} if document.page_count else set()
+    if include_statements:
+        for indices in find_statement_pages(document).values():
+            keep.update(indices)
+    return keep
+
+
+def trim_pages(counts: List[int], values: List[float], budget: int,
+               protected: Set[int]) -> Tuple[List[int], int]:
+    # Drops the lowest-value pages until the total fits; returns (kept indices, kept tokens)
+    total = sum(counts)
+    dropped: Set[int] = set()
+    for i in sorted((i for i in range(len(counts)) if i not in protected), key=lambda i: (values[i], -i)):
+        if total <= budget:
+            break
+        dropped.add(i)
+        total -= counts[i]
+    return [i for i in range(len(counts)) if i not in dropped], total
+
+
+def _line_index(document: FilingDocument) -> Dict[str, List[int]]:
+    # Stripped line -> pages it appears on, in page order
+    index: Dict[str, List[int]] = {}
+    for i, page in enumerate(document.pages):
+        for line in page.splitlines():
+            key = line.strip()
+            if key:
+                pages = index.setdefault(key, [])
+                if not pages or pages[-1] != i:
+                    pages.append(i)
+    return index
+
+
+def text_lines(text: str, document: FilingDocument) -> List[Tuple[str, Optional[int]]]:
+    # Lines of text derived from the document (selected sections, cleaned pages) with the page each
+    # one came from. A line not found in the document (cut short by a section cap, blank) stays with
+    # the page of the line before it; section headers and markers get None.
+    index = _line_index(document)
+    lines: List[Tuple[str, Optional[int]]] = []
+    page: Optional[int] = None
+    for line in text.split("\n"):
+        key = _MARKER_RE.sub("", line).strip()
+        if _HEADER_RE.match(line.strip()) or (line.strip() and not key):
+            lines.append((line, None))
+            continue
+        candidates = index.get(key) if key else None
+        if candidates:
+            # Sections come in document order, so prefer the first match at or after the last page
+            page = next((c for c in candidates if page is None or c >= page), candidates[0])
+        lines.append((line, page))
+    return lines
+
+
+def trim_text(text: str, document: FilingDocument, counts: List[int], values: List[float], budget: int,
+              protected: Set[int]) -> Tuple[str, int, int]:
+    # Drops the lines of `text` that sit on the lowest-value pages until it fits;
+    # returns (trimmed text, kept tokens, dropped pages). Gaps are marked for the model.
+    lines = text_lines(text, document)
+    ratio = sum(counts) / max(1, len(document.text))
+    page_chars = [0] * document.page_count
+    fixed_chars = 0
+    for line, page in lines:
+        if page is None:
+            fixed_chars += len(line) + 1
+        else:
+            page_chars[page] += len(line) + 1
+    page_tokens = [math.ceil(c * ratio) for c in page_chars]
+    fixed = math.ceil(fixed_chars * ratio)
+    present = {page for _, page in lines if page is not None}
+    absent = set(range(document.page_count)) - present
+    kept, kept_tokens = trim_pages(page_tokens, values, budget - fixed, protected | absent)
+    keep = set(kept)
+
+    parts: List[str] = []
+    gap: Set[int] = set()
+    for line, page in lines:
+        if page is not None and page not in keep:
+            gap.add(page)
+            continue
+        if gap:
+            parts.append(f"[... {len(gap)} pages omitted ...]")
+            gap = set()
+        parts.append(line)
+    if gap:
+        parts.append(f"[... {len(gap)} pages omitted ...]")
+    return "\n".join(parts), fixed + kept_tokens, len(present - keep)
@@ -0,0 +1,352 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+
+CACHE_DIR = Path(os.getenv("REPORT_CACHE_DIR", Path.home() / ".cache" / "report_summarizer"))
+
+
+def _env_mb(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default)) * 1024 * 1024
+    except ValueError:
+        return default * 1024 * 1024
+
+
+# Extracted text cache
+# ------------------------------
+# Page lists, per-page token counts and retrieval indexes
+_TEXT_CACHE_FILES = ("*.json.z", "*.tokens.json", "*.idx.z")
+
+
+class TextCache:
+    # One zlib-compressed JSON list of page strings per (content hash, extractor version).
+    # File mtime doubles as the LRU clock: reads touch it, eviction removes the oldest.
+
+    def __init__(self, directory: Path = CACHE_DIR / "text", max_bytes: Optional[int] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes if max_bytes is not None else _env_mb("TEXT_CACHE_MAX_MB", 512)
+        self._lock = threading.Lock()
+
+    def _path(self, sha256: str, version: str) -> Path:
+        return self.directory / f"{sha256}-{version}.json.z"
+
+    def _tokens_path(self, sha256: str, version: str, tokenizer: str) -> Path:
+        # Per-page token counts live next to the page list and are evicted with it
+        return self.directory / f"{sha256}-{version}.{tokenizer}.tokens.json"
+
+    def _index_path(self, sha256: str, version: str, index_version: str) -> Path:
+        # Retrieval index (retrieval.py), also evicted with the page list
+        return self.directory / f"{sha256}-{version}.{index_version}.idx.z"
+
+    def get(self, sha256: str, version: str) -> Optional[List[str]]:
+        path = self._path(sha256, version)
+        try:
+            raw = path.read_bytes()
+            pages = json.loads(zlib.decompress(raw).decode("utf-8"))
+            os.utime(path)
+            return pages
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Text cache read error ({path.name}): {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, sha256: str, version: str, pages: List[str]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so concurrent readers never see half a page list
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                # Compressed page by page: no whole-document JSON string or compressed copy in memory
+                z = zlib.compressobj(6)
+                f.write(z.compress(b"["))
+                for i, page in enumerate(pages):
+                    f.write(z.compress((", " if i else "").encode("utf-8")
+                                       + json.dumps(page, ensure_ascii=False).encode("utf-8")))
+                f.write(z.compress(b"]") + z.flush())
+            os.replace(tmp, self._path(sha256, version))
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def get_token_counts(self, sha256: str, version: str, tokenizer: str) -> Optional[List[int]]:
+        path = self._tokens_path(sha256, version, tokenizer)
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Token count cache read error ({path.name}): {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def put_token_counts(self, sha256: str, version: str, tokenizer: str, counts: List[int]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(counts, f)
+            os.replace(tmp, self._tokens_path(sha256, version, tokenizer))
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def get_index(self, sha256: str, version: str, index_version: str) -> Optional[Dict[str, Any]]:
+        path = self._index_path(sha256, version, index_version)
+        try:
+            return json.loads(zlib.decompress(path.read_bytes()).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Retrieval index cache read error ({path.name}): {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def put_index(self, sha256: str, version: str, index_version: str, data: Dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), 6)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, self._index_path(sha256, version, index_version))
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        # Page lists, token counts and retrieval indexes all count toward max_bytes. Files are
+        # grouped per filing (content hash) and a filing goes as a whole, least recently used first.
+        with self._lock:
+            groups: Dict[str, List[Any]] = {}
+            total = 0
+            for pattern in _TEXT_CACHE_FILES:
+                for p in self.directory.glob(pattern):
+                    try:
+                        st = p.stat()
+                    except FileNotFoundError:
+                        continue
+                    group = groups.setdefault(p.name.split("-", 1)[0], [0.0, 0, []])
+                    group[0] = max(group[0], st.st_mtime)
+                    group[1] += st.st_size
+                    group[2].append(p)
+                    total += st.st_size
+            for _, size, paths in sorted(groups.values(), key=lambda g: g[0]):
+                if total <= self.max_bytes:
+                    break
+                for p in paths:
+                    p.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self) -> None:
+        for pattern in _TEXT_CACHE_FILES:
+            for p in self.directory.glob(pattern):
+                p.unlink(missing_ok=True)
+
+
+_text_cache: Optional[TextCache] = None
+
+
+def get_text_cache() -> TextCache:
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache()
+    return _text_cache
+
+
+# Model response cache
+# ------------------------------
+class ResponseCache:
+    # Validated model output (JSON) keyed by text hash + prompt version + model name.
+    # Entries older than ttl_seconds are ignored and purged; past max_bytes the least
+    # recently used rows are deleted.
+
+    def __init__(self, path: Path = CACHE_DIR / "responses.sqlite3", ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.path = Path(path)
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("RESPONSE_CACHE_TTL_DAYS", "30")) * 86400
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes if max_bytes is not None else _env_mb("RESPONSE_CACHE_MAX_MB", 64)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, payload TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(text: str, prompt_version: str, model: str) -> str:
+        h = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{h}:{prompt_version}:{model}"
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT payload, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            payload, created = row
+            if now - created > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return payload
+
+    def put(self, key: str, payload: str, model: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, payload, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def invalidate(self, key: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    # RESPONSE_CACHE=off disables response caching globally
+    global _response_cache
+    if os.getenv("RESPONSE_CACHE", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+
+# Section summary store
+# ------------------------------
+class StoredSection(NamedTuple):
+    hash: str
+    text: str
+    summary: str
+    fiscal_year: Optional[int]
+
+
+class SectionStore:
+    # Model summaries of single 10-K sections per company, keyed by (CIK, section id,
+    # normalized section hash, prompt version). Unlike the response cache nothing
+    # expires: last year's entry is what the next filing is diffed against.
+
+    def __init__(self, path: Path = CACHE_DIR / "sections.sqlite3"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sections ("
+                " cik TEXT NOT NULL, section TEXT NOT NULL, hash TEXT NOT NULL, version TEXT NOT NULL,"
+                " fiscal_year INTEGER, text BLOB NOT NULL, summary TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (cik, section, hash, version))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sections_latest ON sections(cik, section, version, created)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def has_company(self, cik: str) -> bool:
+        with self._lock, self._connect() as conn:
+            return conn.execute("SELECT 1 FROM sections WHERE cik = ? LIMIT 1", (cik,)).fetchone() is not None
+
+    def get(self, cik: str, section: str, hash: str, version: str) -> Optional[str]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT summary FROM sections WHERE cik = ? AND section = ? AND hash = ? AND version = ?",
+                (cik, section, hash, version),
+            ).fetchone()
+        return row[0] if row else None
+
+    def latest(self, cik: str, section: str, version: str) -> Optional[StoredSection]:
+        # Most recent stored version of a section, for diffing against the new text
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT hash, text, summary, fiscal_year FROM sections"
+                " WHERE cik = ? AND section = ? AND version = ? ORDER BY created DESC LIMIT 1",
+                (cik, section, version),
+            ).fetchone()
+        if row is None:
+            return None
+        return StoredSection(row[0], zlib.decompress(row[1]).decode("utf-8"), row[2], row[3])
+
+    def put(self, cik: str, section: str, hash: str, version: str, text: str, summary: str,
+            fiscal_year: Optional[int] = None) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sections (cik, section, hash, version, fiscal_year, text, summary, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cik, section, hash, version, fiscal_year, zlib.compress(text.encode("utf-8"), 6), summary,
+                 time.time()),
+            )
+
+    def clear(self, cik: Optional[str] = None) -> None:
+        with self._lock, self._connect() as conn:
+            if cik is None:
+                conn.execute("DELETE FROM sections")
+            else:
+                conn.execute("DELETE FROM sections WHERE cik = ?", (cik,))
+
+
+_section_store: Optional[SectionStore] = None
+
+
+def get_section_store() -> Optional[SectionStore]:
+    # SECTION_STORE=off disables year-over-year section reuse
+    global _section_store
+    if os.getenv("SECTION_STORE", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    if _section_store is None:
+        _section_store = SectionStore()
+    return _section_store
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# How often an in-flight model call checks for a cancel request
+POLL_INTERVAL = 0.1
+
+
+class Cancelled(BaseException):
+    # BaseException (like asyncio.CancelledError) so the pipeline's broad
+    # `except Exception` fallbacks don't turn a cancel into an empty report
+    pass
+
+
+class CancelToken:
+    # Set by the job owner; `on_stage` is called (from the worker thread) at every checkpoint
+
+    def __init__(self, on_stage: Optional[Callable[[str], None]] = None):
+        self._event = threading.Event()
+        self.on_stage = on_stage
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def scope(token: CancelToken) -> Iterator[CancelToken]:
+    # Code run inside (including asyncio tasks started from it) sees the token
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def current() -> Optional[CancelToken]:
+    return _current.get()
+
+
+def checkpoint(stage: Optional[str] = None) -> None:
+    # Raises Cancelled when the surrounding job was cancelled; no-op outside a scope
+    token = _current.get()
+    if token is None:
+        return
+    if token.cancelled:
+        raise Cancelled()
+    if stage and token.on_stage is not None:
+        token.on_stage(stage)
+
+
+async def run_cancellable(awaitable: Awaitable[T], token: CancelToken) -> T:
+    # Awaits `awaitable`, cancelling the task (and the request behind it) as soon as the token is set
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=POLL_INTERVAL)
+            if done:
+                return task.result()
+            if token.cancelled:
+                raise Cancelled()
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
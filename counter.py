@@ -1,12 +1,8 @@
-import tiktoken
-import PyPDF2
+from budget import get_counter, page_token_counts
+from extraction import extract_document
 
-def load_file(path):
-    with open(path,"rb") as f :
-        reader = PyPDF2.PdfReader(f)
-        return "".join(page.extract_text() or "" for page in reader.pages)
-    
-text = load_file("meta_10k.pdf")
-enc= tiktoken.encoding_for_model("gpt-4o")
+# Per-page counts are cached next to the extracted text, so reruns skip tokenization
+document = extract_document("meta_10k.pdf")
+counts = page_token_counts(document, get_counter("gpt-4o", mode="exact"))
 
-print(len(enc.encode(text)))
\ No newline at end of file
+print(sum(counts))
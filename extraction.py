@@ -0,0 +1,190 @@
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import cancellation
+import tracing
+from cache import get_text_cache
+
+
+# Bumped whenever the text produced for a page changes
+EXTRACTOR_VERSION = "fitz-1"
+
+# Pages per worker task in process-pool mode, and the smallest document worth a pool
+PAGE_CHUNK_SIZE = 32
+PARALLEL_MIN_PAGES = 64
+
+
+# Extracted document
+# ------------------------------
+@dataclass
+class FilingDocument:
+    pages: List[str]
+    path: Optional[str] = None
+    sha256: Optional[str] = None
+    offsets: List[int] = field(default_factory=list)
+    # AnnualReport field values read from tagged facts (inline XBRL filings)
+    facts: Optional[Dict[str, Any]] = None
+    # Per-page token counts by tokenizer name (filled by budget.page_token_counts)
+    token_counts: Dict[str, List[int]] = field(default_factory=dict)
+    # Set when the pages were rewritten after extraction (e.g. normalize.NORMALIZER_VERSION)
+    variant: str = ""
+    # BM25 index over the pages (filled by retrieval.get_index)
+    retrieval_index: Any = None
+
+    def __post_init__(self):
+        # offsets[i] -> start of page i inside self.text
+        if not self.offsets:
+            pos = 0
+            for page in self.pages:
+                self.offsets.append(pos)
+                pos += len(page)
+        self._text = None
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self.pages)
+        return self._text
+
+    def page_at(self, char_offset: int) -> int:
+        # Page index that contains the given character offset of self.text
+        lo, hi = 0, len(self.offsets) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.offsets[mid] <= char_offset:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    @classmethod
+    def from_text(cls, text: str) -> "FilingDocument":
+        return cls(pages=[text], sha256=hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+
+# Extraction
+# ------------------------------
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def page_count(path: str) -> int:
+    import fitz  # PyMuPDF, imported lazily to keep GUI startup fast
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def iter_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    # Lazily yields one page of text at a time; only the current page is held
+    import fitz
+    with fitz.open(path) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for i in range(start, stop):
+            # Lets a queued job be cancelled mid-extraction (no-op in pool workers)
+            cancellation.checkpoint()
+            yield doc.load_page(i).get_text()
+
+
+def _extract_range(args: Tuple[str, int, int]) -> List[str]:
+    path, start, stop = args
+    return list(iter_pages(path, start, stop))
+
+
+def _page_ranges(total: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, total, chunk_size):
+        yield start, min(start + chunk_size, total)
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    # None -> EXTRACT_WORKERS env var (serial if unset), 0 -> one worker per core
+    if workers is None:
+        workers = int(os.getenv("EXTRACT_WORKERS", "1"))
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def iter_pages_parallel(path: str, workers: Optional[int] = 0,
+                        chunk_size: int = PAGE_CHUNK_SIZE) -> Iterator[str]:
+    # Splits the page range across a process pool and yields pages back in order.
+    # At most 2 chunks per worker are in flight, so memory stays bounded on huge filings.
+    workers = resolve_workers(workers)
+    total = page_count(path)
+    if workers <= 1 or total < PARALLEL_MIN_PAGES:
+        yield from iter_pages(path)
+        return
+
+    # Keep every worker busy on shorter documents too
+    chunk_size = max(1, min(chunk_size, -(-total // workers)))
+    ranges = _page_ranges(total, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        try:
+            for start, stop in ranges:
+                pending.append(pool.submit(_extract_range, (path, start, stop)))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+                    cancellation.checkpoint()
+            while pending:
+                yield from pending.popleft().result()
+                cancellation.checkpoint()
+        except BaseException:
+            # Don't wait for queued chunks on cancel / error
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def extract_document(path: str, workers: Optional[int] = None, use_cache: bool = True) -> FilingDocument:
+    with tracing.span("extract", file=os.path.basename(str(path))) as span:
+        document, cache_hit = _extract_document(path, workers, use_cache)
+        span.set(pages=document.page_count, bytes_in=os.path.getsize(path),
+                 bytes_out=sum(len(p) for p in document.pages), cache_hit=int(cache_hit))
+    return document
+
+
+def _extract_document(path: str, workers: Optional[int], use_cache: bool) -> Tuple[FilingDocument, bool]:
+    # EDGAR inline XBRL / HTML filings skip PDF parsing entirely
+    from ixbrl import extract_ixbrl_document, is_html_filing
+    if is_html_filing(path):
+        return extract_ixbrl_document(path), False
+
+    sha256 = file_sha256(path)
+    cache = get_text_cache() if use_cache else None
+    if cache is not None:
+        pages = cache.get(sha256, EXTRACTOR_VERSION)
+        if pages is not None:
+            return FilingDocument(pages=pages, path=path, sha256=sha256), True
+
+    if resolve_workers(workers) > 1:
+        pages = list(iter_pages_parallel(path, workers))
+    else:
+        pages = list(iter_pages(path))
+
+    document = FilingDocument(pages=pages, path=path, sha256=sha256)
+    if cache is not None:
+        try:
+            cache.put(sha256, EXTRACTOR_VERSION, pages)
+        except Exception as e:
+            print(f"Text cache write error: {e}")
+        # Follow-up questions (summarizer.ask_filing) reuse this instead of re-reading the filing
+        import retrieval
+        if retrieval.RETRIEVAL_INDEX:
+            retrieval.get_index(document)
+    return document, False
+
+
+def load_text(path: str, workers: Optional[int] = None) -> str:
+    return extract_document(path, workers).text
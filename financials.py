@@ -0,0 +1,190 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from extraction import FilingDocument
+
+
+# Statement titles as they appear at the top of the statement page
+_TITLES = {
+    "income": re.compile(r"consolidated\s+statements?\s+of\s+(operations|income|earnings)", re.IGNORECASE),
+    "balance": re.compile(r"consolidated\s+balance\s+sheets?", re.IGNORECASE),
+    "cash_flow": re.compile(r"consolidated\s+statements?\s+of\s+cash\s+flows?", re.IGNORECASE),
+}
+
+# Row label patterns per statement, in priority order (first matching row wins)
+_ROWS = {
+    "income": {
+        "Total Revenue": [r"total (net )?revenues?", r"(net )?revenues?", r"total net sales", r"net sales"],
+        "Net Income": [r"net income( \(loss\))?", r"net (loss|earnings)( \(loss\))?", r"net income attributable to .+"],
+    },
+    "balance": {
+        "Total Assets": [r"total assets"],
+        "Total Liabilities": [r"total liabilities"],
+        "Equity": [r"total (stockholders|shareholders)['’]? equity( \(deficit\))?", r"total equity"],
+        "Cash": [r"cash and cash equivalents"],
+    },
+    "cash_flow": {
+        "Cash Flow": [r"net cash (provided by|from) (\(used in\) )?operating activities"],
+    },
+}
+_ROWS = {k: {f: [re.compile(f"^{p}$") for p in pats] for f, pats in rows.items()} for k, rows in _ROWS.items()}
+
+_YEAR_RE = re.compile(r"^(19|20)\d{2}$")
+_NUM_RE = re.compile(r"^\(?-?\$?\d[\d,]*(\.\d+)?\)?$")
+_DASH = {"—", "–", "-", "$—", "$-"}
+_SCALE_RE = re.compile(r"in\s+(thousands|millions|billions)", re.IGNORECASE)
+_SCALES = {"thousands": 1e3, "millions": 1e6, "billions": 1e9}
+
+# Page must name the statement within its first characters (skips TOC / index pages)
+TITLE_WINDOW = 600
+
+
+def _parse_number(token: str) -> Optional[float]:
+    if token in _DASH:
+        return 0.0
+    neg = token.startswith("(") and token.endswith(")")
+    try:
+        value = float(token.strip("()$").replace(",", "").replace("$", ""))
+    except ValueError:
+        return None
+    return -value if neg else value
+
+
+def _normalize_label(words: List[str]) -> str:
+    label = " ".join(w for w in words if w != "$").lower()
+    label = re.sub(r"\(\d\)|\*+", "", label)
+    return re.sub(r"\s+", " ", label).strip(" :.")
+
+
+# Page layout
+# ------------------------------
+def _rows_from_words(words: List[tuple], tolerance: float = 3.0) -> List[List[str]]:
+    # Groups fitz words (x0, y0, x1, y1, text, ...) into visual rows, left to right
+    rows: List[List[tuple]] = []
+    current_y = None
+    for w in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        y = (w[1] + w[3]) / 2
+        if current_y is None or abs(y - current_y) > tolerance:
+            rows.append([])
+            current_y = y
+        rows[-1].append(w)
+    return [[w[4] for w in sorted(row, key=lambda w: w[0])] for row in rows]
+
+
+def _split_row(tokens: List[str]) -> Tuple[List[str], List[Optional[float]]]:
+    label, values = [], []
+    for tok in tokens:
+        if tok == "$":
+            continue
+        if _NUM_RE.match(tok) or tok in _DASH:
+            values.append(_parse_number(tok))
+        elif values:
+            # text after the numbers (footnote markers etc.) ends the row
+            break
+        else:
+            label.append(tok)
+    return label, values
+
+
+def parse_statement(rows: List[List[str]], kind: str) -> Dict[int, Dict[str, float]]:
+    # Returns {year: {field: value}} for the rows of one statement page
+    years: List[int] = []
+    found: Dict[str, Tuple[int, List[Optional[float]]]] = {}
+    pending: List[str] = []
+    for tokens in rows:
+        if not years:
+            yrs = [int(t.strip(",;.")) for t in tokens if _YEAR_RE.match(t.strip(",;."))]
+            if len(yrs) >= 2:
+                years = yrs
+            continue
+        label_words, values = _split_row(tokens)
+        if not values:
+            pending = label_words
+            continue
+        candidates = [_normalize_label(label_words)]
+        if pending:
+            candidates.append(_normalize_label(pending + label_words))
+        pending = []
+        if len(values) < len(years):
+            continue
+        values = values[-len(years):]
+        for field, patterns in _ROWS[kind].items():
+            for priority, pattern in enumerate(patterns):
+                if any(pattern.match(c) for c in candidates):
+                    if field not in found or priority < found[field][0]:
+                        found[field] = (priority, values)
+                    break
+
+    result: Dict[int, Dict[str, float]] = {}
+    for field, (_, values) in found.items():
+        for year, value in zip(years, values):
+            if value is not None:
+                result.setdefault(year, {})[field] = value
+    return result
+
+
+# Statement pages
+# ------------------------------
+def find_statement_pages(document: FilingDocument) -> Dict[str, List[int]]:
+    pages: Dict[str, List[int]] = {kind: [] for kind in _TITLES}
+    for i, text in enumerate(document.pages):
+        head = text[:TITLE_WINDOW]
+        if "index to" in head.lower():
+            continue
+        for kind, title in _TITLES.items():
+            if title.search(head):
+                pages[kind].append(i)
+    return pages
+
+
+def extract_financials(document: FilingDocument) -> Optional[Dict[str, Any]]:
+    # Parses the income statement, balance sheet and cash flow statement pages
+    # into AnnualReport fields. Returns None if the document has no PDF to read
+    # layout from or no statement could be parsed.
+    if not document.path or not str(document.path).lower().endswith(".pdf"):
+        return None
+    import fitz
+
+    pages = find_statement_pages(document)
+    by_year: Dict[int, Dict[str, float]] = {}
+    with fitz.open(document.path) as pdf:
+        for kind, indices in pages.items():
+            for index in indices:
+                page = pdf.load_page(index)
+                scale_match = _SCALE_RE.search(document.pages[index][:2000])
+                scale = _SCALES[scale_match.group(1).lower()] if scale_match else 1.0
+                parsed = parse_statement(_rows_from_words(page.get_text("words")), kind)
+                if not parsed:
+                    continue
+                for year, fields in parsed.items():
+                    row = by_year.setdefault(year, {})
+                    for field, value in fields.items():
+                        row.setdefault(field, value * scale)
+                break
+
+    if not by_year:
+        return None
+    hist = []
+    for year in sorted(by_year):
+        row = {"Year": year}
+        row.update({k: v for k, v in by_year[year].items() if k != "Cash"})
+        hist.append(row)
+    latest = by_year[max(by_year)]
+    return {
+        "historical_financials": hist,
+        "total_revenue": latest.get("Total Revenue"),
+        "net_income": latest.get("Net Income"),
+        "total_assets": latest.get("Total Assets"),
+        "total_liabilities": latest.get("Total Liabilities"),
+        "operating_cash_flow": latest.get("Cash Flow"),
+        "cash_and_equivalents": latest.get("Cash"),
+    }
+
+
+def is_complete(financials: Optional[Dict[str, Any]], min_years: int = 2) -> bool:
+    # Good enough to take the numbers off the model path
+    if not financials:
+        return False
+    rows = financials.get("historical_financials") or []
+    full = [r for r in rows if r.get("Total Revenue") is not None and r.get("Net Income") is not None]
+    return len(full) >= min_years
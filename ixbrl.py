@@ -0,0 +1,224 @@
+import re
+from datetime import date, datetime
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+from extraction import FilingDocument, file_sha256
+
+
+HTML_SUFFIXES = (".htm", ".html", ".xhtml")
+
+# Tagged concepts -> historical_financials column, in priority order
+CONCEPTS = {
+    "Total Revenue": ["us-gaap:Revenues", "us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax",
+                      "us-gaap:SalesRevenueNet"],
+    "Net Income": ["us-gaap:NetIncomeLoss", "us-gaap:ProfitLoss"],
+    "Total Assets": ["us-gaap:Assets"],
+    "Total Liabilities": ["us-gaap:Liabilities"],
+    "Equity": ["us-gaap:StockholdersEquity",
+               "us-gaap:StockholdersEquityIncludingPortionAttributableToNoncontrollingInterest"],
+    "Cash Flow": ["us-gaap:NetCashProvidedByUsedInOperatingActivities"],
+    "Cash": ["us-gaap:CashAndCashEquivalentsAtCarryingValue",
+             "us-gaap:CashCashEquivalentsRestrictedCashAndRestrictedCashEquivalents"],
+}
+_CONCEPT_FIELD = {c: (field, rank) for field, names in CONCEPTS.items() for rank, c in enumerate(names)}
+_DEI = {"dei:EntityRegistrantName", "dei:EntityCentralIndexKey", "dei:DocumentPeriodEndDate", "dei:DocumentType"}
+
+_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "table", "h1", "h2", "h3", "h4", "h5", "h6"}
+_SKIP_TAGS = {"script", "style", "title", "head"}
+_PAGE_BREAK_RE = re.compile(r"page-break-(before|after)\s*:\s*always", re.IGNORECASE)
+
+
+# Streaming parser
+# ------------------------------
+class _InlineXBRLParser(HTMLParser):
+    # Collects narrative text split at CSS page breaks, plus contexts and tagged facts.
+    # Fed in chunks, so only the current page and the facts stay in memory.
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pages: List[str] = []
+        self.contexts: Dict[str, Dict[str, Any]] = {}
+        self.facts: List[Dict[str, Any]] = []
+        self._buf: List[str] = []
+        self._in_header = 0
+        self._skip = 0
+        self._context: Optional[Dict[str, Any]] = None
+        self._period_tag: Optional[str] = None
+        self._open_facts: List[Dict[str, Any]] = []
+
+    def _flush_page(self) -> None:
+        text = "".join(self._buf)
+        lines = (re.sub(r"[ \t\xa0]+", " ", line).strip() for line in text.split("\n"))
+        page = "\n".join(line for line in lines if line)
+        if page:
+            self.pages.append(page + "\n")
+        self._buf = []
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag == "ix:header":
+            self._in_header += 1
+        elif tag == "xbrli:context":
+            self._context = {"id": a.get("id"), "start": None, "end": None, "segment": False}
+        elif self._context is not None and tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+            self._period_tag = tag
+        elif self._context is not None and tag == "xbrli:segment":
+            self._context["segment"] = True
+        elif tag in ("ix:nonfraction", "ix:nonnumeric"):
+            self._open_facts.append({"tag": tag, "name": a.get("name"), "context": a.get("contextref"),
+                                     "scale": a.get("scale"), "sign": a.get("sign"),
+                                     "format": a.get("format") or "", "text": []})
+        style = a.get("style") or ""
+        if _PAGE_BREAK_RE.search(style) and not self._in_header:
+            self._flush_page()
+        if tag in _BLOCK_TAGS:
+            self._buf.append("\n")
+        elif tag == "td":
+            self._buf.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "ix:header":
+            self._in_header = max(0, self._in_header - 1)
+        elif tag == "xbrli:context" and self._context is not None:
+            self.contexts[self._context["id"]] = self._context
+            self._context = None
+        elif tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+            self._period_tag = None
+        elif tag in ("ix:nonfraction", "ix:nonnumeric") and self._open_facts:
+            fact = self._open_facts.pop()
+            fact["text"] = "".join(fact["text"]).strip()
+            if fact["name"] in _CONCEPT_FIELD or fact["name"] in _DEI:
+                self.facts.append(fact)
+        if tag in _BLOCK_TAGS:
+            self._buf.append("\n")
+
+    def handle_data(self, data):
+        if self._period_tag and self._context is not None:
+            # A date can arrive in pieces when a chunk boundary falls inside it
+            key = "start" if self._period_tag == "xbrli:startdate" else "end"
+            self._context[key] = ((self._context[key] or "") + data).strip()
+            return
+        for fact in self._open_facts:
+            fact["text"].append(data)
+        if not self._skip and not self._in_header:
+            self._buf.append(data)
+
+    def close(self):
+        super().close()
+        self._flush_page()
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    value = value.strip()
+    for fmt in ("%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _fact_value(fact: Dict[str, Any]) -> Optional[float]:
+    text = fact["text"]
+    fmt = fact["format"].lower()
+    if "zerodash" in fmt or "fixed-zero" in fmt or text in ("-", "—", "–"):
+        value = 0.0
+    else:
+        if "numcommadecimal" in fmt or "num-comma-decimal" in fmt:
+            text = text.replace(".", "").replace(" ", "").replace(",", ".")
+        else:
+            text = text.replace(",", "").replace(" ", "")
+        try:
+            value = float(text)
+        except ValueError:
+            return None
+    try:
+        value *= 10 ** int(fact["scale"] or 0)
+    except ValueError:
+        pass
+    return -value if fact["sign"] == "-" else value
+
+
+# Facts -> report fields
+# ------------------------------
+def facts_to_fields(facts: List[Dict[str, Any]], contexts: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    # Consolidated (no dimension) facts only; flows need a ~1 year duration,
+    # balances are instants. Returns AnnualReport field values.
+    by_year: Dict[int, Dict[str, Tuple[int, float]]] = {}
+    dei: Dict[str, str] = {}
+    latest_end: Optional[date] = None
+    for fact in facts:
+        name = fact["name"]
+        if name in _DEI:
+            dei.setdefault(name, fact["text"])
+            continue
+        ctx = contexts.get(fact["context"])
+        if not ctx or ctx["segment"]:
+            continue
+        end = _parse_date(ctx["end"])
+        start = _parse_date(ctx["start"])
+        if end is None:
+            continue
+        if start is not None and not 330 <= (end - start).days <= 380:
+            continue
+        value = _fact_value(fact)
+        if value is None:
+            continue
+        field, rank = _CONCEPT_FIELD[name]
+        row = by_year.setdefault(end.year, {})
+        if field not in row or rank < row[field][0]:
+            row[field] = (rank, value)
+        if start is not None and (latest_end is None or end > latest_end):
+            latest_end = end
+
+    fields: Dict[str, Any] = {}
+    if dei.get("dei:EntityRegistrantName"):
+        fields["company_name"] = dei["dei:EntityRegistrantName"]
+    if dei.get("dei:EntityCentralIndexKey"):
+        fields["cik"] = dei["dei:EntityCentralIndexKey"]
+    if dei.get("dei:DocumentType"):
+        fields["document_type"] = dei["dei:DocumentType"].strip().upper()
+    period_end = _parse_date(dei.get("dei:DocumentPeriodEndDate")) or latest_end
+    if period_end is not None and by_year:
+        fields["fiscal_year_end"] = datetime(period_end.year, period_end.month, period_end.day)
+
+    if not by_year:
+        return fields
+    hist = []
+    for year in sorted(by_year):
+        row = {"Year": year}
+        row.update({f: v for f, (_, v) in by_year[year].items() if f != "Cash"})
+        hist.append(row)
+    latest = {f: v for f, (_, v) in by_year[max(by_year)].items()}
+    fields.update({
+        "historical_financials": hist,
+        "total_revenue": latest.get("Total Revenue"),
+        "net_income": latest.get("Net Income"),
+        "total_assets": latest.get("Total Assets"),
+        "total_liabilities": latest.get("Total Liabilities"),
+        "operating_cash_flow": latest.get("Cash Flow"),
+        "cash_and_equivalents": latest.get("Cash"),
+    })
+    return fields
+
+
+def is_html_filing(path: str) -> bool:
+    return str(path).lower().endswith(HTML_SUFFIXES)
+
+
+def extract_ixbrl_document(path: str, chunk_size: int = 1 << 20) -> FilingDocument:
+    parser = _InlineXBRLParser()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            parser.feed(chunk)
+    parser.close()
+    document = FilingDocument(pages=parser.pages, path=path, sha256=file_sha256(path))
+    document.facts = facts_to_fields(parser.facts, parser.contexts)
+    return document
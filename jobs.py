@@ -0,0 +1,180 @@
+import itertools
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cancellation import CancelToken, Cancelled, scope
+from extraction import file_sha256
+
+
+# Filings waiting behind the running one; submit() refuses more than this
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "8"))
+
+# Traced pipeline stages -> progress text
+STAGE_LABELS = {
+    "extract": "Extracting text",
+    "normalize": "Cleaning text",
+    "preflight": "Checking token budget",
+    "prompt": "Building prompt",
+    "response_cache": "Checking response cache",
+    "generate": "Waiting for the model",
+    "validate": "Validating response",
+    "render": "Rendering report",
+    "charts": "Drawing charts",
+    "pdf": "Writing PDF",
+    "save": "Saving result",
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: int
+    path: str
+    kind: str
+    key: str
+    state: str = "queued"  # queued | running | done | failed | cancelled
+    stage: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    token: CancelToken = field(default_factory=CancelToken)
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    @property
+    def stage_label(self) -> str:
+        return STAGE_LABELS.get(self.stage, self.stage)
+
+
+# Pipeline
+# ------------------------------
+def run_job(job: Job) -> Any:
+    # summarizer.run_pipeline; every traced stage inside it is a cancel point
+    import summarizer
+    from extraction import extract_document
+
+    return summarizer.run_pipeline(job.kind, extract_document(job.path))
+
+
+# Queue
+# ------------------------------
+class JobQueue:
+    # One worker thread runs jobs in submission order. `on_event(job)` is called from the
+    # worker thread on every state / stage change; GUI callers marshal it to their own thread.
+
+    def __init__(self, run: Callable[[Job], Any] = run_job, on_event: Optional[Callable[[Job], None]] = None,
+                 maxsize: int = JOB_QUEUE_SIZE):
+        self.run = run
+        self.on_event = on_event
+        self.maxsize = maxsize
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._active: Dict[str, Job] = {}  # key -> queued or running job
+        self._running: Optional[Job] = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._loop, name="report-jobs", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def job_key(path: str, kind: str) -> str:
+        return f"{kind}:{file_sha256(path)}"
+
+    def submit(self, path: str, kind: str) -> Tuple[Job, bool]:
+        # Returns (job, created); the same file and kind already queued or running is not added twice
+        key = self.job_key(path, kind)
+        with self._lock:
+            if key in self._active:
+                return self._active[key], False
+            if len(self.pending()) >= self.maxsize:
+                raise QueueFull(f"{self.maxsize} filings are already waiting.")
+            job = Job(next(self._ids), path, kind, key)
+            job.token.on_stage = lambda stage, job=job: self._set_stage(job, stage)
+            self._active[key] = job
+        self._queue.put(job)
+        self._notify(job)
+        return job, True
+
+    def cancel(self, job: Optional[Job] = None) -> Optional[Job]:
+        # Cancels `job`, or the running one; a queued job is dropped before it starts
+        with self._lock:
+            job = job or self._running
+            if job is None or job.finished:
+                return None
+            job.token.cancel()
+            if job.state == "queued":
+                self._finish(job, "cancelled")
+        if job.state == "cancelled":
+            self._notify(job)
+        return job
+
+    def cancel_all(self) -> None:
+        for job in self.pending():
+            self.cancel(job)
+        self.cancel()
+
+    def pending(self) -> List[Job]:
+        return [job for job in self._active.values() if job.state == "queued"]
+
+    @property
+    def running(self) -> Optional[Job]:
+        return self._running
+
+    def close(self) -> None:
+        self.cancel_all()
+        self._queue.put(None)
+
+    # Worker thread
+    # ------------------------------
+    def _loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.finished:
+                    continue
+                job.state = "running"
+                self._running = job
+            self._notify(job)
+            try:
+                with scope(job.token):
+                    job.result = self.run(job)
+                state = "done"
+            except Cancelled:
+                state = "cancelled"
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                state = "failed"
+            with self._lock:
+                self._finish(job, state)
+                self._running = None
+            self._notify(job)
+
+    def _finish(self, job: Job, state: str) -> None:
+        # Caller holds the lock
+        job.state = state
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+
+    def _set_stage(self, job: Job, stage: str) -> None:
+        if stage in STAGE_LABELS and stage != job.stage:
+            job.stage = stage
+            self._notify(job)
+
+    def _notify(self, job: Job) -> None:
+        if self.on_event is not None:
+            try:
+                self.on_event(job)
+            except Exception as e:
+                print(f"Job event error: {e}")
@@ -0,0 +1,423 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Coroutine, Dict, Optional, TypeVar
+
+from tenacity import (AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt,
+                      wait_random_exponential)
+
+import cancellation
+import tracing
+from sections import CHARS_PER_TOKEN
+
+
+MODEL_RPM = float(os.getenv("MODEL_RPM", "60"))
+MODEL_TPM = float(os.getenv("MODEL_TPM", "1000000"))
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "180"))
+MODEL_MAX_ATTEMPTS = int(os.getenv("MODEL_MAX_ATTEMPTS", "5"))
+# Output tokens reserved per request when charging the tokens/min bucket
+EXPECTED_OUTPUT_TOKENS = 2000
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+# Rate limiting
+# ------------------------------
+class TokenBucket:
+    # Refills continuously at `per_minute` units/min up to `per_minute` units.
+    # A rate <= 0 disables the bucket.
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        # Takes `amount` (possibly going negative) and returns how long to wait
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = MODEL_RPM, tpm: float = MODEL_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def _delay(self, tokens: int) -> float:
+        return max(self.requests._reserve(1), self.tokens._reserve(tokens))
+
+    def acquire(self, tokens: int) -> None:
+        delay = self._delay(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int) -> None:
+        delay = self._delay(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def estimate_tokens(prompt: str) -> int:
+    return len(prompt) // CHARS_PER_TOKEN + EXPECTED_OUTPUT_TOKENS
+
+
+# Backends
+# ------------------------------
+class ModelBackend:
+    name = "base"
+
+    def generate(self, model: str, prompt: str, config: Dict[str, Any], timeout: float) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, model: str, prompt: str, config: Dict[str, Any], timeout: float) -> str:
+        return await asyncio.to_thread(self.generate, model, prompt, config, timeout)
+
+
+class GeminiBackend(ModelBackend):
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Built on first use so importing this module never needs an API key
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=self.api_key or os.getenv("GEMINI_API_KEY"))
+        return self._client
+
+    @staticmethod
+    def _config(config: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        return {**config, "http_options": {"timeout": int(timeout * 1000)}}
+
+    def generate(self, model: str, prompt: str, config: Dict[str, Any], timeout: float) -> str:
+        response = self.client.models.generate_content(model=model, contents=prompt,
+                                                       config=self._config(config, timeout))
+        return response.text
+
+    async def agenerate(self, model: str, prompt: str, config: Dict[str, Any], timeout: float) -> str:
+        response = await asyncio.wait_for(
+            self.client.aio.models.generate_content(model=model, contents=prompt,
+                                                    config=self._config(config, timeout)),
+            timeout,
+        )
+        return response.text
+
+
+class FakeBackend(ModelBackend):
+    # Deterministic offline backend: the same prompt always yields the same JSON.
+    # `responses` maps sha256(prompt) -> raw response text (recorded replies).
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, responses: Optional[Dict[str, str]] = None):
+        self.latency = latency
+        self.responses = responses or {}
+        self.calls = 0
+
+    def _respond(self, prompt: str, config: Optional[Dict[str, Any]]) -> str:
+        self.calls += 1
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if digest in self.responses:
+            return self.responses[digest]
+        return json.dumps(fake_response(prompt, digest, (config or {}).get("response_schema")))
+
+    def generate(self, model: str, prompt: str, config: Dict[str, Any], timeout: float) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt, config)
+
+    async def agenerate(self, model: str, prompt: str, config: Dict[str, Any], timeout: float) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt, config)
+
+
+def fake_response(prompt: str, digest: str, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Shaped by the requested response schema; without one the prompt decides (see fake_report)
+    fields = set((schema or {}).get("properties") or ())
+    if "answer" in fields:
+        return fake_answer(prompt, digest)
+    if "event_description" in fields:
+        return fake_report("current report (8-K)", digest)
+    report = fake_report(prompt, digest)
+    return {k: v for k, v in report.items() if k in fields} if fields else report
+
+
+def fake_answer(prompt: str, digest: str) -> Dict[str, Any]:
+    # FilingAnswer citing the first excerpt's page; not found when the prompt has no excerpts
+    pages = [int(p) for p in re.findall(r"^\[Page (\d+)\]", prompt, re.MULTILINE)]
+    if not pages:
+        return {"answer": None, "value": None, "pages": None, "found": False}
+    rnd = random.Random(digest)
+    return {"answer": f"Synthetic answer ({digest[:4]}).", "value": float(rnd.randint(1, 500) * 1_000_000),
+            "pages": pages[:1], "found": True}
+
+
+def fake_report(prompt: str, digest: str) -> Dict[str, Any]:
+    rnd = random.Random(digest)
+    name = f"Fake Corp {digest[:6].upper()}"
+
+    def bullets(label: str, n: int):
+        return [f"{label} {i + 1} ({digest[:4]})" for i in range(n)]
+
+    if "<<<DOCUMENT " in prompt:
+        # Packed 8-Ks: one entry per document id
+        return {"reports": [
+            {**fake_report("current report (8-K)", hashlib.sha256((digest + doc_id).encode()).hexdigest()),
+             "document_id": doc_id}
+            for doc_id in re.findall(r"<<<DOCUMENT (\w+)>>>", prompt)
+        ]}
+    if "current report (8-K)" in prompt:
+        return {
+            "company_name": name,
+            "cik": str(rnd.randint(1000000, 9999999)),
+            "filing_date": "2024-02-01",
+            "event_description": "Synthetic event description.",
+            "impact": rnd.choice(["Positive", "Neutral", "Negative"]),
+            "insights": bullets("Insight", 3),
+            "opportunities": bullets("Opportunity", 2),
+            "risks": bullets("Risk", 2),
+            "takeaways": bullets("Takeaway", 3),
+        }
+    revenue = rnd.randint(1, 500) * 1_000_000_000
+    hist = []
+    for i, year in enumerate((2021, 2022, 2023)):
+        rev = revenue * (0.8 + 0.1 * i)
+        hist.append({"Year": year, "Total Revenue": rev, "Net Income": rev * 0.2,
+                     "Total Assets": rev * 1.5, "Total Liabilities": rev * 0.6,
+                     "Equity": rev * 0.9, "Cash Flow": rev * 0.3})
+    return {
+        "company_name": name,
+        "cik": str(rnd.randint(1000000, 9999999)),
+        "fiscal_year_end": "2023-12-31",
+        "filing_date": "2024-02-01",
+        "total_revenue": hist[-1]["Total Revenue"],
+        "net_income": hist[-1]["Net Income"],
+        "total_assets": hist[-1]["Total Assets"],
+        "total_liabilities": hist[-1]["Total Liabilities"],
+        "operating_cash_flow": hist[-1]["Cash Flow"],
+        "cash_and_equivalents": revenue * 0.1,
+        "executive_summary": "Synthetic executive summary.",
+        "insights": bullets("Insight", 3),
+        "opportunities": bullets("Opportunity", 2),
+        "risks": bullets("Risk", 2),
+        "takeaways": bullets("Takeaway", 3),
+        "historical_financials": hist,
+    }
+
+
+_backend: Optional[ModelBackend] = None
+_limiter = RateLimiter()
+
+
+def get_backend() -> ModelBackend:
+    # MODEL_BACKEND=fake runs everything offline
+    global _backend
+    if _backend is None:
+        _backend = FakeBackend() if os.getenv("MODEL_BACKEND", "gemini") == "fake" else GeminiBackend()
+    return _backend
+
+
+def warm_up() -> None:
+    # Builds the genai client ahead of the first call when an API key is configured
+    backend = get_backend()
+    if isinstance(backend, GeminiBackend) and (backend.api_key or os.getenv("GEMINI_API_KEY")):
+        backend.client
+
+
+def set_backend(backend: Optional[ModelBackend]) -> None:
+    global _backend
+    _backend = backend
+
+
+def set_rate_limits(rpm: float, tpm: float) -> None:
+    global _limiter
+    _limiter = RateLimiter(rpm, tpm)
+
+
+# Event loop
+# ------------------------------
+# Async model calls made from sync code all run on one long-lived loop thread, so the genai
+# async client (and its pooled connections) never outlives a loop the way asyncio.run would leave it
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _settle(future: concurrent.futures.Future, task: asyncio.Task) -> None:
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+def run_coroutine(coro: Coroutine[Any, Any, T]) -> T:
+    # Runs `coro` on the shared loop and blocks the calling thread for its result. The task
+    # starts in a copy of the caller's context, so it sees the caller's cancel token.
+    loop = _get_loop()
+    if threading.current_thread().name == "llm-loop":
+        coro.close()
+        raise RuntimeError("run_coroutine called from the model loop; await the coroutine instead")
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    tasks = []
+
+    def start() -> None:
+        task = loop.create_task(coro)
+        task.add_done_callback(functools.partial(_settle, future))
+        tasks.append(task)
+
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    try:
+        return future.result()
+    except BaseException:
+        # e.g. KeyboardInterrupt in the waiting thread: don't leave the call running
+        loop.call_soon_threadsafe(lambda: [t.cancel() for t in tasks])
+        raise
+
+
+# Calls
+# ------------------------------
+def is_retryable(e: BaseException) -> bool:
+    if isinstance(e, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if code in RETRYABLE_STATUS:
+        return True
+    # httpx transport errors (timeouts, dropped connections)
+    name = type(e).__name__
+    return type(e).__module__.startswith("httpx") and ("Timeout" in name or "Connect" in name)
+
+
+def _retry_kwargs(attempts: int) -> Dict[str, Any]:
+    return {
+        "retry": retry_if_exception(is_retryable),
+        "wait": wait_random_exponential(multiplier=1, max=60),
+        "stop": stop_after_attempt(attempts),
+        "reraise": True,
+    }
+
+
+JSON_CONFIG = {"response_mime_type": "application/json"}
+
+
+# Structured output
+# ------------------------------
+# Gemini takes an OpenAPI-style subset of JSON Schema: no $ref, no anyOf-with-null
+# (nullable instead), no titles / defaults
+_SCHEMA_KEYS = ("type", "format", "description", "enum")
+_schemas: Dict[Any, Dict[str, Any]] = {}
+
+
+def _schema_node(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    if "$ref" in node:
+        node = {**defs[node["$ref"].rsplit("/", 1)[-1]], **{k: v for k, v in node.items() if k != "$ref"}}
+    if "anyOf" in node:
+        options = [o for o in node["anyOf"] if o.get("type") != "null"]
+        if len(options) == 1:
+            out = _schema_node({**options[0], **{k: v for k, v in node.items() if k != "anyOf"}}, defs)
+        else:
+            out = {"anyOf": [_schema_node(o, defs) for o in options]}
+        if len(options) < len(node["anyOf"]):
+            out["nullable"] = True
+        return out
+    out = {k: node[k] for k in _SCHEMA_KEYS if k in node}
+    if "properties" in node:
+        out["properties"] = {k: _schema_node(v, defs) for k, v in node["properties"].items()}
+        out["propertyOrdering"] = list(node["properties"])
+        if node.get("required"):
+            out["required"] = list(node["required"])
+    if "items" in node:
+        out["items"] = _schema_node(node["items"], defs)
+    return out
+
+
+def response_schema(model_cls) -> Dict[str, Any]:
+    # Derived from a pydantic model (field aliases and descriptions included)
+    if model_cls not in _schemas:
+        schema = model_cls.model_json_schema(by_alias=True)
+        _schemas[model_cls] = _schema_node(schema, schema.get("$defs", {}))
+    return _schemas[model_cls]
+
+
+def json_config(model_cls=None) -> Dict[str, Any]:
+    # JSON mode, constrained to model_cls's schema when given
+    if model_cls is None:
+        return JSON_CONFIG
+    return {**JSON_CONFIG, "response_schema": response_schema(model_cls)}
+
+
+def generate(prompt: str, model: str, config: Optional[Dict[str, Any]] = None,
+             timeout: float = MODEL_TIMEOUT, attempts: int = MODEL_MAX_ATTEMPTS) -> str:
+    backend = get_backend()
+    config = config or JSON_CONFIG
+    token = cancellation.current()
+    with tracing.span("generate", model=model, backend=backend.name, bytes_in=len(prompt),
+                      prompt_tokens=len(prompt) // CHARS_PER_TOKEN) as span:
+        for attempt in Retrying(**_retry_kwargs(attempts)):
+            with attempt:
+                _limiter.acquire(estimate_tokens(prompt))
+                cancellation.checkpoint()
+                if token is None:
+                    text = backend.generate(model, prompt, config, timeout)
+                else:
+                    # Cancellable jobs go through the async client so a cancel aborts the request
+                    text = run_coroutine(cancellation.run_cancellable(
+                        backend.agenerate(model, prompt, config, timeout), token))
+        span.set(attempts=attempt.retry_state.attempt_number, bytes_out=len(text),
+                 response_tokens=len(text) // CHARS_PER_TOKEN)
+        return text
+
+
+async def agenerate(prompt: str, model: str, config: Optional[Dict[str, Any]] = None,
+                    timeout: float = MODEL_TIMEOUT, attempts: int = MODEL_MAX_ATTEMPTS) -> str:
+    backend = get_backend()
+    config = config or JSON_CONFIG
+    token = cancellation.current()
+    with tracing.span("generate", model=model, backend=backend.name, bytes_in=len(prompt),
+                      prompt_tokens=len(prompt) // CHARS_PER_TOKEN) as span:
+        async for attempt in AsyncRetrying(**_retry_kwargs(attempts)):
+            with attempt:
+                await _limiter.acquire_async(estimate_tokens(prompt))
+                cancellation.checkpoint()
+                call = backend.agenerate(model, prompt, config, timeout)
+                text = await (call if token is None else cancellation.run_cancellable(call, token))
+        span.set(attempts=attempt.retry_state.attempt_number, bytes_out=len(text),
+                 response_tokens=len(text) // CHARS_PER_TOKEN)
+        return text
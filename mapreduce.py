@@ -0,0 +1,124 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sections import CHARS_PER_TOKEN
+
+
+# Fields that are merged as ordered, de-duplicated lists
+LIST_FIELDS = ["risk_factors", "insights", "opportunities", "risks", "takeaways"]
+
+
+def approx_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+# Chunking
+# ------------------------------
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 200) -> List[str]:
+    # Splits on paragraph breaks where possible; a small overlap keeps tables
+    # that straddle a boundary readable in at least one chunk.
+    limit = max_tokens * CHARS_PER_TOKEN
+    overlap = overlap_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + limit, len(text))
+        if end < len(text):
+            cut = text.rfind("\n\n", start + limit // 2, end)
+            if cut == -1:
+                cut = text.rfind("\n", start + limit // 2, end)
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+# Map step
+# ------------------------------
+async def map_chunks(call: Callable[[str], Awaitable[Optional[Dict[str, Any]]]], prompts: List[str],
+                     concurrency: int = 4) -> List[Optional[Dict[str, Any]]]:
+    # Runs call(prompt) for every chunk with at most `concurrency` in flight.
+    # Results keep chunk order; a failed chunk yields None instead of failing the batch.
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(i: int, prompt: str):
+        async with sem:
+            try:
+                return await call(prompt)
+            except Exception as e:
+                print(f"Chunk {i + 1}/{len(prompts)} error: {e}")
+                return None
+
+    return await asyncio.gather(*(run(i, p) for i, p in enumerate(prompts)))
+
+
+# Reduce step
+# ------------------------------
+def _year_key(row: Dict[str, Any]) -> Optional[int]:
+    y = row.get("Year", row.get("year"))
+    try:
+        return int(str(y).strip()[:4])
+    except Exception:
+        return None
+
+
+def merge_historical(rows_per_chunk: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # One row per Year; for each column the first non-null value in chunk order wins
+    merged: Dict[int, Dict[str, Any]] = {}
+    for rows in rows_per_chunk:
+        for row in rows or []:
+            if not isinstance(row, dict):
+                continue
+            year = _year_key(row)
+            if year is None:
+                continue
+            target = merged.setdefault(year, {"Year": year})
+            for k, v in row.items():
+                if k.lower() == "year" or v is None:
+                    continue
+                target.setdefault(k, v)
+    return [merged[y] for y in sorted(merged)]
+
+
+def _merge_unique(values: List[Any]) -> List[Any]:
+    seen = set()
+    out = []
+    for v in values:
+        key = json.dumps(v, sort_keys=True, default=str).lower()
+        if key not in seen:
+            seen.add(key)
+            out.append(v)
+    return out
+
+
+def merge_partials(partials: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    # Deterministic merge of per-chunk JSON objects into one report dict
+    partials = [p for p in partials if isinstance(p, dict)]
+    merged: Dict[str, Any] = {}
+    for p in partials:
+        for k, v in p.items():
+            if k in LIST_FIELDS or k in ("historical_financials", "segment_performance"):
+                continue
+            if v not in (None, "", []) and merged.get(k) in (None, ""):
+                merged[k] = v
+    for field in LIST_FIELDS:
+        items = [x for p in partials for x in (p.get(field) or []) if x]
+        if items:
+            merged[field] = _merge_unique(items)
+    segments = [x for p in partials for x in (p.get("segment_performance") or []) if x]
+    if segments:
+        merged["segment_performance"] = _merge_unique(segments)
+    hist = merge_historical([p.get("historical_financials") or [] for p in partials])
+    if hist:
+        merged["historical_financials"] = hist
+    # executive summaries from every chunk are joined; the reduce call condenses them
+    summaries = [p["executive_summary"] for p in partials if p.get("executive_summary")]
+    if summaries:
+        merged["executive_summary"] = "\n\n".join(summaries)
+    return merged
@@ -0,0 +1,161 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import List, Optional, Tuple
+
+from extraction import FilingDocument
+
+
+# Bumped whenever the cleaned text changes (part of the token-count cache key)
+NORMALIZER_VERSION = "clean2"
+
+# Running headers / footers: lines near the page edges that repeat on this share of pages
+EDGE_LINES = 4
+REPEAT_FRACTION = 0.3
+MIN_REPEAT_PAGES = 4
+
+# A forward-looking statements block is never longer than this (stops runaway drops)
+FLS_MAX_CHARS = 15000
+# Same for an exhibit index that never reaches the Signatures heading
+EXHIBITS_MAX_CHARS = 20000
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"[ \t\xa0\u2000-\u200b]+")
+_PAGE_NUMBER_RE = re.compile(r"^(page\s+)?[-–—]?\s*([ivxlc]{1,6}|[a-z]-\d{1,3}|\d{1,3})\s*[-–—]?(\s+of\s+\d+)?$",
+                             re.IGNORECASE)
+_TOC_LINK_RE = re.compile(r"^\[?(table of contents|back to contents|return to table of contents|index)\]?$",
+                          re.IGNORECASE)
+_TOC_ENTRY_RE = re.compile(r"^(part|item)\s+[\divx]+[a-c]?\b|\s\d{1,3}$|^\d{1,3}$", re.IGNORECASE)
+_TOC_ITEM_RE = re.compile(r"^(part|item)\s+[\divx]+[a-c]?\b", re.IGNORECASE)
+_FLS_RE = re.compile(r"^((special|cautionary)\s+(note|statement|language)s?\s+(regarding|concerning|about|on)\s+)?"
+                     r"forward[- ]looking\s+(statements|information)\.?$", re.IGNORECASE)
+_EXHIBIT_INDEX_RE = re.compile(r"^(exhibit\s+index|index\s+to\s+exhibits)$", re.IGNORECASE)
+_SIGNATURE_RE = re.compile(r"^signatures?$", re.IGNORECASE)
+_SECTION_RE = re.compile(r"^(part\s+[ivx]+|item\s+\d{1,2}(\.\d{2}|[a-c])?)\b", re.IGNORECASE)
+
+
+@dataclass
+class CleanStats:
+    chars_before: int = 0
+    chars_after: int = 0
+    header_lines: int = 0
+    page_numbers: int = 0
+    toc_lines: int = 0
+    boilerplate_lines: int = 0
+
+    @property
+    def chars_saved(self) -> int:
+        return self.chars_before - self.chars_after
+
+    @property
+    def fraction_saved(self) -> float:
+        return self.chars_saved / self.chars_before if self.chars_before else 0.0
+
+
+def _key(line: str) -> str:
+    # Page numbers and dates vary from page to page; the rest of a running header does not
+    return _DIGITS_RE.sub("#", line.lower())
+
+
+def _lines(page: str) -> List[str]:
+    return [_SPACE_RE.sub(" ", line).strip() for line in page.split("\n")]
+
+
+def _edge_indices(lines: List[str], n: int = EDGE_LINES) -> List[int]:
+    filled = [i for i, line in enumerate(lines) if line]
+    return sorted(set(filled[:n] + filled[-n:]))
+
+
+# Frequency index
+# ------------------------------
+def repeated_lines(pages: List[List[str]]) -> set:
+    # Normalized edge lines present on enough pages to be page furniture
+    counts: Counter = Counter()
+    for lines in pages:
+        counts.update({_key(lines[i]) for i in _edge_indices(lines)})
+    threshold = max(MIN_REPEAT_PAGES, int(REPEAT_FRACTION * len(pages)))
+    return {key for key, n in counts.items() if n >= threshold}
+
+
+def _is_toc_page(lines: List[str]) -> bool:
+    filled = [line for line in lines if line]
+    items = sum(1 for line in filled if _TOC_ITEM_RE.match(line))
+    entries = sum(1 for line in filled if _TOC_ENTRY_RE.search(line))
+    return items >= 3 and entries >= len(filled) / 2
+
+
+def _is_heading(line: str) -> bool:
+    return bool(_SECTION_RE.match(line)) or (
+        len(line) < 80 and not line.endswith((".", ",", ";", ":")) and line[:1].isupper()
+        and len(line.split()) <= 10 and (line.isupper() or line.istitle())
+    )
+
+
+# Cleaning
+# ------------------------------
+def clean_pages(pages: List[str]) -> Tuple[List[str], CleanStats]:
+    # Page count and order are preserved so page indices still match the PDF
+    stats = CleanStats(chars_before=sum(len(p) for p in pages))
+    split = [_lines(p) for p in pages]
+    furniture = repeated_lines(split) if len(split) >= MIN_REPEAT_PAGES else set()
+
+    block: Optional[str] = None  # "fls" or "exhibits" while inside a known boilerplate block
+    block_chars = 0
+    cleaned = []
+    for lines in split:
+        edges = set(_edge_indices(lines))
+        toc_page = _is_toc_page(lines)
+        out = []
+        for i, line in enumerate(lines):
+            if not line:
+                if out and out[-1]:
+                    out.append("")
+                continue
+            if i in edges and _key(line) in furniture:
+                stats.header_lines += 1
+                continue
+            if i in edges and _PAGE_NUMBER_RE.match(line):
+                stats.page_numbers += 1
+                continue
+            if _TOC_LINK_RE.match(line) or (toc_page and _TOC_ENTRY_RE.search(line)):
+                stats.toc_lines += 1
+                continue
+
+            if block == "fls":
+                # Ends at the next heading once some text has been dropped
+                if (block_chars > 200 and _is_heading(line)) or block_chars > FLS_MAX_CHARS:
+                    block = None
+                else:
+                    block_chars += len(line)
+                    stats.boilerplate_lines += 1
+                    continue
+            elif block == "exhibits":
+                # Ends at Signatures or the next Part / Item heading
+                if _SIGNATURE_RE.match(line) or _SECTION_RE.match(line) or block_chars > EXHIBITS_MAX_CHARS:
+                    block = None
+                else:
+                    block_chars += len(line)
+                    stats.boilerplate_lines += 1
+                    continue
+
+            if _FLS_RE.match(line):
+                block, block_chars = "fls", 0
+                stats.boilerplate_lines += 1
+                continue
+            if _EXHIBIT_INDEX_RE.match(line) and not toc_page:
+                block, block_chars = "exhibits", 0
+                stats.boilerplate_lines += 1
+                continue
+            out.append(line)
+        while out and not out[-1]:
+            out.pop()
+        cleaned.append("\n".join(out) + "\n" if out else "")
+    stats.chars_after = sum(len(p) for p in cleaned)
+    return cleaned, stats
+
+
+def clean_document(document: FilingDocument) -> Tuple[FilingDocument, CleanStats]:
+    pages, stats = clean_pages(document.pages)
+    cleaned = replace(document, pages=pages, offsets=[], token_counts={}, retrieval_index=None,
+                      variant=NORMALIZER_VERSION)
+    return cleaned, stats
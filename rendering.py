@@ -0,0 +1,106 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import CACHE_DIR
+
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+# Report type -> (HTML template, stylesheet) inside TEMPLATE_DIR
+TEMPLATES = {
+    "10-K": ("annual_report.html", "annual_report.css"),
+    "8-K": ("eight_k_report.html", "eight_k_report.css"),
+}
+
+_lock = threading.Lock()
+_env = None
+_font_config = None
+_stylesheets: Dict[str, Any] = {}
+
+
+# Template registry
+# ------------------------------
+def get_environment():
+    # One Environment per process: templates are compiled once and the compiled
+    # bytecode is cached on disk, so later processes skip parsing as well.
+    global _env
+    if _env is None:
+        with _lock:
+            if _env is None:
+                from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+                bytecode_dir = CACHE_DIR / "jinja"
+                bytecode_dir.mkdir(parents=True, exist_ok=True)
+                _env = Environment(
+                    loader=FileSystemLoader(str(TEMPLATE_DIR)),
+                    bytecode_cache=FileSystemBytecodeCache(str(bytecode_dir)),
+                    auto_reload=False,
+                )
+    return _env
+
+
+def render_html(kind: str, context: Dict[str, Any]) -> str:
+    template_name, _ = TEMPLATES[kind]
+    return get_environment().get_template(template_name).render(**context)
+
+
+# PDF engine
+# ------------------------------
+def get_font_config():
+    global _font_config
+    if _font_config is None:
+        with _lock:
+            if _font_config is None:
+                from weasyprint.text.fonts import FontConfiguration
+                _font_config = FontConfiguration()
+    return _font_config
+
+
+def get_stylesheet(kind: str):
+    # Parsed once per process and reused for every report of that type
+    if kind not in _stylesheets:
+        font_config = get_font_config()
+        with _lock:
+            if kind not in _stylesheets:
+                from weasyprint import CSS
+                _, css_name = TEMPLATES[kind]
+                _stylesheets[kind] = CSS(filename=str(TEMPLATE_DIR / css_name), font_config=font_config)
+    return _stylesheets[kind]
+
+
+def html_to_pdf(html: str, kind: Optional[str] = None, target: Optional[str] = None) -> Optional[bytes]:
+    # Returns the PDF bytes, or writes them to `target` and returns None
+    from weasyprint import HTML
+    stylesheets = [get_stylesheet(kind)] if kind else []
+    return HTML(string=html, base_url=str(TEMPLATE_DIR)).write_pdf(
+        target, stylesheets=stylesheets, font_config=get_font_config()
+    )
+
+
+def render_pdf(kind: str, context: Dict[str, Any]) -> bytes:
+    return html_to_pdf(render_html(kind, context), kind)
+
+
+def warm_up() -> None:
+    get_environment()
+    for kind, (template_name, _) in TEMPLATES.items():
+        get_environment().get_template(template_name)
+        get_stylesheet(kind)
+
+
+# Batch rendering
+# ------------------------------
+def _render_job(job: Tuple[str, Dict[str, Any]]) -> bytes:
+    kind, context = job
+    return render_pdf(kind, context)
+
+
+def render_many(jobs: List[Tuple[str, Dict[str, Any]]], workers: Optional[int] = None) -> List[bytes]:
+    # Each worker warms its engine once, then renders many reports with it
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(jobs) <= 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as pool:
+        return list(pool.map(_render_job, jobs))
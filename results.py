@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+
+# Results are kept apart from the caches: clearing a cache never loses a report
+RESULTS_DB = Path(os.getenv("RESULTS_DB", Path.home() / ".local" / "share" / "report_summarizer" / "results.sqlite3"))
+
+# historical_financials keys -> columns
+HIST_COLUMNS = {
+    "Total Revenue": "total_revenue",
+    "Net Income": "net_income",
+    "Total Assets": "total_assets",
+    "Total Liabilities": "total_liabilities",
+    "Equity": "equity",
+    "Cash Flow": "cash_flow",
+}
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS reports ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, cik TEXT, company_name TEXT,"
+    " fiscal_year INTEGER, filing_date TEXT, source_sha256 TEXT, source_path TEXT, pdf_path TEXT,"
+    " payload TEXT NOT NULL, created REAL NOT NULL, UNIQUE (kind, source_sha256))",
+    "CREATE INDEX IF NOT EXISTS idx_reports_cik ON reports(cik, kind, fiscal_year)",
+    "CREATE INDEX IF NOT EXISTS idx_reports_company ON reports(company_name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_reports_year ON reports(fiscal_year)",
+    "CREATE INDEX IF NOT EXISTS idx_reports_filing_date ON reports(filing_date)",
+    "CREATE TABLE IF NOT EXISTS historical_financials ("
+    " report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE, cik TEXT, year INTEGER NOT NULL,"
+    + "".join(f" {col} REAL," for col in HIST_COLUMNS.values())
+    + " PRIMARY KEY (report_id, year))",
+    "CREATE INDEX IF NOT EXISTS idx_hist_cik_year ON historical_financials(cik, year)",
+]
+
+
+class StoredReport(NamedTuple):
+    id: int
+    kind: str
+    cik: Optional[str]
+    company_name: Optional[str]
+    fiscal_year: Optional[int]
+    filing_date: Optional[str]
+    source_path: Optional[str]
+    pdf_path: Optional[str]
+    payload: str
+    created: float
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return json.loads(self.payload)
+
+
+_COLUMNS = "id, kind, cik, company_name, fiscal_year, filing_date, source_path, pdf_path, payload, created"
+
+
+def _iso(value: Any) -> Optional[str]:
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10] if value else None
+
+
+def _year(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultStore:
+    # Every validated AnnualReport / EightKReport, with historical_financials split
+    # into one row per (report, year) so multi-year series are a single query
+
+    def __init__(self, path: Path = RESULTS_DB):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, report, kind: str, source_sha256: Optional[str] = None, source_path: Optional[str] = None,
+             pdf_path: Optional[str] = None) -> int:
+        # `report` is a pydantic model; the same source file saved twice replaces the older row
+        data = json.loads(report.model_dump_json())
+        cik = str(data.get("cik") or "").strip().lstrip("0") or None
+        if kind == "10-K":
+            fiscal_year = _year(str(data.get("fiscal_year_end") or "")[:4])
+        else:
+            fiscal_year = None
+        row = (kind, cik, data.get("company_name"), fiscal_year, _iso(data.get("filing_date")),
+               source_sha256, source_path, pdf_path, json.dumps(data, ensure_ascii=False), time.time())
+        with self._lock, self._connect() as conn:
+            if source_sha256 is not None:
+                conn.execute("DELETE FROM reports WHERE kind = ? AND source_sha256 = ?", (kind, source_sha256))
+            cur = conn.execute(
+                "INSERT INTO reports (kind, cik, company_name, fiscal_year, filing_date, source_sha256,"
+                " source_path, pdf_path, payload, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            report_id = cur.lastrowid
+            hist = []
+            for entry in data.get("historical_financials") or []:
+                year = _year(entry.get("Year"))
+                if year is not None:
+                    hist.append((report_id, cik, year, *(_number(entry.get(k)) for k in HIST_COLUMNS)))
+            if hist:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO historical_financials (report_id, cik, year, "
+                    + ", ".join(HIST_COLUMNS.values()) + ") VALUES (" + ", ".join("?" * (3 + len(HIST_COLUMNS))) + ")",
+                    hist,
+                )
+        return report_id
+
+    def set_pdf_path(self, report_id: int, pdf_path: Optional[str]) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE reports SET pdf_path = ? WHERE id = ?", (pdf_path, report_id))
+
+    # Queries
+    # ------------------------------
+    def get(self, report_id: int) -> Optional[StoredReport]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(f"SELECT {_COLUMNS} FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return StoredReport(*row) if row else None
+
+    def find(self, cik: Optional[str] = None, company: Optional[str] = None, kind: Optional[str] = None,
+             fiscal_year: Optional[int] = None, filed_from: Optional[str] = None, filed_to: Optional[str] = None,
+             limit: int = 100) -> List[StoredReport]:
+        # company matches case-insensitively as a prefix; filed_from / filed_to are YYYY-MM-DD, inclusive
+        where, args = [], []
+        if cik is not None:
+            where.append("cik = ?")
+            args.append(str(cik).lstrip("0"))
+        if company is not None:
+            where.append("company_name LIKE ? ESCAPE '\\' COLLATE NOCASE")
+            args.append(company.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if kind is not None:
+            where.append("kind = ?")
+            args.append(kind)
+        if fiscal_year is not None:
+            where.append("fiscal_year = ?")
+            args.append(fiscal_year)
+        if filed_from is not None:
+            where.append("filing_date >= ?")
+            args.append(filed_from)
+        if filed_to is not None:
+            where.append("filing_date <= ?")
+            args.append(filed_to)
+        sql = f"SELECT {_COLUMNS} FROM reports"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY filing_date DESC, created DESC LIMIT ?"
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(sql, (*args, limit)).fetchall()
+        return [StoredReport(*row) for row in rows]
+
+    def latest(self, cik: str, kind: str = "10-K") -> Optional[StoredReport]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM reports WHERE cik = ? AND kind = ?"
+                " ORDER BY fiscal_year DESC, filing_date DESC, created DESC LIMIT 1",
+                (str(cik).lstrip("0"), kind),
+            ).fetchone()
+        return StoredReport(*row) if row else None
+
+    def financial_history(self, cik: str) -> List[Dict[str, Any]]:
+        # One row per year across all stored 10-Ks of the company; the newest filing wins
+        # (restated figures). Same shape as AnnualReport.historical_financials.
+        cols = ", ".join(f"h.{c}" for c in HIST_COLUMNS.values())
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT h.year, {cols} FROM historical_financials h JOIN reports r ON r.id = h.report_id"
+                " WHERE h.cik = ? ORDER BY h.year, r.fiscal_year, r.created",
+                (str(cik).lstrip("0"),),
+            ).fetchall()
+        by_year: Dict[int, Dict[str, Any]] = {}
+        for year, *values in rows:
+            by_year[year] = {"Year": year, **{k: v for k, v in zip(HIST_COLUMNS, values)}}
+        return [by_year[y] for y in sorted(by_year)]
+
+    def companies(self) -> List[Dict[str, Any]]:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT cik, MAX(company_name), COUNT(*), MIN(fiscal_year), MAX(fiscal_year) FROM reports"
+                " WHERE cik IS NOT NULL GROUP BY cik ORDER BY MAX(company_name) COLLATE NOCASE"
+            ).fetchall()
+        return [{"cik": r[0], "company_name": r[1], "reports": r[2], "first_year": r[3], "last_year": r[4]}
+                for r in rows]
+
+    def delete(self, report_id: int) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+
+
+_result_store: Optional[ResultStore] = None
+
+
+def get_result_store() -> Optional[ResultStore]:
+    # RESULT_STORE=off disables persisting results
+    global _result_store
+    if os.getenv("RESULT_STORE", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    if _result_store is None:
+        _result_store = ResultStore()
+    return _result_store
@@ -0,0 +1,168 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+# Bumped when chunking / tokenization changes (part of the cache file name)
+INDEX_VERSION = "bm25-1"
+
+# RETRIEVAL_INDEX=off skips building the index at extraction time (it is then built on first question)
+RETRIEVAL_INDEX = os.getenv("RETRIEVAL_INDEX", "on").lower() not in ("0", "off", "false", "no")
+
+# Paragraphs are packed into chunks of about this size; longer paragraphs are split
+CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1500"))
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which who"
+    " will with how many much does did do our we their".split()
+)
+
+
+def _stem(token: str) -> str:
+    # Plural folding only: "maturities" -> "maturity", "employees" -> "employee"
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    # "num_employees" -> ["num", "employee"]; "1,234.5" stays one token
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower().replace("_", " ")) if t not in _STOPWORDS]
+
+
+# Chunking
+# ------------------------------
+class Chunk(NamedTuple):
+    # A span of one page: pages[page][start:end]
+    page: int
+    start: int
+    end: int
+
+
+def chunk_pages(pages: List[str], max_chars: int = CHUNK_CHARS) -> List[Chunk]:
+    # Paragraph chunks that never cross a page boundary, so every hit cites one page
+    chunks: List[Chunk] = []
+    for i, page in enumerate(pages):
+        bounds, pos = [], 0
+        for m in _PARAGRAPH_RE.finditer(page):
+            bounds.append((pos, m.start()))
+            pos = m.end()
+        bounds.append((pos, len(page)))
+
+        start = end = None
+        for p_start, p_end in bounds:
+            if not page[p_start:p_end].strip():
+                continue
+            if start is not None and p_end - start > max_chars:
+                chunks.append(Chunk(i, start, end))
+                start = None
+            if start is None:
+                start = p_start
+            end = p_end
+            while end - start > max_chars:
+                # One paragraph longer than a chunk (tables, run-on text): cut at a line break
+                cut = page.rfind("\n", start, start + max_chars)
+                cut = cut if cut > start else start + max_chars
+                chunks.append(Chunk(i, start, cut))
+                start = cut
+        if start is not None and page[start:end].strip():
+            chunks.append(Chunk(i, start, end))
+    return chunks
+
+
+# Index
+# ------------------------------
+class RetrievalIndex:
+    # BM25 over page/paragraph chunks. Chunk text is not stored: chunks are offsets
+    # into the page list, which the text cache already has.
+
+    def __init__(self, chunks: List[Chunk], lengths: List[int], postings: Dict[str, List[int]]):
+        self.chunks = chunks
+        self.lengths = lengths
+        # term -> flat [chunk id, term frequency, chunk id, term frequency, ...]
+        self.postings = postings
+        self.avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def build(cls, pages: List[str], max_chars: int = CHUNK_CHARS) -> "RetrievalIndex":
+        chunks = chunk_pages(pages, max_chars)
+        lengths: List[int] = []
+        postings: Dict[str, List[int]] = {}
+        for cid, chunk in enumerate(chunks):
+            counts = Counter(tokenize(pages[chunk.page][chunk.start:chunk.end]))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).extend((cid, tf))
+        return cls(chunks, lengths, postings)
+
+    def search(self, query: str, k: int = TOP_K) -> List[Tuple[float, int]]:
+        # (score, chunk id), best first
+        n = len(self.chunks)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting) // 2
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for j in range(0, len(posting), 2):
+                cid, tf = posting[j], posting[j + 1]
+                norm = K1 * (1 - B + B * self.lengths[cid] / (self.avg_length or 1))
+                scores[cid] = scores.get(cid, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(score, cid) for cid, score in best]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"version": INDEX_VERSION, "chunks": [list(c) for c in self.chunks],
+                "lengths": self.lengths, "postings": self.postings}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> Optional["RetrievalIndex"]:
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls([Chunk(*c) for c in data["chunks"]], data["lengths"], data["postings"])
+
+
+def chunk_text(pages: List[str], chunk: Chunk) -> str:
+    return pages[chunk.page][chunk.start:chunk.end].strip()
+
+
+def get_index(document) -> RetrievalIndex:
+    # Memoized on the document and cached on disk next to its extracted text
+    from cache import get_text_cache
+    from extraction import EXTRACTOR_VERSION
+
+    if document.retrieval_index is not None:
+        return document.retrieval_index
+    version = EXTRACTOR_VERSION + (f"+{document.variant}" if document.variant else "")
+    cache = get_text_cache() if document.sha256 else None
+    data = cache.get_index(document.sha256, version, INDEX_VERSION) if cache else None
+    index = RetrievalIndex.from_json(data) if data else None
+    if index is None or (index.chunks and index.chunks[-1].page >= document.page_count):
+        index = RetrievalIndex.build(document.pages)
+        if cache is not None:
+            try:
+                cache.put_index(document.sha256, version, INDEX_VERSION, index.to_json())
+            except Exception as e:
+                print(f"Retrieval index cache write error: {e}")
+    document.retrieval_index = index
+    return index
+
+
+def retrieve(document, question: str, k: int = TOP_K) -> List[Tuple[Chunk, str, float]]:
+    # Top-k chunks for the question, in page order (easier for the model to read)
+    index = get_index(document)
+    hits = index.search(question, k)
+    results = [(index.chunks[cid], chunk_text(document.pages, index.chunks[cid]), score) for score, cid in hits]
+    return sorted(results, key=lambda r: (r[0].page, r[0].start))
@@ -0,0 +1,334 @@
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import tracing
+from cache import CACHE_DIR
+
+T = TypeVar("T")
+
+# MODEL_ROUTING: "on" (DEFAULT_POLICY), "off" (everything on DEFAULT_MODEL) or a policy JSON file
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "on")
+# MODEL_CASCADE=on retries a call on the next tier when validation finds too many missing fields
+MODEL_CASCADE = os.getenv("MODEL_CASCADE", "off").lower() in ("1", "on", "true", "yes")
+# One JSON line per routed call; ROUTING_LOG=off disables it
+ROUTING_LOG = os.getenv("ROUTING_LOG", str(CACHE_DIR / "routing.jsonl"))
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Same cutoff as summarizer.MAP_REDUCE_TOKEN_BUDGET: larger 10-Ks go through map-reduce in auto mode,
+# so the long tier only sees single calls forced over it (mode="single")
+LONG_PROMPT_TOKENS = int(os.getenv("MAP_REDUCE_TOKEN_BUDGET", "200000"))
+
+# Tasks: "10-K", "10-K-chunk", "10-K-reduce" (map-reduce), "10-K-section", "10-K-section-reduce"
+# (incremental), "8-K", "8-K-pack", "qa", "repair".
+# Rules are tried in order; the first match wins. Token counts are the prompt's, measured with
+# summarizer.count_tokens (the tokenizer preflight trims with).
+DEFAULT_POLICY: Dict[str, Any] = {
+    "tiers": {
+        "fast": "gemini-2.0-flash-lite",
+        "standard": DEFAULT_MODEL,
+        "long": "gemini-2.5-pro",
+    },
+    "rules": [
+        {"task": "8-K", "max_tokens": 8000, "tier": "fast"},
+        {"task": "qa", "tier": "fast"},
+        {"task": "repair", "tier": "fast"},
+        # A single call over a whole large 10-K; map-reduce chunks and the (short) reduce prompt stay on standard
+        {"task": "10-K", "min_tokens": LONG_PROMPT_TOKENS, "tier": "long"},
+    ],
+    "default": "standard",
+    "cascade": ["fast", "standard", "long"],
+    "max_missing": 0.34,
+}
+
+
+# Policy
+# ------------------------------
+@dataclass
+class Rule:
+    tier: str
+    task: str = "*"
+    min_tokens: int = 0
+    max_tokens: Optional[int] = None
+
+    def matches(self, task: str, tokens: int) -> bool:
+        return (self.task in ("*", task) and tokens >= self.min_tokens
+                and (self.max_tokens is None or tokens <= self.max_tokens))
+
+
+@dataclass
+class RoutingPolicy:
+    tiers: Dict[str, str]
+    rules: List[Rule] = field(default_factory=list)
+    default: str = "standard"
+    # Escalation order; a call is only retried on a tier after its own
+    cascade: List[str] = field(default_factory=list)
+    cascade_enabled: bool = False
+    # Share of expected fields that may be missing before the cascade escalates
+    max_missing: float = 0.34
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], cascade_enabled: bool = MODEL_CASCADE) -> "RoutingPolicy":
+        return cls(tiers=dict(data["tiers"]), rules=[Rule(**r) for r in data.get("rules", [])],
+                   default=data.get("default", "standard"), cascade=list(data.get("cascade", [])),
+                   cascade_enabled=data.get("cascade_enabled", cascade_enabled),
+                   max_missing=float(data.get("max_missing", 0.34)))
+
+    @classmethod
+    def single(cls, model: str) -> "RoutingPolicy":
+        return cls(tiers={"standard": model})
+
+    def route(self, task: str, tokens: int) -> Tuple[str, str]:
+        # (tier, model)
+        tier = next((r.tier for r in self.rules if r.matches(task, tokens)), self.default)
+        if tier not in self.tiers:
+            tier = self.default
+        return tier, self.tiers[tier]
+
+    def escalate(self, tier: str) -> Optional[Tuple[str, str]]:
+        if not self.cascade_enabled or tier not in self.cascade:
+            return None
+        for nxt in self.cascade[self.cascade.index(tier) + 1:]:
+            if nxt in self.tiers and self.tiers[nxt] != self.tiers[tier]:
+                return nxt, self.tiers[nxt]
+        return None
+
+    def chain(self, tier: str) -> List[str]:
+        # Models a call starting on `tier` can end up on
+        models = [self.tiers[tier]]
+        step = self.escalate(tier)
+        while step is not None:
+            tier, model = step
+            models.append(model)
+            step = self.escalate(tier)
+        return models
+
+
+def load_policy(spec: str = MODEL_ROUTING) -> RoutingPolicy:
+    if spec.lower() in ("0", "off", "false", "no"):
+        return RoutingPolicy.single(DEFAULT_MODEL)
+    if spec.lower() in ("1", "on", "true", "yes", "default"):
+        return RoutingPolicy.from_dict(DEFAULT_POLICY)
+    try:
+        return RoutingPolicy.from_dict(json.loads(Path(spec).read_text(encoding="utf-8")))
+    except Exception as e:
+        print(f"Routing policy error ({spec}): {e}; using the default policy")
+        return RoutingPolicy.from_dict(DEFAULT_POLICY)
+
+
+_policy: Optional[RoutingPolicy] = None
+
+
+def get_policy() -> RoutingPolicy:
+    global _policy
+    if _policy is None:
+        _policy = load_policy()
+    return _policy
+
+
+def set_policy(policy: Optional[RoutingPolicy]) -> None:
+    global _policy
+    _policy = policy
+
+
+# Cache keys
+# ------------------------------
+def model_key(task: str, prompt_tokens: int, policy: Optional[RoutingPolicy] = None) -> str:
+    # Goes into response cache keys instead of a fixed model name: answers from different models
+    # (or cascades) never share a key, and a policy change invalidates the calls it reroutes
+    policy = policy or get_policy()
+    tier, _ = policy.route(task, prompt_tokens)
+    return ">".join(policy.chain(tier))
+
+
+def model_keys(task: str, policy: Optional[RoutingPolicy] = None) -> List[str]:
+    # model_key(task, n) for every prompt size n, for lookups made before the prompt exists
+    policy = policy or get_policy()
+    sizes = {0}
+    for rule in policy.rules:
+        if rule.task in ("*", task):
+            sizes.add(rule.min_tokens)
+            if rule.max_tokens is not None:
+                sizes.add(rule.max_tokens + 1)
+    return list(dict.fromkeys(model_key(task, n, policy) for n in sorted(sizes)))
+
+
+def task_key(*tasks: str, policy: Optional[RoutingPolicy] = None) -> str:
+    # For results built from many calls of varying size (map-reduce, incremental sections)
+    return "|".join(key for task in tasks for key in model_keys(task, policy))
+
+
+# Decision log
+# ------------------------------
+class RoutingLog:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                print(f"Routing log write error: {e}")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+
+_log: Optional[RoutingLog] = None
+
+
+def get_log() -> Optional[RoutingLog]:
+    global _log
+    if ROUTING_LOG.lower() in ("0", "off", "false", "no"):
+        return None
+    if _log is None:
+        _log = RoutingLog(Path(ROUTING_LOG))
+    return _log
+
+
+def missing_fraction(report: Any, fields: Optional[List[str]]) -> Optional[float]:
+    # Share of `fields` that are None / empty on a validated report
+    if report is None or not fields:
+        return None
+    missing = sum(1 for f in fields if getattr(report, f, None) in (None, "", []))
+    return missing / len(fields)
+
+
+def _record(task: str, tokens: int, tier: str, model: str, latency: float, missing: Optional[float],
+            error: Optional[BaseException], escalated_from: Optional[str], escalated: bool) -> None:
+    log = get_log()
+    if log is not None:
+        log.record({
+            "ts": round(time.time(), 3), "task": task, "prompt_tokens": tokens, "tier": tier, "model": model,
+            "latency_s": round(latency, 4), "missing": None if missing is None else round(missing, 3),
+            "error": f"{type(error).__name__}: {error}" if error else None,
+            "escalated_from": escalated_from, "escalated": escalated,
+        })
+
+
+# Routed calls
+# ------------------------------
+def _next_step(policy: RoutingPolicy, tier: str, error: Optional[BaseException],
+               missing: Optional[float]) -> Optional[Tuple[str, str]]:
+    # Escalate on a reply that failed validation (ValueError after repair) or misses too many fields
+    if isinstance(error, ValueError) or (missing is not None and missing > policy.max_missing):
+        return policy.escalate(tier)
+    return None
+
+
+def run(task: str, prompt_tokens: int, call: Callable[[str], T], fields: Optional[List[str]] = None,
+        policy: Optional[RoutingPolicy] = None) -> T:
+    # call(model) -> validated report; `fields` are the ones the cascade expects to be filled
+    policy = policy or get_policy()
+    tier, model = policy.route(task, prompt_tokens)
+    escalated_from = None
+    while True:
+        with tracing.span("route", task=task, tier=tier, model=model, prompt_tokens=prompt_tokens) as span:
+            t = time.perf_counter()
+            result, error = None, None
+            try:
+                result = call(model)
+            except Exception as e:
+                error = e
+            latency = time.perf_counter() - t
+            missing = missing_fraction(result, fields)
+            step = _next_step(policy, tier, error, missing)
+            span.set(missing=missing, escalated=int(step is not None))
+        _record(task, prompt_tokens, tier, model, latency, missing, error, escalated_from, step is not None)
+        if step is None:
+            if error is not None:
+                raise error
+            return result
+        print(f"Routing: {task} escalated from {tier} to {step[0]}")
+        escalated_from = tier
+        tier, model = step
+
+
+async def arun(task: str, prompt_tokens: int, call: Callable[[str], Awaitable[T]],
+               fields: Optional[List[str]] = None, policy: Optional[RoutingPolicy] = None) -> T:
+    policy = policy or get_policy()
+    tier, model = policy.route(task, prompt_tokens)
+    escalated_from = None
+    while True:
+        with tracing.span("route", task=task, tier=tier, model=model, prompt_tokens=prompt_tokens) as span:
+            t = time.perf_counter()
+            result, error = None, None
+            try:
+                result = await call(model)
+            except Exception as e:
+                error = e
+            latency = time.perf_counter() - t
+            missing = missing_fraction(result, fields)
+            step = _next_step(policy, tier, error, missing)
+            span.set(missing=missing, escalated=int(step is not None))
+        _record(task, prompt_tokens, tier, model, latency, missing, error, escalated_from, step is not None)
+        if step is None:
+            if error is not None:
+                raise error
+            return result
+        print(f"Routing: {task} escalated from {tier} to {step[0]}")
+        escalated_from = tier
+        tier, model = step
+
+
+# Log summary (policy tuning)
+# ------------------------------
+def summarize(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Per (task, tier): calls, median / p90 latency, mean missing share, escalation and error rates
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for e in entries:
+        groups[(e.get("task"), e.get("tier"))].append(e)
+    rows = []
+    for (task, tier), items in sorted(groups.items(), key=lambda kv: (str(kv[0][0]), str(kv[0][1]))):
+        latencies = sorted(e["latency_s"] for e in items)
+        missing = [e["missing"] for e in items if e.get("missing") is not None]
+        tokens = [e["prompt_tokens"] for e in items]
+        rows.append({
+            "task": task, "tier": tier, "model": items[-1].get("model"), "calls": len(items),
+            "tokens_p50": int(statistics.median(tokens)),
+            "latency_p50": statistics.median(latencies),
+            "latency_p90": latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))],
+            "missing_mean": statistics.mean(missing) if missing else None,
+            "escalated": sum(1 for e in items if e.get("escalated")) / len(items),
+            "errors": sum(1 for e in items if e.get("error")) / len(items),
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Summarize the model routing log.")
+    parser.add_argument("--log", default=ROUTING_LOG, help="routing log (JSON lines)")
+    args = parser.parse_args(argv)
+
+    rows = summarize(RoutingLog(Path(args.log)).entries())
+    if not rows:
+        print(f"No routing decisions in {args.log}")
+        return 0
+    print(f"{'task':<12} {'tier':<9} {'model':<24} {'calls':>6} {'tokens':>8} {'p50 s':>7} {'p90 s':>7} "
+          f"{'missing':>8} {'escal.':>7} {'errors':>7}")
+    for r in rows:
+        missing = f"{r['missing_mean']:.0%}" if r["missing_mean"] is not None else "-"
+        print(f"{r['task']:<12} {r['tier']:<9} {str(r['model']):<24} {r['calls']:>6} {r['tokens_p50']:>8} "
+              f"{r['latency_p50']:>7.2f} {r['latency_p90']:>7.2f} {missing:>8} {r['escalated']:>7.0%} {r['errors']:>7.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,176 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+# Items sent to the model and their token caps (~4 chars per token).
+# Anything not listed (TOC, Items 2-6, 9-16, exhibits, signatures) is dropped.
+SECTION_TOKEN_CAPS_10K: Dict[str, int] = {
+    "cover": 1500,
+    "1": 6000,
+    "1A": 6000,
+    "7": 12000,
+    "8": 20000,
+}
+
+# 8-K: every reported Item is kept except 9.01 (Financial Statements and Exhibits)
+SECTION_TOKEN_CAPS_8K: Dict[str, int] = {
+    "cover": 1000,
+    "default": 4000,
+    "9.01": 0,
+}
+
+CHARS_PER_TOKEN = 4
+
+ITEM_TITLES_10K = {
+    "1": "Business",
+    "1A": "Risk Factors",
+    "7": "Management's Discussion and Analysis of Financial Condition and Results of Operations",
+    "8": "Financial Statements and Supplementary Data",
+}
+
+_ITEM_RE_10K = re.compile(r"^[ \t]*item[ \t\xa0]+(\d{1,2}[A-C]?)\b[ \t]*[.:\-–—]?[ \t]*(.{0,120})$",
+                          re.IGNORECASE | re.MULTILINE)
+_PART_RE = re.compile(r"^[ \t]*part[ \t\xa0]+(IV|I{1,3})\b[ \t]*[.:\-–—]?[ \t]*(.{0,80})$",
+                      re.IGNORECASE | re.MULTILINE)
+_ITEM_RE_8K = re.compile(r"^[ \t]*item[ \t\xa0]+(\d{1,2}\.\d{2})\b[ \t]*[.:\-–—]?[ \t]*(.{0,160})$",
+                         re.IGNORECASE | re.MULTILINE)
+_TOC_RE = re.compile(r"^[ \t]*table[ \t]+of[ \t]+contents[ \t]*$", re.IGNORECASE | re.MULTILINE)
+_SIGNATURE_RE = re.compile(r"^[ \t]*signatures?[ \t]*$", re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass
+class Section:
+    id: str
+    title: str
+    start: int
+    end: int
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+
+# Indexing
+# ------------------------------
+def _pick_sections(matches: List[Section], text_len: int) -> List[Section]:
+    # The TOC lists every Item too; for each id keep the occurrence that opens
+    # the longest span, which is the real section and not its TOC line.
+    for i, sec in enumerate(matches):
+        sec.end = matches[i + 1].start if i + 1 < len(matches) else text_len
+    best: Dict[str, Section] = {}
+    for sec in matches:
+        if sec.id not in best or len(sec) > len(best[sec.id]):
+            best[sec.id] = sec
+    kept = sorted(best.values(), key=lambda s: s.start)
+    for i, sec in enumerate(kept):
+        sec.end = kept[i + 1].start if i + 1 < len(kept) else text_len
+    return kept
+
+
+def index_sections(text: str, kind: str = "10-K") -> List[Section]:
+    matches = []
+    if kind == "8-K":
+        for m in _ITEM_RE_8K.finditer(text):
+            matches.append(Section(m.group(1), m.group(2).strip(), m.start(), m.start()))
+    else:
+        for m in _ITEM_RE_10K.finditer(text):
+            matches.append(Section(m.group(1).upper(), m.group(2).strip(), m.start(), m.start()))
+        for m in _PART_RE.finditer(text):
+            matches.append(Section("PART " + m.group(1).upper(), m.group(2).strip(), m.start(), m.start()))
+    matches.sort(key=lambda s: s.start)
+    return _pick_sections(matches, len(text))
+
+
+def _cover_end(text: str, first_section: int) -> int:
+    toc = _TOC_RE.search(text, 0, first_section)
+    return toc.start() if toc else first_section
+
+
+def _cap(body: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    if len(body) <= limit:
+        return body
+    return body[:limit].rsplit(" ", 1)[0] + "\n[...truncated]"
+
+
+# Prompt text
+# ------------------------------
+def select_sections(text: str, kind: str = "10-K",
+                    caps: Optional[Dict[str, int]] = None) -> Tuple[str, List[Tuple[str, str]]]:
+    # Returns (text, [(section id, "=== title ===\nbody"), ...]) for every section that
+    # goes into the prompt, capped per section. The 8-K text comes back without its
+    # signature block.
+    if kind == "8-K":
+        caps = caps or SECTION_TOKEN_CAPS_8K
+        # Drop the signature block after the last Item
+        first_item = _ITEM_RE_8K.search(text)
+        sig = None
+        for sig in _SIGNATURE_RE.finditer(text):
+            pass
+        if sig is not None and first_item is not None and sig.start() > first_item.start():
+            text = text[:sig.start()]
+    else:
+        caps = caps or SECTION_TOKEN_CAPS_10K
+
+    sections = [s for s in index_sections(text, kind) if not s.id.startswith("PART")]
+    if not sections:
+        return text, []
+
+    parts = []
+    cover = text[:_cover_end(text, sections[0].start)].strip()
+    if cover and caps.get("cover", 0) > 0:
+        parts.append(("cover", "=== Cover Page ===\n" + _cap(cover, caps["cover"])))
+
+    for sec in sections:
+        cap = caps.get(sec.id, caps.get("default", 0))
+        if cap <= 0:
+            continue
+        body = text[sec.start:sec.end].strip()
+        title = sec.title or ITEM_TITLES_10K.get(sec.id, "")
+        parts.append((sec.id, f"=== Item {sec.id}. {title} ===\n" + _cap(body, cap)))
+    return text, parts
+
+
+def build_prompt_text(text: str, kind: str = "10-K", caps: Optional[Dict[str, int]] = None) -> str:
+    # Returns only the needed sections of the filing, capped per section.
+    # Falls back to the full text when no Item headers are recognised.
+    text, parts = select_sections(text, kind, caps)
+    if len(parts) <= 1:
+        return text
+    return "\n\n".join(body for _, body in parts)
+
+
+# Year-over-year comparison
+# ------------------------------
+_DIGITS_RE = re.compile(r"\d+")
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_section(body: str, ignore_digits: bool = False) -> str:
+    # Case, spacing and (optionally) years / figures do not make a section "changed"
+    body = _WS_RE.sub(" ", body.lower()).strip()
+    return _DIGITS_RE.sub("#", body) if ignore_digits else body
+
+
+def section_hash(body: str, ignore_digits: bool = False) -> str:
+    return hashlib.sha256(normalize_section(body, ignore_digits).encode("utf-8")).hexdigest()
+
+
+def diff_sections(old: str, new: str) -> Tuple[List[str], List[str], float]:
+    # Line-level diff: (added or rewritten blocks, removed blocks, changed share of the new text)
+    import difflib
+
+    old_lines = [line.strip() for line in old.splitlines() if line.strip()]
+    new_lines = [line.strip() for line in new.splitlines() if line.strip()]
+    matcher = difflib.SequenceMatcher(None, [normalize_section(line) for line in old_lines],
+                                      [normalize_section(line) for line in new_lines], autojunk=False)
+    added, removed = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "delete") and i2 > i1:
+            removed.append("\n".join(old_lines[i1:i2]))
+        if tag in ("replace", "insert") and j2 > j1:
+            added.append("\n".join(new_lines[j1:j2]))
+    total = sum(len(line) for line in new_lines)
+    changed = sum(len(b) for b in added) / total if total else 1.0
+    return added, removed, changed
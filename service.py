@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from cancellation import Cancelled, scope
+from extraction import extract_document, file_sha256
+from jobs import STAGE_LABELS, Job
+
+
+# Long-running local service: the summarizer, the genai client, matplotlib, fonts and compiled
+# templates are loaded once, and CPU workers stay warm between requests.
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8765"))
+SERVICE_MODEL_WORKERS = int(os.getenv("SERVICE_MODEL_WORKERS", "4"))
+# Filings accepted beyond the ones running; more are refused with 503
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "32"))
+# Finished jobs (and their PDF bytes) kept in memory for status / result requests
+SERVICE_MAX_JOBS = int(os.getenv("SERVICE_MAX_JOBS", "256"))
+SERVICE_MAX_UPLOAD_MB = int(os.getenv("SERVICE_MAX_UPLOAD_MB", "200"))
+UPLOAD_DIR = Path(os.getenv("SERVICE_UPLOAD_DIR", Path(tempfile.gettempdir()) / "report_summarizer_uploads"))
+
+# Longest ?wait= a status / result request may block for
+MAX_WAIT = 300.0
+
+
+# CPU stages (run in the process pool)
+# ------------------------------
+def _warm_worker() -> None:
+    try:
+        import summarizer
+        summarizer.warm_up()
+    except Exception as e:
+        print(f"Worker warm-up error: {e}")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _extract_stage(path: str):
+    from batch import detect_report_type
+    document = extract_document(path)
+    return document, detect_report_type(document, path)
+
+
+def _render_stage(kind: str, report) -> bytes:
+    import summarizer
+    return summarizer.render_pdf_stage(kind, report)
+
+
+# Jobs
+# ------------------------------
+@dataclass
+class ServiceJob(Job):
+    sha256: str = ""
+    label: str = ""
+    upload: bool = False
+    pdf: Optional[bytes] = None
+    created: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "name": self.label or self.name, "type": self.kind, "sha256": self.sha256,
+            "state": self.state, "stage": self.stage, "stage_label": self.stage_label, "error": self.error,
+            "created": self.created, "finished": self.finished_at, "pdf_bytes": len(self.pdf) if self.pdf else None,
+        }
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str, payload: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.status = status
+        self.payload = {**(payload or {}), "error": message}
+
+
+class ReportService:
+    def __init__(self, cpu_workers: Optional[int] = None, model_workers: int = SERVICE_MODEL_WORKERS,
+                 max_pending: int = SERVICE_QUEUE_SIZE, max_jobs: int = SERVICE_MAX_JOBS,
+                 upload_dir: Path = UPLOAD_DIR):
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.model_workers = max(1, model_workers)
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.upload_dir = Path(upload_dir)
+        # Extraction and PDF rendering in processes, model calls (blocking HTTP) in threads
+        self.cpu = ProcessPoolExecutor(max_workers=self.cpu_workers, initializer=_warm_worker)
+        self.io = ThreadPoolExecutor(max_workers=self.model_workers, thread_name_prefix="report-model")
+        self.jobs: "OrderedDict[int, ServiceJob]" = OrderedDict()
+        self._done: Dict[int, asyncio.Event] = {}
+        self._tasks: set = set()
+        self._ids = itertools.count(1)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.warm = False
+
+    async def start(self) -> None:
+        self._slots = asyncio.Semaphore(self.model_workers)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        t = time.perf_counter()
+        import summarizer
+        await loop.run_in_executor(self.io, summarizer.warm_up)
+        # Starts every CPU worker now (each runs _warm_worker once) instead of on the first request
+        await asyncio.gather(*(loop.run_in_executor(self.cpu, _ping) for _ in range(self.cpu_workers)))
+        self.warm = True
+        print(f"Warm-up done in {time.perf_counter() - t:.1f}s ({self.cpu_workers} CPU workers)")
+
+    def close(self) -> None:
+        for job in self.jobs.values():
+            job.token.cancel()
+        self.cpu.shutdown(wait=False, cancel_futures=True)
+        self.io.shutdown(wait=False, cancel_futures=True)
+
+    # Submission
+    # ------------------------------
+    def active(self) -> List[ServiceJob]:
+        return [job for job in self.jobs.values() if not job.finished]
+
+    def submit(self, path: str, kind: str, sha256: str, label: str = "", upload: bool = False) -> Tuple[ServiceJob, bool]:
+        # Returns (job, created). The same file already queued, running or done is not processed
+        # again; failed / cancelled jobs can be resubmitted.
+        existing = self.existing(sha256, kind)
+        if existing is not None:
+            return existing, False
+        self._check_capacity()
+
+        job = ServiceJob(next(self._ids), path, kind, f"{kind}:{sha256}", sha256=sha256, label=label, upload=upload)
+        job.token.on_stage = lambda stage, job=job: self._set_stage(job, stage)
+        self.jobs[job.id] = job
+        self._done[job.id] = asyncio.Event()
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._evict()
+        return job, True
+
+    def existing(self, sha256: str, kind: str) -> Optional[ServiceJob]:
+        # Matched on the resolved type: "auto" takes any job for the file, "10-K" / "8-K" also
+        # match an auto job once it was detected as that type
+        for job in reversed(self.jobs.values()):
+            if job.sha256 == sha256 and job.state not in ("failed", "cancelled") and kind in ("auto", job.kind):
+                return job
+        return None
+
+    def _check_capacity(self) -> None:
+        if len(self.active()) >= self.max_pending + self.model_workers:
+            raise HttpError(503, "too many filings in progress, retry later")
+
+    def cancel(self, job: ServiceJob) -> None:
+        job.token.cancel()
+
+    @staticmethod
+    def _set_stage(job: ServiceJob, stage: str) -> None:
+        if stage in STAGE_LABELS:
+            job.stage = stage
+
+    def _evict(self) -> None:
+        # Oldest finished jobs go first; running ones are never dropped
+        for job in [j for j in self.jobs.values() if j.finished][:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job.id]
+            self._done.pop(job.id, None)
+            if job.upload and not any(j.path == job.path for j in self.jobs.values()):
+                Path(job.path).unlink(missing_ok=True)
+
+    # Pipeline
+    # ------------------------------
+    def _checkpoint(self, job: ServiceJob, stage: str) -> None:
+        if job.token.cancelled:
+            raise Cancelled()
+        job.stage = stage
+
+    def _analyze(self, job: ServiceJob, document):
+        import summarizer
+        with scope(job.token):
+            return summarizer.analyze_stage(job.kind, document)
+
+    def _save(self, job: ServiceJob, report, document) -> None:
+        import summarizer
+        summarizer.save_stage(job.kind, report, document)
+
+    async def _run(self, job: ServiceJob) -> None:
+        # summarizer.run_pipeline's stages, each in the pool that suits it
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._slots:
+                job.state = "running"
+                self._checkpoint(job, "extract")
+                document, detected = await loop.run_in_executor(self.cpu, _extract_stage, job.path)
+                if job.kind not in ("10-K", "8-K"):
+                    job.kind = detected
+                self._checkpoint(job, "prompt")
+                report = await loop.run_in_executor(self.io, self._analyze, job, document)
+                self._checkpoint(job, "render")
+                job.pdf = await loop.run_in_executor(self.cpu, _render_stage, job.kind, report)
+                self._checkpoint(job, "save")
+                await loop.run_in_executor(self.io, self._save, job, report, document)
+                job.result = report
+                job.state = "done"
+        except Cancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.state = "failed"
+            print(f"Job {job.id} ({job.label or job.name}) failed: {job.error}")
+        finally:
+            job.finished_at = time.time()
+            self._done[job.id].set()
+
+    async def wait(self, job: ServiceJob, timeout: float) -> None:
+        if timeout > 0 and not job.finished:
+            try:
+                await asyncio.wait_for(self._done[job.id].wait(), min(timeout, MAX_WAIT))
+            except asyncio.TimeoutError:
+                pass
+
+    # HTTP
+    # ------------------------------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # One request per connection (Connection: close)
+        try:
+            try:
+                method, path, query, headers, body = await self._read_request(reader)
+                status, content_type, payload, extra = await self._route(method, path, query, headers, body)
+            except HttpError as e:
+                status, content_type, payload, extra = e.status, "application/json", e.payload, {}
+            except Exception as e:
+                print(f"Service error: {e}")
+                status, content_type, payload, extra = 500, "application/json", {"error": str(e)}, {}
+            if content_type == "application/json":
+                payload = json.dumps(payload, default=str).encode("utf-8")
+            head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}", "Connection: close"]
+            head += [f"{k}: {v}" for k, v in extra.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = (await reader.readline()).decode("latin-1").strip()
+        parts = line.split(" ")
+        if len(parts) != 3:
+            raise HttpError(400, "malformed request line")
+        method, target, _ = parts
+        headers: Dict[str, str] = {}
+        while True:
+            raw = await reader.readline()
+            if raw in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = raw.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > SERVICE_MAX_UPLOAD_MB * 1024 * 1024:
+            raise HttpError(413, f"upload larger than {SERVICE_MAX_UPLOAD_MB} MB")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return method.upper(), url.path.rstrip("/") or "/", parse_qs(url.query), headers, body
+
+    def _job(self, job_id: str) -> ServiceJob:
+        job = self.jobs.get(int(job_id))
+        if job is None:
+            raise HttpError(404, "unknown job")
+        return job
+
+    async def _route(self, method: str, path: str, query: Dict[str, List[str]], headers: Dict[str, str],
+                     body: bytes):
+        # -> (status, content type, payload, extra headers)
+        def arg(name: str, default: str = "") -> str:
+            return (query.get(name) or [default])[0]
+
+        if path == "/health" and method == "GET":
+            return 200, "application/json", {"ok": True, "warm": self.warm, "active": len(self.active()),
+                                             "jobs": len(self.jobs)}, {}
+        if path == "/jobs" and method == "GET":
+            return 200, "application/json", [job.to_json() for job in reversed(self.jobs.values())], {}
+        if path == "/jobs" and method == "POST":
+            job, created = await self._submit_request(query, headers, body)
+            return (202 if created else 200), "application/json", {**job.to_json(), "deduplicated": not created}, \
+                {"Location": f"/jobs/{job.id}"}
+
+        m = re.fullmatch(r"/jobs/(\d+)(?:/(result|pdf))?", path)
+        if m is None:
+            raise HttpError(404, "not found")
+        job = self._job(m.group(1))
+        if method == "DELETE" and m.group(2) is None:
+            self.cancel(job)
+            return 202, "application/json", job.to_json(), {}
+        if method != "GET":
+            raise HttpError(405, "method not allowed")
+
+        await self.wait(job, float(arg("wait", "0") or 0))
+        if m.group(2) is None:
+            return 200, "application/json", job.to_json(), {}
+        if job.state != "done":
+            raise HttpError(409, f"job is {job.state}", job.to_json())
+        if m.group(2) == "result":
+            return 200, "application/json", {**job.to_json(), "report": json.loads(job.result.model_dump_json())}, {}
+        filename = Path(job.label or job.name).stem + "_report.pdf"
+        return 200, "application/pdf", job.pdf, {"Content-Disposition": f'inline; filename="{filename}"'}
+
+    async def _submit_request(self, query: Dict[str, List[str]], headers: Dict[str, str],
+                              body: bytes) -> Tuple[ServiceJob, bool]:
+        # JSON {"path": ..., "type": ...} for a file the service can read, otherwise the raw
+        # PDF / iXBRL bytes with ?type=10-K|8-K|auto&name=...
+        kind = (query.get("type") or ["auto"])[0].upper()
+        if headers.get("content-type", "").startswith("application/json"):
+            try:
+                data = json.loads(body or b"{}")
+            except ValueError:
+                raise HttpError(400, "invalid JSON body")
+            path, kind = data.get("path"), str(data.get("type", kind)).upper()
+            if not path or not os.path.isfile(path):
+                raise HttpError(400, "path must be an existing file")
+            sha256 = await asyncio.get_running_loop().run_in_executor(self.io, file_sha256, path)
+            label, upload = os.path.basename(path), False
+        else:
+            if not body:
+                raise HttpError(400, "empty upload")
+            sha256 = hashlib.sha256(body).hexdigest()
+            label = (query.get("name") or [""])[0]
+            suffix = ".pdf" if body[:5] == b"%PDF-" else ".htm"
+            path, upload = str(self.upload_dir / f"{sha256}{suffix}"), True
+        if kind not in ("10-K", "8-K", "AUTO"):
+            raise HttpError(400, "type must be 10-K, 8-K or auto")
+        kind = "auto" if kind == "AUTO" else kind
+
+        if upload and self.existing(sha256, kind) is None:
+            self._check_capacity()
+        # Named by content hash: an existing file (another job for the same filing) is already right
+        if upload and not Path(path).exists():
+            await asyncio.get_running_loop().run_in_executor(self.io, Path(path).write_bytes, body)
+        return self.submit(path, kind, sha256, label=label or os.path.basename(path), upload=upload)
+
+
+# Entry point
+# ------------------------------
+async def serve(service: ReportService, host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> None:
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Report service listening on http://{host}:{port} (warming up...)")
+    await service.start()
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the report summarizer as a local HTTP service.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--cpu-workers", type=int, default=None, help="processes for extraction and rendering")
+    parser.add_argument("--model-workers", type=int, default=SERVICE_MODEL_WORKERS,
+                        help="filings analyzed concurrently (model calls)")
+    args = parser.parse_args(argv)
+
+    service = ReportService(args.cpu_workers, args.model_workers)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,32 +1,68 @@
 import os
+import io
+import re
 import json
+import base64
+import asyncio
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-import PyPDF2
-from google import genai
+from typing import Callable, List, Optional, Dict, Any
 from dotenv import load_dotenv
-from pydantic import BaseModel, ValidationError
-from jinja2 import Template
-from weasyprint import HTML
-import pandas as pd
-import matplotlib
-matplotlib.use("Agg") #backend noninteractive yapmak için yoksa terminale uyarı atıyor 
-import matplotlib.pyplot as plt
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
 from pathlib import Path
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 import math
+from extraction import FilingDocument, extract_document
+from cache import ResponseCache, get_response_cache, get_section_store
+from sections import SECTION_TOKEN_CAPS_10K, build_prompt_text, diff_sections, section_hash, select_sections
+from financials import extract_financials, is_complete
+from mapreduce import CHARS_PER_TOKEN, approx_tokens, chunk_text, map_chunks, merge_partials
+import budget
+import llm
+import normalize
+import results
+import rendering
+import retrieval
+import routing
+import tracing
 
 
 load_dotenv()
 
 
+# Lazy imports
+# ------------------------------
+# pandas, matplotlib, weasyprint and jinja2 take seconds to import; they are only
+# loaded when a report is rendered (or by warm_up() in the background).
+def _matplotlib():
+    import matplotlib
+    matplotlib.use("Agg") #backend noninteractive yapmak için yoksa terminale uyarı atıyor 
+    from matplotlib.figure import Figure  # noqa: F401
+    return matplotlib
+
+def warm_up() -> None:
+    import pandas  # noqa: F401
+    import fitz  # noqa: F401
+    _matplotlib()
+    rendering.warm_up()
+    llm.warm_up()
+
+
 
 # Utility functions
 # ------------------------------
-def load_file(path: str) -> str:
-    with open(path, "rb") as f:
-        reader = PyPDF2.PdfReader(f)
-        return "".join(page.extract_text() or "" for page in reader.pages)
+def load_file(path: str, workers: Optional[int] = None) -> str:
+    return extract_document(path, workers).text
+
+def resolve_document(file_path: Optional[str] = None, text: Optional[str] = None,
+                     document: Optional[FilingDocument] = None) -> FilingDocument:
+    # Reuse already-extracted text so a PDF is never parsed twice
+    if document is not None:
+        return document
+    if text is not None:
+        return FilingDocument.from_text(text)
+    if file_path is None:
+        raise ValueError("file_path, text or document is required")
+    return extract_document(file_path)
 
 def safe_num(v: Any) -> Optional[float]:
     if v is None:
@@ -55,7 +91,101 @@ def format_usd(v: Optional[float]) -> str:
 
 # Chart generation
 # ------------------------------
-def generate_financial_charts(historical_financials: List[dict], company: str):
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png")  # "png" or "svg"
+CHART_DPI = 150
+# Reports embed charts as data URIs; CHARTS_IN_MEMORY=0 writes PNG files next to the PDF instead
+CHARTS_IN_MEMORY = os.getenv("CHARTS_IN_MEMORY", "1") != "0"
+
+def _figure(figsize):
+    # Object-oriented Figure API instead of plt: no global state, safe to draw from worker threads
+    _matplotlib()
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+def _revenue_chart(df):
+    plot_df = df.set_index("Year")[["Total Revenue", "Net Income"]].dropna(how='all')
+    if plot_df.empty:
+        return None
+    # Max Value Check
+    max_val = plot_df[['Total Revenue', 'Net Income']].max().max()
+
+    # Data Scale
+    if max_val >= 1_000_000_000:
+        plot_df = plot_df / 1_000_000_000
+        y_label = "USD (billions)"
+    elif max_val >= 1_000_000:
+        plot_df = plot_df / 1_000_000
+        y_label = "USD (millions)"
+    else:
+        y_label = "USD"
+
+    fig = _figure((10, 6))
+    ax = fig.subplots()
+    x = list(range(len(plot_df)))
+    width = 0.4
+    ax.bar([i - width / 2 for i in x], plot_df["Total Revenue"].fillna(0), width, label="Total Revenue", color="#1f77b4")
+    ax.bar([i + width / 2 for i in x], plot_df["Net Income"].fillna(0), width, label="Net Income", color="#2ca02c")
+    ax.set_xticks(x)
+    ax.set_xticklabels([str(y) for y in plot_df.index])
+    ax.set_title("Revenue & Net Income Over Years", fontsize=14, fontweight="bold")
+    ax.set_ylabel(y_label, fontsize=12)
+    ax.set_xlabel("Year", fontsize=12)
+    ax.legend(loc="best", fontsize=10)
+    ax.grid(axis="y", linestyle="--", alpha=0.7)
+    ax.tick_params(axis="both", labelsize=10, labelrotation=0)
+    fig.tight_layout()
+    return fig
+
+def _yoy_chart(df):
+    yoy_df = df.set_index("Year")[["Total Revenue", "Net Income"]]
+    yoy = yoy_df.pct_change() * 100
+    if yoy.dropna(how='all').empty:
+        return None
+    fig = _figure((10, 5))
+    ax = fig.subplots()
+    for col, color in (("Total Revenue", "#ff7f0e"), ("Net Income", "#d62728")):
+        ax.plot([str(y) for y in yoy.index], yoy[col], marker="o", color=color, linewidth=2, label=col)
+    ax.set_title("Year-over-Year % Change", fontsize=14, fontweight="bold")
+    ax.set_ylabel("Percent (%)", fontsize=12)
+    ax.set_xlabel("Year", fontsize=12)
+    ax.legend(loc="best", fontsize=10)
+    ax.grid(True, linestyle="--", alpha=0.7)
+    ax.tick_params(axis="both", labelsize=10, labelrotation=0)
+    fig.tight_layout()
+    return fig
+
+def figure_to_data_uri(fig, fmt: str = CHART_FORMAT) -> str:
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=CHART_DPI)
+    mime = "image/svg+xml" if fmt == "svg" else f"image/{fmt}"
+    return f"data:{mime};base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+def _render_chart(builder, df, name: str, company: str, timestamp: str, output_dir: Optional[str],
+                  in_memory: bool, fmt: str) -> Optional[str]:
+    fig = builder(df)
+    if fig is None:
+        return None
+    if in_memory:
+        return figure_to_data_uri(fig, fmt)
+    chart_file = output_path(f"{company}_{name}_{timestamp}.{fmt}", output_dir)
+    fig.savefig(chart_file, dpi=CHART_DPI)
+    # Absolute URI: the PDF's base_url is the templates directory, not the working directory
+    return Path(chart_file).resolve().as_uri()
+
+def generate_financial_charts(historical_financials: List[dict], company: str, output_dir: Optional[str] = None,
+                              in_memory: bool = False, fmt: str = CHART_FORMAT, parallel: bool = False):
+    # in_memory=True returns data URIs instead of file:// URIs (nothing is written to disk);
+    # parallel=True renders both charts in worker threads.
+    with tracing.span("charts", rows=len(historical_financials), in_memory=in_memory, format=fmt) as span:
+        chart_paths, df = _generate_financial_charts(historical_financials, company, output_dir,
+                                                     in_memory, fmt, parallel)
+        span.set(charts=len(chart_paths),
+                 bytes_out=sum(len(p) for p in chart_paths.values()) if in_memory else None)
+    return chart_paths, df
+
+def _generate_financial_charts(historical_financials: List[dict], company: str, output_dir: Optional[str],
+                               in_memory: bool, fmt: str, parallel: bool):
+    import pandas as pd
     df = pd.DataFrame(historical_financials)
     if "Year" in df.columns:
         df["Year"] = df["Year"].apply(ensure_int_year)
@@ -66,131 +196,304 @@ def generate_financial_charts(historical_financials: List[dict], company: str):
             df[col] = None
     df = df.sort_values("Year").reset_index(drop=True)
 
-    chart_paths = {}
-    desktop_path = Path.home() / "Desktop"
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    jobs = {
+        "revenue_netincome": _revenue_chart,
+        "yoy_changes": _yoy_chart,
+    }
 
-    # Revenue & Net Income chart
-    try:
-        fig, ax = plt.subplots(figsize=(10,6))
-        plot_df = df.set_index("Year")[["Total Revenue", "Net Income"]].dropna(how='all')
-        if not plot_df.empty:
-            # Max Value Check
-            max_val = plot_df[['Total Revenue', 'Net Income']].max().max()
-
-            # Data Scale
-            if max_val >= 1_000_000_000:
-                plot_df = plot_df / 1_000_000_000
-                y_label = "USD (billions)"
-            elif max_val >= 1_000_000:
-                plot_df = plot_df / 1_000_000
-                y_label = "USD (millions)"
-            else:
-                y_df = plot_df
-                y_label = "USD"
-            
-            plot_df.plot(kind="bar", ax=ax, color=["#1f77b4", "#2ca02c"])
-            ax.set_title("Revenue & Net Income Over Years", fontsize=14, fontweight="bold")
-            ax.set_ylabel(y_label, fontsize=12)
-            ax.set_xlabel("Year", fontsize=12)
-            ax.legend(loc="best", fontsize=10)
-            ax.grid(axis="y", linestyle="--", alpha=0.7)
-            plt.xticks(rotation=0, fontsize=10)
-            plt.yticks(fontsize=10)
-            plt.tight_layout()
-            revenue_chart = desktop_path / f"{company}_revenue_netincome_{timestamp}.png"
-            fig.savefig(revenue_chart, dpi=150)
-            plt.close(fig)
-            chart_paths["revenue_netincome"] = str(revenue_chart)
-    except Exception as e:
-        print("Chart error:", e)
+    def run(name):
+        try:
+            return _render_chart(jobs[name], df, name, company, timestamp, output_dir, in_memory, fmt)
+        except Exception as e:
+            print(f"Chart error ({name}):", e)
+            return None
 
-    # YoY changes chart
-    try:
-        yoy_df = df.set_index("Year")[["Total Revenue", "Net Income"]]
-        yoy = yoy_df.pct_change() * 100
-        if not yoy.dropna(how='all').empty:
-            fig2, ax2 = plt.subplots(figsize=(10,5))
-            yoy.plot(kind="line", marker="o", ax=ax2, color=["#ff7f0e", "#d62728"], linewidth=2)
-            ax2.set_title("Year-over-Year % Change", fontsize=14, fontweight="bold")
-            ax2.set_ylabel("Percent (%)", fontsize=12)
-            ax2.set_xlabel("Year", fontsize=12)
-            ax2.legend(loc="best", fontsize=10)
-            ax2.grid(True, linestyle="--", alpha=0.7)
-            plt.xticks(rotation=0, fontsize=10)
-            plt.yticks(fontsize=10)
-            plt.tight_layout()
-            yoy_chart = desktop_path / f"{company}_yoy_changes_{timestamp}.png"
-            fig2.savefig(yoy_chart, dpi=150)
-            plt.close(fig2)
-            chart_paths["yoy_changes"] = str(yoy_chart)
-    except Exception as e:
-        print("YoY chart error:", e)
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            rendered = dict(zip(jobs, pool.map(run, jobs)))
+    else:
+        rendered = {name: run(name) for name in jobs}
 
+    chart_paths = {name: path for name, path in rendered.items() if path}
     return chart_paths, df
 
 
-def save_pdf(html_content: str, filename: str):
-    desktop_path = Path.home() / "Desktop" / filename
-    try:
-        HTML(string=html_content).write_pdf(desktop_path)
-        print(f"Saved PDF to Desktop: {desktop_path}")
-    except Exception as e:
-        print(f"Could not save PDF to Desktop: {e}")
+def output_path(filename: str, output_dir: Optional[str] = None) -> Path:
+    # Desktop unless an output directory is given (batch/CLI runs)
+    directory = Path(output_dir) if output_dir else Path.home() / "Desktop"
+    return directory / filename
+
+def save_pdf(html_content: str, filename: str, output_dir: Optional[str] = None,
+             kind: Optional[str] = None) -> Optional[str]:
+    # kind ("10-K" / "8-K") adds that report's pre-parsed stylesheet
+    pdf_path = output_path(filename, output_dir)
+    with tracing.span("pdf", kind=kind, bytes_in=len(html_content)) as span:
+        try:
+            rendering.html_to_pdf(html_content, kind, str(pdf_path))
+            span.set(bytes_out=pdf_path.stat().st_size)
+            print(f"Saved PDF: {pdf_path}")
+            return str(pdf_path)
+        except Exception as e:
+            span.set(error=str(e))
+            print(f"Could not save PDF: {e}")
+            return None
 
 
 # GenAI client api bağlantısı
 # -----------------------
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# The client lives in llm.py and is built on first call (rate limiting, retries and timeouts live there too).
+# MODEL_NAME picks the tokenizer; the model each call goes to is picked by routing.py, and response
+# cache keys name the routed model (routing.model_key) so answers from different models never mix.
+MODEL_NAME = routing.DEFAULT_MODEL
+
+
+def count_tokens(text: str) -> int:
+    # Prompt size for routing and the map-reduce switch, on the same tokenizer preflight uses
+    return budget.get_counter(MODEL_NAME).count(text)
+
+# Bump when a prompt changes, otherwise the response cache keeps serving old answers
+PROMPT_VERSION_10K = "10k-v3"
+PROMPT_VERSION_8K = "8k-v3"
+PROMPT_VERSION_QA = "qa-v1"
+
+# Fixes a reply that failed to parse / validate from the reply alone (the filing is not resent);
+# unset means the routing policy's "repair" task decides
+REPAIR_MODEL = os.getenv("REPAIR_MODEL")
+REPAIR_MAX_CHARS = 60000
 
 
 # Model kemik görünüm
 # ---------------------------
+# Field descriptions go into the response schema, so the prompts don't repeat them
+IMPACT_LEVELS = ["Very Positive", "Positive", "Neutral", "Negative", "Very Negative"]
+
+def _canonical_key(key: Any) -> str:
+    return re.sub(r"[^a-z]", "", str(key).lower())
+
+def _year_value(v: Any) -> Any:
+    # "FY2023", "2023-12-31" -> 2023
+    if isinstance(v, str):
+        m = re.search(r"(19|20)\d{2}", v)
+        return int(m.group(0)) if m else None
+    return v
+
+class HistoricalFinancialRow(BaseModel):
+    # Serialized with the display keys ("Year", "Total Revenue", ...) the charts, the
+    # template and the results store use
+    model_config = ConfigDict(populate_by_name=True, serialize_by_alias=True)
+
+    year: Optional[int] = Field(None, alias="Year", description="Fiscal year")
+    total_revenue: Optional[float] = Field(None, alias="Total Revenue", description="USD")
+    net_income: Optional[float] = Field(None, alias="Net Income", description="USD")
+    total_assets: Optional[float] = Field(None, alias="Total Assets", description="USD")
+    total_liabilities: Optional[float] = Field(None, alias="Total Liabilities", description="USD")
+    equity: Optional[float] = Field(None, alias="Equity", description="Total stockholders' equity, USD")
+    cash_flow: Optional[float] = Field(None, alias="Cash Flow", description="Operating cash flow, USD")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _key_casing(cls, data: Any) -> Any:
+        # "year", "total_revenue", "TOTAL REVENUE" -> the canonical keys
+        if isinstance(data, dict):
+            return {_HIST_KEYS.get(_canonical_key(k), k): v for k, v in data.items()}
+        return data
+
+    @field_validator("year", mode="before")
+    @classmethod
+    def _year(cls, v: Any) -> Any:
+        return _year_value(v)
+
+    @field_validator("total_revenue", "net_income", "total_assets", "total_liabilities", "equity", "cash_flow",
+                     mode="before")
+    @classmethod
+    def _number(cls, v: Any) -> Optional[float]:
+        # "$1,234", "(56)" -> 1234.0, -56.0
+        return safe_num(v)
+
+_HIST_KEYS = {_canonical_key(f.alias): f.alias for f in HistoricalFinancialRow.model_fields.values()}
+
+class SegmentPerformance(BaseModel):
+    segment: Optional[str] = Field(None, description="Reportable segment name")
+    revenue: Optional[float] = Field(None, description="Latest year's segment revenue, USD")
+    operating_income: Optional[float] = Field(None, description="Latest year's segment operating income, USD")
+    growth_percent: Optional[float] = Field(None, description="Revenue growth over the prior year, percent")
+    commentary: Optional[str] = Field(None, description="One sentence on the segment's performance")
+
+    @field_validator("revenue", "operating_income", "growth_percent", mode="before")
+    @classmethod
+    def _number(cls, v: Any) -> Optional[float]:
+        return safe_num(str(v).rstrip("%") if isinstance(v, str) else v)
+
 class AnnualReport(BaseModel):
-    company_name: Optional[str] = None
-    cik: Optional[str] = None
-    fiscal_year_end: Optional[datetime] = None
-    filing_date: Optional[datetime] = None
-    total_revenue: Optional[float] = None
-    net_income: Optional[float] = None
-    total_assets: Optional[float] = None
-    total_liabilities: Optional[float] = None
-    operating_cash_flow: Optional[float] = None
-    cash_and_equivalents: Optional[float] = None
-    num_employees: Optional[int] = None
-    auditor: Optional[str] = None
-    business_description: Optional[str] = None
-    risk_factors: Optional[List[str]] = None
-    management_discussion: Optional[str] = None
-    executive_summary: Optional[str] = None
-    segment_performance: Optional[List[Dict[str, Any]]] = None
-    insights: Optional[List[str]] = None
-    opportunities: Optional[List[str]] = None
-    risks: Optional[List[str]] = None
-    takeaways: Optional[List[str]] = None
-    historical_financials: Optional[List[Dict[str, Any]]] = None
+    company_name: Optional[str] = Field(None, description="Exact company name")
+    cik: Optional[str] = Field(None, description="SEC CIK number")
+    fiscal_year_end: Optional[datetime] = Field(None, description="Fiscal year end date")
+    filing_date: Optional[datetime] = Field(None, description="Filing date")
+    total_revenue: Optional[float] = Field(None, description="Latest year's total revenue, USD")
+    net_income: Optional[float] = Field(None, description="Latest year's net income, USD")
+    total_assets: Optional[float] = Field(None, description="Latest year's total assets, USD")
+    total_liabilities: Optional[float] = Field(None, description="Latest year's total liabilities, USD")
+    operating_cash_flow: Optional[float] = Field(None, description="Latest year's operating cash flow, USD")
+    cash_and_equivalents: Optional[float] = Field(None, description="Latest year's cash and equivalents, USD")
+    num_employees: Optional[int] = Field(None, description="Number of employees")
+    auditor: Optional[str] = Field(None, description="Independent auditor")
+    business_description: Optional[str] = Field(None, description="Short description of the business")
+    risk_factors: Optional[List[str]] = Field(None, description="Main risk factors")
+    management_discussion: Optional[str] = Field(None, description="Summary of management's discussion and analysis")
+    executive_summary: Optional[str] = Field(
+        None, description="Comprehensive summary of the key findings, including the business overview and financial performance")
+    segment_performance: Optional[List[SegmentPerformance]] = Field(None, description="Latest year, by reportable segment")
+    insights: Optional[List[str]] = Field(None, description="3 key insights")
+    opportunities: Optional[List[str]] = Field(None, description="2 key opportunities")
+    risks: Optional[List[str]] = Field(None, description="2 key risks")
+    takeaways: Optional[List[str]] = Field(None, description="3 key takeaways")
+    historical_financials: Optional[List[HistoricalFinancialRow]] = Field(
+        None, description="One row per fiscal year, at least the last 3 years")
+
+    @field_validator("total_revenue", "net_income", "total_assets", "total_liabilities", "operating_cash_flow",
+                     "cash_and_equivalents", mode="before")
+    @classmethod
+    def _number(cls, v: Any) -> Optional[float]:
+        return safe_num(v)
 
 class EightKReport(BaseModel):
-    company_name: Optional[str] = None
-    cik: Optional[str] = None
-    filing_date: Optional[datetime] = None
-    event_description: Optional[str] = None
-    impact: Optional[str] = None
-    insights: Optional[List[str]] = None
-    opportunities: Optional[List[str]] = None
-    risks: Optional[List[str]] = None
-    takeaways: Optional[List[str]] = None
+    company_name: Optional[str] = Field(None, description="Exact company name")
+    cik: Optional[str] = Field(None, description="SEC CIK number")
+    filing_date: Optional[datetime] = Field(None, description="Filing date")
+    event_description: Optional[str] = Field(None, description="Detailed description of the reported event")
+    impact: Optional[str] = Field(None, description="Likely impact of the event",
+                                  json_schema_extra={"enum": IMPACT_LEVELS})
+    insights: Optional[List[str]] = Field(None, description="3 key insights")
+    opportunities: Optional[List[str]] = Field(None, description="2 potential opportunities")
+    risks: Optional[List[str]] = Field(None, description="2 potential risks")
+    takeaways: Optional[List[str]] = Field(None, description="3 most important takeaways for an investor")
 
+def historical_rows(ar: AnnualReport) -> List[Dict[str, Any]]:
+    # Plain dicts with the display keys (charts, template)
+    return [row.model_dump() for row in ar.historical_financials or []]
 
+def with_figures(report: BaseModel, figures: Dict[str, Any]) -> BaseModel:
+    # Like model_copy(update=...), but the update is validated (rows become HistoricalFinancialRow)
+    return type(report).model_validate({**report.model_dump(), **figures})
 
-# Summarizer
+
+
+# Response cache helpers
+# -------------------------
+def load_cached_report(cache: Optional[ResponseCache], key: str, model_cls, refresh: bool = False):
+    # refresh=True skips the lookup but still stores the fresh answer
+    if cache is None or refresh:
+        return None
+    with tracing.span("response_cache", report=model_cls.__name__) as span:
+        try:
+            payload = cache.get(key)
+            span.set(cache_hit=int(payload is not None), bytes_out=len(payload) if payload else 0)
+            return model_cls.model_validate_json(payload) if payload is not None else None
+        except Exception as e:
+            print(f"Response cache read error: {e}")
+            return None
+
+def store_cached_report(cache: Optional[ResponseCache], key: str, report: BaseModel, model: str = MODEL_NAME) -> None:
+    if cache is None:
+        return
+    try:
+        cache.put(key, report.model_dump_json(), model=model)
+    except Exception as e:
+        print(f"Response cache write error: {e}")
+
+
+def parse_report(response_text: str, model_cls):
+    with tracing.span("validate", report=model_cls.__name__, bytes_in=len(response_text)):
+        # aidan dönen jsona yükl
+        data = json.loads(response_text)
+
+        # Eğer veri bir listeyse ilk elemanı al değilse direk kullan
+        if isinstance(data, list) and len(data) > 0:
+            return model_cls.model_validate(data[0])
+        if isinstance(data, dict):
+            return model_cls.model_validate(data)
+        raise ValueError("Unexpected JSON format from AI response")
+
+def build_repair_prompt(response_text: str, error: Exception, model_cls) -> str:
+    return f"""
+The JSON below was meant to match the {model_cls.__name__} schema but could not be parsed:
+{str(error)[:2000]}
+
+Return the corrected JSON object. Only fix what is broken (syntax, key names, numbers written as text
+such as "$1,234" or "(56)"); do not add information that is not already there.
+
+JSON:
+{response_text[:REPAIR_MAX_CHARS]}
+    """
+
+def _repair_model(prompt: str) -> str:
+    return REPAIR_MODEL or routing.get_policy().route("repair", count_tokens(prompt))[1]
+
+def parse_or_repair(response_text: str, model_cls):
+    # A reply that doesn't parse or validate gets one cheap repair call instead of a full rerun
+    try:
+        return parse_report(response_text, model_cls)
+    except ValueError as e:  # json.JSONDecodeError and pydantic's ValidationError are ValueErrors
+        print(f"Invalid AI response, repairing: {e}")
+        prompt = build_repair_prompt(response_text, e, model_cls)
+        with tracing.span("repair", report=model_cls.__name__, bytes_in=len(response_text)):
+            repaired = llm.generate(prompt, model=_repair_model(prompt), config=llm.json_config(model_cls))
+        return parse_report(repaired, model_cls)
+
+async def parse_or_repair_async(response_text: str, model_cls):
+    try:
+        return parse_report(response_text, model_cls)
+    except ValueError as e:
+        print(f"Invalid AI response, repairing: {e}")
+        prompt = build_repair_prompt(response_text, e, model_cls)
+        with tracing.span("repair", report=model_cls.__name__, bytes_in=len(response_text)):
+            repaired = await llm.agenerate(prompt, model=_repair_model(prompt), config=llm.json_config(model_cls))
+        return parse_report(repaired, model_cls)
+
+# Fields a reply is expected to fill; with MODEL_CASCADE=on, too many of them missing escalates the call
+REQUIRED_FIELDS_10K = ["company_name", "fiscal_year_end", "total_revenue", "net_income", "total_assets",
+                       "executive_summary", "insights", "risks", "takeaways", "historical_financials"]
+REQUIRED_FIELDS_10K_NARRATIVE = ["company_name", "fiscal_year_end", "executive_summary", "insights",
+                                 "opportunities", "risks", "takeaways"]
+REQUIRED_FIELDS_8K = ["company_name", "filing_date", "event_description", "impact", "insights", "risks", "takeaways"]
+
+def generate_report(prompt: str, model_cls, task: str, fields: Optional[List[str]] = None):
+    # Schema-constrained call + validation (with repair) on the model the routing policy picks
+    def call(model: str):
+        response_text = llm.generate(prompt, model=model, config=llm.json_config(model_cls))
+        return parse_or_repair(response_text, model_cls)
+
+    return routing.run(task, count_tokens(prompt), call, fields)
+
+
+# Results store helpers
 # -------------------------
-def summarize_10k_report(file_path: str) -> AnnualReport:
-    text = load_file(file_path)
+def save_result(report: BaseModel, kind: str, document: Optional[FilingDocument] = None,
+                pdf_path: Optional[str] = None) -> Optional[int]:
+    # Empty reports (model call failed) are not stored
+    store = results.get_result_store()
+    if store is None or report == type(report)():
+        return None
+    try:
+        return store.save(report, kind, source_sha256=document.sha256 if document else None,
+                          source_path=document.path if document else None, pdf_path=pdf_path)
+    except Exception as e:
+        print(f"Result store write error: {e}")
+        return None
+
+def report_from_store(stored: results.StoredReport) -> BaseModel:
+    # Rebuilds the model from a stored row (render_10k_report / render_8k_report take it as-is)
+    model_cls = AnnualReport if stored.kind == "10-K" else EightKReport
+    return model_cls.model_validate_json(stored.payload)
 
-    prompt = f"""
+
+# Prompts
+# -------------------------
+def build_10k_prompt(text: str, chunk_note: str = "") -> str:
+    return f"""
 You are a financial analyst. Analyze the following annual report (10-K) and produce structured output in JSON format.
-The document contains the full text of a 10-K report.
+The document contains the cover page and the relevant sections (Item 1, 1A, 7 and 8) of a 10-K report.{chunk_note}
 
 Here are the specific instructions for extracting information:
 - **Financial Highlights:** Look for the latest year's values in the "Consolidated Statements of Operations" and "Consolidated Balance Sheets".
@@ -198,236 +501,593 @@ Here are the specific instructions for extracting information:
 - **Insights:** Base your insights on a holistic analysis of the entire document.
 - **Opportunities & Risks:** Extract opportunities and risks directly from sections like "Management’s Discussion and Analysis of Financial Condition and Results of Operations" and "Risk Factors".
 - **Takeaways:** Provide a high-level summary of the most important points.
+- Numbers are plain numeric values in USD; use null for anything the document does not state.
 
-Here's the information to extract with specific formatting rules:
-- company_name: Extract the exact company name.
-- cik: Extract the CIK number.
-- fiscal_year_end: Extract the fiscal year end date in YYYY-MM-DD format.
-- filing_date: Extract the filing date in YYYY-MM-DD format.
-- total_revenue: Latest year's total revenue as a numeric value.
-- net_income: Latest year's net income as a numeric value.
-- total_assets: Latest year's total assets as a numeric value.
-- total_liabilities: Latest year's total liabilities as a numeric value.
-- operating_cash_flow: Latest year's operating cash flow as a numeric value.
-- cash_and_equivalents: Latest year's cash and equivalents as a numeric value.
-- executive_summary: Provide a comprehensive summary of the key findings, including the business overview and financial performance.
-- insights: A list of 3 key insights.
-- opportunities: A list of 2 key opportunities.
-- risks: A list of 2 key risks.
-- takeaways: A list of 3 key takeaways.
-- historical_financials: A list of dictionaries, with each dictionary representing a year's data. Each dictionary should have the keys: "Year", "Total Revenue", "Net Income", "Total Assets", "Total Liabilities", "Equity", and "Cash Flow". The values must be numeric.
+Report text:
+{text}
+    """
+
+def build_10k_narrative_prompt(text: str, financials: Dict[str, Any], chunk_note: str = "") -> str:
+    # Numbers already come from financials.py; the model only writes the narrative fields
+    figures = {k: v for k, v in financials.items() if k != "historical_financials" and v is not None}
+    figures["historical_financials"] = financials.get("historical_financials") or []
+    return f"""
+You are a financial analyst. Analyze the following annual report (10-K) and produce structured output in JSON format.
+The document contains the cover page and the narrative sections (Item 1, 1A and 7) of a 10-K report.{chunk_note}
+The key financial figures were already extracted from the financial statements (USD):
+{json.dumps(figures, default=str)}
+
+Fill in the company details and the narrative fields (executive_summary, insights, opportunities, risks, takeaways);
+take opportunities and risks from "Management’s Discussion and Analysis" and "Risk Factors".
+Leave the financial figures and historical_financials null.
 
 Report text:
 {text}
     """
 
+def build_10k_reduce_prompt(merged: Dict[str, Any]) -> str:
+    narrative = {k: merged.get(k) for k in ["company_name", "executive_summary", "insights", "opportunities", "risks", "takeaways"]}
+    return f"""
+You are a financial analyst. The JSON below was merged from partial analyses of different parts of the same annual report (10-K).
+Consolidate it into one coherent result and return JSON with only these keys:
+- executive_summary: One comprehensive summary of the key findings, including the business overview and financial performance.
+- insights: A list of the 3 most important insights.
+- opportunities: A list of the 2 most important opportunities.
+- risks: A list of the 2 most important risks.
+- takeaways: A list of 3 key takeaways.
+
+Merged partial results:
+{json.dumps(narrative, ensure_ascii=False, default=str)}
+    """
+
+
+# Boilerplate stripping
+# ------------------------------
+NORMALIZE_TEXT = os.getenv("NORMALIZE_TEXT", "1") != "0"
+
+def normalize_document(document: FilingDocument) -> FilingDocument:
+    # Running headers/footers, page numbers, TOC lines, forward-looking statements and the
+    # exhibit index are dropped before prompting; page indices stay the same
+    if not NORMALIZE_TEXT or document.variant:
+        return document
+    with tracing.span("normalize", pages=document.page_count, bytes_in=len(document.text)) as span:
+        cleaned, stats = normalize.clean_document(document)
+        # Rough estimate: exact counts are taken later, in preflight, on the cleaned pages only
+        tokens_saved = math.ceil(stats.chars_saved / CHARS_PER_TOKEN)
+        span.set(bytes_out=stats.chars_after, tokens_saved=tokens_saved, header_lines=stats.header_lines,
+                 toc_lines=stats.toc_lines, boilerplate_lines=stats.boilerplate_lines)
+    print(f"Boilerplate removed: {stats.chars_saved} chars (~{tokens_saved} tokens, {stats.fraction_saved:.0%})")
+    return cleaned
+
+
+# Token budget preflight
+# ------------------------------
+PROMPT_TOKEN_BUDGET = budget.PROMPT_TOKEN_BUDGET
+
+def preflight(document: FilingDocument, text: str, kind: str, template: str,
+              section_caps: Optional[Dict[str, int]] = None, token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    # Counts tokens per page (cached next to the extracted text) and, when the prompt would not fit,
+    # keeps only the parts of `text` on the most valuable pages. The cover and the statement pages
+    # always stay (statements only while Item 8 is still asked from the model).
+    with tracing.span("preflight", report=kind, pages=document.page_count) as span:
+        counter = budget.get_counter(MODEL_NAME)
+        counts = budget.page_token_counts(document, counter)
+        overhead = counter.count(template)
+        prompt_tokens = overhead + budget.estimate_text_tokens(text, document, counts)
+        span.set(prompt_tokens=prompt_tokens, tokenizer=counter.name)
+        if prompt_tokens <= token_budget:
+            return text
+
+        caps = section_caps or (SECTION_TOKEN_CAPS_10K if kind == "10-K" else None)
+        keep_statements = kind == "10-K" and caps.get("8", 0) > 0
+        protected = budget.protected_pages(document, keep_statements)
+        values = budget.page_values(document, kind, caps)
+        # Trims the text that was passed in (sections, cleaned pages), not the raw pages
+        trimmed, kept_tokens, dropped = budget.trim_text(text, document, counts, values,
+                                                         token_budget - overhead, protected)
+        hard_cut = overhead + kept_tokens > token_budget
+        if hard_cut:
+            # Protected pages alone are too big (or the text is a single page): hard cut
+            chars = int(len(trimmed) * (token_budget - overhead) / max(1, kept_tokens))
+            trimmed = trimmed[:max(0, chars)] + "\n[...truncated]"
+            kept_tokens = token_budget - overhead
+        span.set(dropped_pages=dropped, prompt_tokens=overhead + kept_tokens, hard_cut=int(hard_cut))
+        print(f"Prompt over budget ({prompt_tokens} > {token_budget} tokens): dropped {dropped} pages, "
+              f"{prompt_tokens} -> {overhead + kept_tokens} tokens" + (" (hard cut)" if hard_cut else ""))
+        return trimmed
+
+
+# Map-reduce (large filings)
+# -------------------------
+MAP_REDUCE_TOKEN_BUDGET = int(os.getenv("MAP_REDUCE_TOKEN_BUDGET", "200000"))
+MAP_REDUCE_CHUNK_TOKENS = int(os.getenv("MAP_REDUCE_CHUNK_TOKENS", "30000"))
+MAP_REDUCE_CONCURRENCY = int(os.getenv("MAP_REDUCE_CONCURRENCY", "4"))
+
+async def _generate_json_async(prompt: str, task: str = "10-K-chunk") -> Optional[Dict[str, Any]]:
+    # Partial AnnualReport as a plain dict (nulls dropped) for merge_partials
+    async def call(model: str):
+        response_text = await llm.agenerate(prompt, model=model, config=llm.json_config(AnnualReport))
+        return await parse_or_repair_async(response_text, AnnualReport)
+
+    partial = await routing.arun(task, count_tokens(prompt), call)
+    return partial.model_dump(mode="json", exclude_none=True)
+
+async def summarize_10k_map_reduce_async(text: str, chunk_tokens: int = MAP_REDUCE_CHUNK_TOKENS,
+                                         concurrency: int = MAP_REDUCE_CONCURRENCY,
+                                         build_prompt: Callable[[str, str], str] = build_10k_prompt) -> AnnualReport:
+    chunks = chunk_text(text, chunk_tokens)
+    prompts = [
+        build_prompt(chunk, f"\nThis is part {i + 1} of {len(chunks)} of the document. "
+                                "Extract only what appears in this part and use null for anything not present.")
+        for i, chunk in enumerate(chunks)
+    ]
+    partials = await map_chunks(_generate_json_async, prompts, concurrency)
+    return await reduce_partials_async(partials)
+
+async def reduce_partials_async(partials: List[Optional[Dict[str, Any]]], task: str = "10-K-reduce") -> AnnualReport:
+    merged = merge_partials(partials)
+    if not merged:
+        raise ValueError("No chunk produced a usable result")
+
+    # Reduce: numbers come from the deterministic merge, narrative is condensed by the model
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config={
-                "response_mime_type": "application/json"
-            }
-        )
-        data = json.loads(response.text)
-        
-        # Eğer veri bir listeyse ilk elemanı al değilse direk kullan
-        if isinstance(data, list) and len(data) > 0:
-            ar = AnnualReport.model_validate(data[0])
-        elif isinstance(data, dict):
-            ar = AnnualReport.model_validate(data)
-        else:
-            raise ValidationError("Unexpected JSON format from AI response")
-    except (ValidationError, Exception) as e:
-        print(f"Error processing AI response: {e}")
-        # Hata durumunda varsayılan bir AnnualReport nesnesi döndür
-        ar = AnnualReport()
+        reduced = await _generate_json_async(build_10k_reduce_prompt(merged), task=task)
+        for k, v in (reduced or {}).items():
+            if k in ("executive_summary", "insights", "opportunities", "risks", "takeaways") and v:
+                merged[k] = v
+    except Exception as e:
+        print(f"Reduce step error: {e}")
+    return AnnualReport.model_validate(merged)
+
+def summarize_10k_map_reduce(text: str, chunk_tokens: int = MAP_REDUCE_CHUNK_TOKENS,
+                             concurrency: int = MAP_REDUCE_CONCURRENCY,
+                             build_prompt: Callable[[str, str], str] = build_10k_prompt) -> AnnualReport:
+    return llm.run_coroutine(summarize_10k_map_reduce_async(text, chunk_tokens, concurrency, build_prompt))
+
+
+# Incremental (year-over-year) sections
+# -------------------------
+PROMPT_VERSION_SECTION = "10k-section-v1"
+# "auto": reuse sections for companies already in the store, "on": also seed the store
+# for every filing with a CIK, "off": never
+INCREMENTAL_SECTIONS = os.getenv("INCREMENTAL_SECTIONS", "auto").lower()
+# Business / Risk Factors are copied forward with new years and figures; those alone don't count as changes
+DIGIT_INSENSITIVE_SECTIONS = {"1", "1A"}
+# Past this share of rewritten text the section is summarized from scratch instead of diffed
+DIFF_MAX_CHANGED = 0.6
+
+_CIK_RE = re.compile(r"(?:\bCIK|Central\s+Index\s+Key)[\s:#No.]*(\d{4,10})", re.IGNORECASE)
+
+def find_cik(document: FilingDocument) -> Optional[str]:
+    cik = (document.facts or {}).get("cik")
+    if not cik:
+        m = _CIK_RE.search(document.text[:20000])
+        cik = m.group(1) if m else None
+    if not cik:
+        return None
+    # EDGAR pads CIKs to 10 digits; store them unpadded
+    return str(cik).strip().lstrip("0") or None
+
+def build_10k_section_prompt(section_id: str, body: str) -> str:
+    # One section on its own; numbers are only asked for when Item 8 is sent
+    if section_id == "8":
+        return build_10k_prompt(body, "\nThis is only Item 8 of the document. Use null for anything not present.")
+    where = "the cover page" if section_id == "cover" else f"Item {section_id}"
+    return f"""
+You are a financial analyst. Below is only {where} of an annual report (10-K). Summarize it as structured output in JSON format,
+using null for anything this section does not cover. Fill in the company details and the narrative fields
+(executive_summary covers only this section; up to 3 insights, 2 opportunities, 2 risks and 3 takeaways) and leave
+the financial figures null.
+
+Section text:
+{body}
+    """
+
+def build_10k_section_diff_prompt(section_id: str, previous: Dict[str, Any], added: List[str], removed: List[str]) -> str:
+    where = "the cover page" if section_id == "cover" else f"Item {section_id}"
+    return f"""
+You are a financial analyst. Below is last year's structured summary of {where} of a company's annual report (10-K),
+followed by the parts of that section that were removed and the parts that were added or rewritten this year.
+Everything else in the section is unchanged. Update the summary so it describes this year's section and return
+JSON with the same keys. Keep points that are still valid, drop points that relied only on removed text, and
+mention material changes from last year in the executive_summary.
+
+Last year's summary:
+{json.dumps(previous, ensure_ascii=False, default=str)}
+
+Removed:
+{chr(10).join("- " + block for block in removed) or "(nothing)"}
+
+Added or rewritten:
+{chr(10).join("- " + block for block in added) or "(nothing)"}
+    """
+
+async def summarize_10k_incremental_async(document: FilingDocument, cik: str,
+                                          section_caps: Optional[Dict[str, int]] = None,
+                                          fiscal_year: Optional[int] = None,
+                                          concurrency: int = MAP_REDUCE_CONCURRENCY) -> AnnualReport:
+    # Unchanged sections reuse their stored summary, changed ones are sent as a diff against
+    # last year's text, new ones in full; the partials are then merged and reduced
+    _, parts = select_sections(document.text, "10-K", section_caps)
+    if not parts:
+        raise ValueError("No sections found")
+    store = get_section_store()
+    version = PROMPT_VERSION_SECTION + ":" + routing.task_key("10-K-section")
 
+    partials: List[Optional[Dict[str, Any]]] = []
+    jobs = []
+    counts = {"reused": 0, "diffed": 0, "new": 0}
+    with tracing.span("sections", cik=cik, sections=len(parts)) as span:
+        for section_id, body in parts:
+            h = section_hash(body, ignore_digits=section_id in DIGIT_INSENSITIVE_SECTIONS)
+            stored = store.get(cik, section_id, h, version) if store else None
+            if stored is not None:
+                partials.append(json.loads(stored))
+                counts["reused"] += 1
+                continue
+            prompt = None
+            previous = store.latest(cik, section_id, version) if store else None
+            if previous is not None:
+                added, removed, changed = diff_sections(previous.text, body)
+                if changed <= DIFF_MAX_CHANGED:
+                    prompt = build_10k_section_diff_prompt(section_id, json.loads(previous.summary), added, removed)
+            counts["diffed" if prompt else "new"] += 1
+            jobs.append((section_id, body, h, prompt or build_10k_section_prompt(section_id, body)))
+
+        outcomes = await map_chunks(lambda prompt: _generate_json_async(prompt, task="10-K-section"),
+                                    [job[3] for job in jobs], concurrency)
+        for (section_id, body, h, _), result in zip(jobs, outcomes):
+            if result is None:
+                continue
+            partials.append(result)
+            if store is not None:
+                try:
+                    store.put(cik, section_id, h, version, body, json.dumps(result, default=str), fiscal_year)
+                except Exception as e:
+                    print(f"Section store write error: {e}")
+        span.set(**counts, prompt_tokens=sum(approx_tokens(job[3]) for job in jobs))
+    print(f"Sections reused: {counts['reused']}, diffed: {counts['diffed']}, new: {counts['new']}")
+    return await reduce_partials_async(partials, task="10-K-section-reduce")
+
+def use_incremental(mode: str, cik: Optional[str]) -> bool:
+    if mode == "incremental":
+        return cik is not None
+    if mode != "auto" or cik is None or INCREMENTAL_SECTIONS == "off":
+        return False
+    store = get_section_store()
+    return store is not None and (INCREMENTAL_SECTIONS == "on" or store.has_company(cik))
+
+
+# Summarizer
+# -------------------------
+def analyze_10k_report(document: FilingDocument, use_cache: bool = True, refresh: bool = False,
+                       section_caps: Optional[Dict[str, int]] = None, mode: str = "auto",
+                       local_financials: bool = True) -> AnnualReport:
+    # mode: "single" (one call), "map_reduce" (chunked concurrent calls), "incremental" (per section,
+    # reusing last year's unchanged sections) or "auto" (incremental for tracked companies, else by token budget)
+
+    # When the statements can be parsed from the PDF, numbers are not asked from the model
+    # and Item 8 is left out of the prompt
+    local = None
+    if local_financials:
+        with tracing.span("financials", report="10-K", pages=document.page_count) as span:
+            try:
+                # Tagged iXBRL facts first, then the PDF statement pages
+                local = document.facts if is_complete(document.facts) else extract_financials(document)
+            except Exception as e:
+                print(f"Financial statement extraction error: {e}")
+            span.set(complete=int(is_complete(local)))
+    narrative_only = is_complete(local)
+    if narrative_only:
+        local = {k: v for k, v in local.items() if k in AnnualReport.model_fields}
+        section_caps = {**(section_caps or SECTION_TOKEN_CAPS_10K), "8": 0}
+
+    # Statement pages are parsed above from the untouched pages; the prompt gets the cleaned text
+    document = normalize_document(document)
+    full_text = document.text
+    cik = find_cik(document)
+    incremental = use_incremental(mode, cik)
+
+    def build_prompt(t: str, note: str = "") -> str:
+        if narrative_only:
+            return build_10k_narrative_prompt(t, local, note)
+        return build_10k_prompt(t, note)
+
+    with tracing.span("prompt", report="10-K", bytes_in=len(full_text), pages=document.page_count,
+                      narrative_only=narrative_only) as span:
+        # Only the needed Items (cover, 1, 1A, 7, 8) go into the prompt
+        text = build_prompt_text(full_text, "10-K", section_caps)
+        use_map_reduce = not incremental and (
+            mode == "map_reduce" or (mode == "auto" and count_tokens(text) > MAP_REDUCE_TOKEN_BUDGET))
+        if not use_map_reduce and not incremental:
+            # A single call has to fit the context window; map-reduce chunks size themselves
+            text = preflight(document, text, "10-K", build_prompt(""), section_caps)
+        prompt = build_prompt(text)
+        span.set(bytes_out=len(prompt), prompt_tokens=approx_tokens(prompt))
+
+    cache = get_response_cache() if use_cache else None
+    prompt_version = (PROMPT_VERSION_10K + ("-narrative" if narrative_only else "")
+                      + ("-mr" if use_map_reduce else "") + ("-inc" if incremental else ""))
+    if incremental:
+        route = routing.task_key("10-K-section", "10-K-section-reduce")
+    elif use_map_reduce:
+        route = routing.task_key("10-K-chunk", "10-K-reduce")
+    else:
+        route = routing.model_key("10-K", count_tokens(prompt))
+    cache_key = ResponseCache.make_key(text, prompt_version, route)
+    ar = load_cached_report(cache, cache_key, AnnualReport, refresh)
+
+    if ar is None:
+        try:
+            if incremental:
+                years = [r.get("Year") for r in (local or {}).get("historical_financials") or [] if r.get("Year")]
+                ar = llm.run_coroutine(summarize_10k_incremental_async(document, cik, section_caps,
+                                                                       max(years) if years else None))
+            elif use_map_reduce:
+                ar = summarize_10k_map_reduce(text, build_prompt=build_prompt)
+            else:
+                ar = generate_report(prompt, AnnualReport, "10-K",
+                                     REQUIRED_FIELDS_10K_NARRATIVE if narrative_only else REQUIRED_FIELDS_10K)
+            if narrative_only:
+                ar = with_figures(ar, local)
+            store_cached_report(cache, cache_key, ar, route)
+        except (ValidationError, Exception) as e:
+            print(f"Error processing AI response: {e}")
+            # Hata durumunda varsayılan bir AnnualReport nesnesi döndür
+            ar = AnnualReport()
+    if narrative_only:
+        # Statement numbers win over anything the model returned
+        ar = with_figures(ar, local)
+    return ar
+
+def build_10k_context(ar: AnnualReport, output_dir: Optional[str] = None) -> Dict[str, Any]:
     # Chart ha
     chart_path, yoy_path = None, None
-    hist = ar.historical_financials or []
+    hist = historical_rows(ar)
     if hist:
         company_name_for_chart = ar.company_name.replace(" ", "_") if ar.company_name else "unknown_company"
-        chart_paths, _ = generate_financial_charts(hist, company_name_for_chart)
+        chart_paths, _ = generate_financial_charts(hist, company_name_for_chart, output_dir,
+                                                   in_memory=CHARTS_IN_MEMORY, parallel=True)
         chart_path = chart_paths.get("revenue_netincome")
         yoy_path = chart_paths.get("yoy_changes")
 
-    # Dashboard-style template
-    template_str = """
-    <html>
-    <head>
-    <meta charset="utf-8" />
-    <style>
-        body { font-family: Arial, sans-serif; color:#222; padding:28px; }
-        h1 { color:#0b3d91; }
-        h2 { margin-top:24px; color:#003366; }
-        .section { margin-top:20px; }
-        .summary {
-            background:#eef6ff;
-            border-left:6px solid #0b3d91;
-            padding:16px;
-            border-radius:6px;
-        }
-        .grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 16px;
-        }
-        .card {
-            background:#f9f9f9;
-            border-radius:8px;
-            padding:16px;
-            text-align:center;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .card h3 { margin-bottom:10px; font-size:1.1em; }
-        .card p { font-size:1.2em; font-weight:bold; }
-        .card.positive { border-top:4px solid #2e8b57; }
-        .card.neutral { border-top:4px solid #4682b4; }
-        img { max-width:100%; margin-top:12px; }
-    </style>
-    </head>
-    <body>
-        <h1>{{ company_name }} Annual Report ({{ year }})</h1>
-        <p><b>CIK:</b> {{ cik }} | <b>Filing Date:</b> {{ filing_date }}</p>
-
-        <div class="section">
-            <h2>Executive Summary</h2>
-            <div class="summary">
-                <p>{{ executive_summary }}</p>
-            </div>
-        </div>
-
-        <div class="section">
-            <h2>Financial Highlights</h2>
-            <div class="grid">
-                <div class="card positive"><h3>Total Revenue</h3><p>{{ total_revenue_display }}</p></div>
-                <div class="card positive"><h3>Net Income</h3><p>{{ net_income_display }}</p></div>
-                <div class="card neutral"><h3>Total Assets</h3><p>{{ total_assets_display }}</p></div>
-                <div class="card neutral"><h3>Total Liabilities</h3><p>{{ total_liabilities_display }}</p></div>
-                <div class="card neutral"><h3>Operating Cash Flow</h3><p>{{ operating_cash_flow_display }}</p></div>
-                <div class="card neutral"><h3>Cash & Equivalents</h3><p>{{ cash_and_equivalents_display }}</p></div>
-            </div>
-        </div>
-
-        {% if historical_financials %}
-        <div class="section">
-            <h2>Historical Financials</h2>
-            <table border="1" cellspacing="0" cellpadding="6">
-                <tr><th>Year</th><th>Total Revenue</th><th>Net Income</th><th>Assets</th><th>Liabilities</th><th>Equity</th><th>Cash Flow</th></tr>
-                {% for r in historical_financials %}
-                <tr>
-                    <td>{{ r["Year"] }}</td>
-                    <td>{{ r["Total Revenue"] }}</td>
-                    <td>{{ r["Net Income"] }}</td>
-                    <td>{{ r["Total Assets"] }}</td>
-                    <td>{{ r["Total Liabilities"] }}</td>
-                    <td>{{ r["Equity"] }}</td>
-                    <td>{{ r["Cash Flow"] }}</td>
-                </tr>
-                {% endfor %}
-            </table>
-            {% if chart_path %}<img src="{{ chart_path }}" alt="Revenue & Net Income">{% endif %}
-            {% if yoy_path %}<img src="{{ yoy_path }}" alt="YoY Changes">{% endif %}
-        </div>
-        {% endif %}
-
-        <div class="section">
-            <h2>AI Insights</h2>
-            <ul>{% for i in insights %}<li>{{ i }}</li>{% endfor %}</ul>
-        </div>
-    </body>
-    </html>
-    """
-
-    template = Template(template_str)
-
     def to_display(v):
         return format_usd(safe_num(v))
 
-    html_content = template.render(
-    company_name=ar.company_name,
-    year=ar.fiscal_year_end.year if ar.fiscal_year_end else "N/A",
-    cik=ar.cik,
-    filing_date=ar.filing_date.strftime("%Y-%m-%d") if ar.filing_date else "N/A",
-    executive_summary=ar.executive_summary or "",
-    total_revenue_display=to_display(ar.total_revenue),
-    net_income_display=to_display(ar.net_income),
-    total_assets_display=to_display(ar.total_assets),
-    total_liabilities_display=to_display(ar.total_liabilities),
-    operating_cash_flow_display=to_display(ar.operating_cash_flow),
-    cash_and_equivalents_display=to_display(ar.cash_and_equivalents),
-    historical_financials=hist,
-    insights=ar.insights or [],
-    chart_path=chart_path,
-    yoy_path=yoy_path
+    # Dashboard-style template: templates/annual_report.html
+    return dict(
+        company_name=ar.company_name,
+        year=ar.fiscal_year_end.year if ar.fiscal_year_end else "N/A",
+        cik=ar.cik,
+        filing_date=ar.filing_date.strftime("%Y-%m-%d") if ar.filing_date else "N/A",
+        executive_summary=ar.executive_summary or "",
+        total_revenue_display=to_display(ar.total_revenue),
+        net_income_display=to_display(ar.net_income),
+        total_assets_display=to_display(ar.total_assets),
+        total_liabilities_display=to_display(ar.total_liabilities),
+        operating_cash_flow_display=to_display(ar.operating_cash_flow),
+        cash_and_equivalents_display=to_display(ar.cash_and_equivalents),
+        historical_financials=hist,
+        insights=ar.insights or [],
+        chart_path=chart_path,
+        yoy_path=yoy_path
     )
 
+def render_10k_pdf(ar: AnnualReport) -> bytes:
+    # PDF bytes without touching the Desktop
+    return rendering.render_pdf("10-K", build_10k_context(ar))
+
+def render_10k_report(ar: AnnualReport, output_dir: Optional[str] = None) -> Optional[str]:
+    html_content = rendering.render_html("10-K", build_10k_context(ar, output_dir))
+
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     company_name_safe = ar.company_name.replace(' ', '_') if ar.company_name else "unknown_company"
     year_safe = ar.fiscal_year_end.year if ar.fiscal_year_end else "unknown_year"
     filename = f"annual_report_{company_name_safe}_{year_safe}_{timestamp}__pro.pdf"
     
-    save_pdf(html_content, filename)
-    return ar
+    return save_pdf(html_content, filename, output_dir, kind="10-K")
 
-def summarize_8k_report(file_path: str) -> EightKReport:
-    text = load_file(file_path)
-    
-    # 8-K için daha detaylı ve görsel bir prompt
-    prompt = f"""
-You are a financial analyst. Analyze the following current report (8-K) and produce structured output in JSON format.
-The document contains the full text of an 8-K report, which reports major corporate events.
+def summarize_10k_report(file_path: Optional[str] = None, text: Optional[str] = None,
+                         document: Optional[FilingDocument] = None, use_cache: bool = True,
+                         refresh: bool = False, section_caps: Optional[Dict[str, int]] = None,
+                         mode: str = "auto", output_dir: Optional[str] = None) -> AnnualReport:
+    with tracing.span("report", report="10-K"):
+        document = resolve_document(file_path, text, document)
+        return run_pipeline("10-K", document, use_cache, refresh, section_caps, mode, output_dir)
 
-Here are the specific instructions for extracting and analyzing the information:
+EIGHT_K_INSTRUCTIONS = """Here are the specific instructions for extracting and analyzing the information:
 - **Event Description:** Provide a detailed summary of the event reported, based on the relevant "Item" sections.
 - **Impact:** Based on the event and its potential financial or operational consequences, provide a single-word assessment of its impact from the following options: "Very Positive", "Positive", "Neutral", "Negative", "Very Negative".
 - **Insights:** Provide a list of 3 key insights derived from the event and its context within the report.
 - **Opportunities:** Identify a list of 2 potential opportunities for the company resulting from this event.
 - **Risks:** Identify a list of 2 potential risks or challenges associated with this event.
-- **Takeaways:** Summarize the top 3 most important takeaways from the report for an investor.
-
-Here's the information to extract with specific formatting rules:
-- company_name: Extract the exact company name.
-- cik: Extract the CIK number.
-- filing_date: Return the filing date in YYYY-MM-DD format.
-- event_description: A detailed description of the event.
-- impact: A single word from the specified list (e.g., "Positive").
-- insights: A list of 3 strings.
-- opportunities: A list of 2 strings.
-- risks: A list of 2 strings.
-- takeaways: A list of 3 strings.
+- **Takeaways:** Summarize the top 3 most important takeaways from the report for an investor."""
+
+def build_8k_prompt(text: str) -> str:
+    # 8-K için daha detaylı ve görsel bir prompt
+    return f"""
+You are a financial analyst. Analyze the following current report (8-K) and produce structured output in JSON format.
+The document contains the cover page and the reported "Item" sections of an 8-K report, which reports major corporate events.
+
+{EIGHT_K_INSTRUCTIONS}
 
 Report text:
 {text}
     """
 
+def prepare_8k_text(document: FilingDocument, section_caps: Optional[Dict[str, int]] = None):
+    # (cleaned document, prompt text); the text is also the response cache key
+    document = normalize_document(document)
+    full_text = document.text
+    with tracing.span("prompt", report="8-K", bytes_in=len(full_text), pages=document.page_count) as span:
+        text = build_prompt_text(full_text, "8-K", section_caps)
+        text = preflight(document, text, "8-K", build_8k_prompt(""), section_caps)
+        span.set(bytes_out=len(text), prompt_tokens=approx_tokens(text))
+    return document, text
+
+def apply_8k_facts(ek: EightKReport, document: FilingDocument) -> EightKReport:
+    # Registrant name / CIK tagged in an iXBRL cover page are authoritative
+    tagged = {k: v for k, v in (document.facts or {}).items() if k in ("company_name", "cik") and v}
+    return ek.model_copy(update=tagged) if tagged else ek
+
+def analyze_8k_report(document: FilingDocument, use_cache: bool = True, refresh: bool = False,
+                      section_caps: Optional[Dict[str, int]] = None) -> EightKReport:
+    document, text = prepare_8k_text(document, section_caps)
+    prompt = build_8k_prompt(text)
+
+    cache = get_response_cache() if use_cache else None
+    route = routing.model_key("8-K", count_tokens(prompt))
+    cache_key = ResponseCache.make_key(text, PROMPT_VERSION_8K, route)
+    ek = load_cached_report(cache, cache_key, EightKReport, refresh)
+
+    if ek is None:
+        try:
+            ek = generate_report(prompt, EightKReport, "8-K", REQUIRED_FIELDS_8K)
+            store_cached_report(cache, cache_key, ek, route)
+
+        except (ValidationError, Exception) as e:
+            print(f"Error processing AI response: {e}")
+            ek = EightKReport()
+    return apply_8k_facts(ek, document)
+
+
+# 8-K packing (many small filings per request)
+# -------------------------
+PROMPT_VERSION_8K_PACK = "8k-pack-v1"
+# Prompt text tokens per packed request, and filings per request
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", "60000"))
+PACK_MAX_FILINGS = int(os.getenv("PACK_MAX_FILINGS", "16"))
+# Filings above this are sent on their own
+PACK_MAX_FILING_TOKENS = int(os.getenv("PACK_MAX_FILING_TOKENS", "15000"))
+
+class PackedEightKReport(EightKReport):
+    document_id: Optional[str] = Field(None, description="The id of the document this entry describes, e.g. D1")
+
+class EightKPack(BaseModel):
+    reports: Optional[List[PackedEightKReport]] = Field(None, description="One entry per document, in input order")
+
+def build_8k_pack_prompt(items: List[tuple]) -> str:
+    # items: (document id, text)
+    documents = "\n\n".join(f"<<<DOCUMENT {doc_id}>>>\n{text}\n<<<END DOCUMENT {doc_id}>>>" for doc_id, text in items)
+    return f"""
+You are a financial analyst. Below are {len(items)} separate current reports (8-K), each wrapped in
+DOCUMENT / END DOCUMENT markers that carry its id. Each contains the cover page and the reported "Item" sections
+of one filing. Analyze every document on its own (never mix facts between documents) and return one entry per
+document in "reports", with its id in document_id.
+
+{EIGHT_K_INSTRUCTIONS}
+
+{documents}
+    """
+
+def pack_texts(tokens: List[int], token_budget: int = PACK_TOKEN_BUDGET,
+               max_filings: int = PACK_MAX_FILINGS) -> List[List[int]]:
+    # Greedy in input order: indices grouped so each group stays within the budget
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for i, n in enumerate(tokens):
+        if current and (used + n > token_budget or len(current) >= max_filings):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += n
+    if current:
+        packs.append(current)
+    return packs
+
+def split_pack_response(response_text: str, ids: List[str]) -> Dict[str, EightKReport]:
+    # Entries are validated one by one: a broken entry only costs its own filing a retry
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config={
-                "response_mime_type": "application/json"
-            }
-        )
+        data = json.loads(response_text)
+    except ValueError as e:
+        print(f"Packed 8-K response is not JSON: {e}")
+        return {}
+    entries = data.get("reports") if isinstance(data, dict) else data
+    found: Dict[str, EightKReport] = {}
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            packed = PackedEightKReport.model_validate(entry)
+        except ValidationError:
+            continue
+        ek = EightKReport.model_validate(packed.model_dump(exclude={"document_id"}))
+        doc_id = (packed.document_id or "").strip().strip("<>").replace("DOCUMENT", "").strip()
+        if doc_id in ids and doc_id not in found and ek != EightKReport():
+            found[doc_id] = ek
+    return found
 
-        # aidan dönen jsona yükl
-        data = json.loads(response.text)
-        
-        # Eğer veri bir listeyse ilk elemanı al
-        if isinstance(data, list) and len(data) > 0:
-            ek = EightKReport.model_validate(data[0])
-        elif isinstance(data, dict):
-            ek = EightKReport.model_validate(data)
-        else:
-            raise ValidationError("Unexpected JSON format from AI response")
+async def _analyze_8k_pack_async(documents: List[FilingDocument], texts: List[str],
+                                 cache: Optional[ResponseCache]) -> List[Optional[EightKReport]]:
+    ids = [f"D{i + 1}" for i in range(len(documents))]
+    prompt = build_8k_pack_prompt(list(zip(ids, texts)))
+    tokens = count_tokens(prompt)
+    route = routing.model_key("8-K-pack", tokens)
+    with tracing.span("pack", report="8-K", filings=len(documents), prompt_tokens=tokens) as span:
+        try:
+            async def call(model: str):
+                return await llm.agenerate(prompt, model=model, config=llm.json_config(EightKPack))
+
+            response_text = await routing.arun("8-K-pack", tokens, call)
+            found = split_pack_response(response_text, ids)
+        except Exception as e:
+            print(f"Packed 8-K request error: {e}")
+            found = {}
+        span.set(returned=len(found))
+    for doc_id, text in zip(ids, texts):
+        if doc_id in found:
+            # Own namespace: a packed answer never overwrites a single-filing one
+            store_cached_report(cache, ResponseCache.make_key(text, PROMPT_VERSION_8K_PACK, route), found[doc_id],
+                                route)
+    return [found.get(doc_id) for doc_id in ids]
+
+async def analyze_8k_reports_packed_async(documents: List[FilingDocument], use_cache: bool = True,
+                                          refresh: bool = False, section_caps: Optional[Dict[str, int]] = None,
+                                          token_budget: int = PACK_TOKEN_BUDGET, max_filings: int = PACK_MAX_FILINGS,
+                                          concurrency: int = MAP_REDUCE_CONCURRENCY) -> List[EightKReport]:
+    # Several small 8-Ks per request; large filings and any filing whose entry is missing or
+    # invalid go through analyze_8k_report on their own. A single-filing answer in the cache is
+    # preferred over a packed one.
+    cache = get_response_cache() if use_cache else None
+    prepared = [prepare_8k_text(document, section_caps) for document in documents]
+    reports: List[Optional[EightKReport]] = [None] * len(documents)
+
+    todo = []
+    for i, (_, text) in enumerate(prepared):
+        # Pack sizes are not known yet, so every model a pack can be routed to is tried
+        keys = [(PROMPT_VERSION_8K, routing.model_key("8-K", count_tokens(build_8k_prompt(text))))]
+        keys += [(PROMPT_VERSION_8K_PACK, route) for route in routing.model_keys("8-K-pack")]
+        cached = None
+        for version, route in keys:
+            cached = cached or load_cached_report(cache, ResponseCache.make_key(text, version, route),
+                                                  EightKReport, refresh)
+        if cached is not None:
+            reports[i] = cached
+        elif approx_tokens(text) <= PACK_MAX_FILING_TOKENS:
+            todo.append(i)
+    packs = [[todo[j] for j in pack]
+             for pack in pack_texts([approx_tokens(prepared[i][1]) for i in todo], token_budget, max_filings)]
 
-    except (ValidationError, Exception) as e:
-        print(f"Error processing AI response: {e}")
-        ek = EightKReport()
+    async def run_pack(pack: List[int]):
+        return await _analyze_8k_pack_async([prepared[i][0] for i in pack], [prepared[i][1] for i in pack], cache)
 
-   
+    for pack, parsed in zip(packs, await map_chunks(run_pack, packs, concurrency)):
+        for i, ek in zip(pack, parsed or []):
+            reports[i] = ek
 
+    missing = [i for i, ek in enumerate(reports) if ek is None]
+    print(f"8-K packing: {len(documents) - len(missing)}/{len(documents)} filings answered from the cache or "
+          f"{len(packs)} packed request(s), {len(missing)} sent on their own")
+    singles = await asyncio.gather(*(asyncio.to_thread(analyze_8k_report, prepared[i][0], use_cache, refresh,
+                                                       section_caps) for i in missing))
+    for i, ek in zip(missing, singles):
+        reports[i] = ek
+    return [apply_8k_facts(ek, prepared[i][0]) for i, ek in enumerate(reports)]
+
+def analyze_8k_reports_packed(documents: List[FilingDocument], use_cache: bool = True, refresh: bool = False,
+                              section_caps: Optional[Dict[str, int]] = None) -> List[EightKReport]:
+    return llm.run_coroutine(analyze_8k_reports_packed_async(documents, use_cache, refresh, section_caps))
+
+def build_8k_context(ek: EightKReport) -> Dict[str, Any]:
     # Impacte göre kart rengi test lazım
     impact_class_map = {
         "very positive": "positive",
@@ -438,82 +1098,8 @@ Report text:
     }
     impact_class = impact_class_map.get(ek.impact.lower() if ek.impact else "neutral", "neutral")
 
-    # 8-K için yeni görsel şablon
-    template_str = """<html>
-    <head>
-    <meta charset="utf-8" />
-    <style>
-        body { font-family: Arial, sans-serif; color:#222; padding:28px; }
-        h1 { color:#8B0000; }
-        h2 { margin-top:24px; color:#003366; }
-        .section { margin-top:20px; }
-        .summary {
-            background:#f0f4f8;
-            border-left:6px solid #8B0000;
-            padding:16px;
-            border-radius:6px;
-        }
-        .card {
-            background:#f9f9f9;
-            border-radius:8px;
-            padding:16px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .impact-card {
-            padding:16px;
-            border-radius:8px;
-            color: white;
-            font-weight: bold;
-            text-align: center;
-        }
-        .impact-card.positive { background-color: #2e8b57; }
-        .impact-card.neutral { background-color: #4682b4; }
-        .impact-card.negative { background-color: #cc0000; }
-        ul { list-style-type: none; padding-left: 0; }
-        li { margin-bottom: 8px; border-left: 4px solid #ddd; padding-left: 10px; }
-    </style>
-    </head>
-    <body>
-        <h1>{{ company_name }} 8-K Report</h1>
-        <p><b>CIK:</b> {{ cik }} | <b>Filing Date:</b> {{ filing_date }}</p>
-
-        <div class="section">
-            <h2>Event Description</h2>
-            <div class="summary"><p>{{ event_description }}</p></div>
-        </div>
-
-        <div class="section">
-            <h2>Overall Impact</h2>
-            <div class="impact-card {{ impact_class }}">{{ impact }}</div>
-        </div>
-
-        <div class="section">
-            <h2>AI Insights & Analysis</h2>
-            <div class="grid">
-                <div class="card">
-                    <h3>Key Insights</h3>
-                    <ul>{% for i in insights %}<li>{{ i }}</li>{% endfor %}</ul>
-                </div>
-                <div class="card">
-                    <h3>Opportunities</h3>
-                    <ul>{% for o in opportunities %}<li>{{ o }}</li>{% endfor %}</ul>
-                </div>
-                <div class="card">
-                    <h3>Risks</h3>
-                    <ul>{% for r in risks %}<li>{{ r }}</li>{% endfor %}</ul>
-                </div>
-                <div class="card">
-                    <h3>Key Takeaways</h3>
-                    <ul>{% for t in takeaways %}<li>{{ t }}</li>{% endfor %}</ul>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>"""
-
-    template = Template(template_str)
-
-    html_content = template.render(
+    # 8-K görsel şablonu: templates/eight_k_report.html
+    return dict(
         company_name=ek.company_name,
         cik=ek.cik,
         filing_date=ek.filing_date.strftime("%Y-%m-%d") if ek.filing_date else "N/A",
@@ -526,13 +1112,129 @@ Report text:
         takeaways=ek.takeaways or []
     )
 
+def render_8k_pdf(ek: EightKReport) -> bytes:
+    return rendering.render_pdf("8-K", build_8k_context(ek))
+
+def render_8k_report(ek: EightKReport, output_dir: Optional[str] = None) -> Optional[str]:
+    html_content = rendering.render_html("8-K", build_8k_context(ek))
+
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     company_name_safe = ek.company_name.replace(' ', '_') if ek.company_name else "unknown_company"
     year_safe = ek.filing_date.year if ek.filing_date else "unknown_year"
     filename = f"8k_report_{company_name_safe}_{year_safe}_{timestamp}_pro.pdf"
     
-    save_pdf(html_content, filename)
-    return ek
+    return save_pdf(html_content, filename, output_dir, kind="8-K")
+
+def summarize_8k_report(file_path: Optional[str] = None, text: Optional[str] = None,
+                        document: Optional[FilingDocument] = None, use_cache: bool = True,
+                        refresh: bool = False, section_caps: Optional[Dict[str, int]] = None,
+                        output_dir: Optional[str] = None) -> EightKReport:
+    with tracing.span("report", report="8-K"):
+        document = resolve_document(file_path, text, document)
+        return run_pipeline("8-K", document, use_cache, refresh, section_caps, output_dir=output_dir)
+
+
+# Pipeline stages
+# -------------------------
+# summarize_*_report, the GUI job queue (jobs.py), batch.py and service.py all go through these,
+# so a filing fails the same way everywhere: too little text, no usable report or an unsaved PDF raise.
+MIN_TEXT_CHARS = 50
+
+def is_empty_report(report: BaseModel) -> bool:
+    # The analyzers return a blank report when the model call failed
+    return report == type(report)()
+
+def analyze_stage(kind: str, document: FilingDocument, use_cache: bool = True, refresh: bool = False,
+                  section_caps: Optional[Dict[str, int]] = None, mode: str = "auto") -> BaseModel:
+    if len(document.text.strip()) < MIN_TEXT_CHARS:
+        raise ValueError("The file is empty or does not contain enough text for analysis.")
+    if kind == "8-K":
+        report = analyze_8k_report(document, use_cache, refresh, section_caps)
+    else:
+        report = analyze_10k_report(document, use_cache, refresh, section_caps, mode)
+    if is_empty_report(report):
+        raise RuntimeError("The model did not return a usable report.")
+    return report
+
+def render_stage(kind: str, report: BaseModel, output_dir: Optional[str] = None) -> str:
+    with tracing.span("render", report=kind):
+        if kind == "8-K":
+            pdf_path = render_8k_report(report, output_dir)
+        else:
+            pdf_path = render_10k_report(report, output_dir)
+    # save_pdf prints and returns None on failure
+    if pdf_path is None:
+        raise RuntimeError("The PDF report could not be saved.")
+    return pdf_path
+
+def render_pdf_stage(kind: str, report: BaseModel) -> bytes:
+    # PDF bytes instead of a file (service.py)
+    with tracing.span("render", report=kind):
+        return render_8k_pdf(report) if kind == "8-K" else render_10k_pdf(report)
+
+def save_stage(kind: str, report: BaseModel, document: FilingDocument, pdf_path: Optional[str] = None) -> None:
+    with tracing.span("save", report=kind):
+        save_result(report, kind, document, pdf_path)
+
+def run_pipeline(kind: str, document: FilingDocument, use_cache: bool = True, refresh: bool = False,
+                 section_caps: Optional[Dict[str, int]] = None, mode: str = "auto",
+                 output_dir: Optional[str] = None) -> BaseModel:
+    # All stages in the calling thread; batch.py and service.py run them in their own pools
+    report = analyze_stage(kind, document, use_cache, refresh, section_caps, mode)
+    pdf_path = render_stage(kind, report, output_dir)
+    save_stage(kind, report, document, pdf_path)
+    return report
+
+
+# Follow-up questions
+# -------------------------
+class FilingAnswer(BaseModel):
+    answer: Optional[str] = Field(None, description="Answer to the question, based only on the excerpts")
+    value: Optional[float] = Field(None, description="The number asked for, if the question asks for one (USD for amounts)")
+    pages: Optional[List[int]] = Field(None, description="Page numbers of the excerpts the answer comes from")
+    found: Optional[bool] = Field(None, description="False when the excerpts don't contain the answer")
+
+    @field_validator("value", mode="before")
+    @classmethod
+    def _number(cls, v: Any) -> Optional[float]:
+        return safe_num(v)
+
+def build_question_prompt(question: str, excerpts: List[str]) -> str:
+    return f"""
+You are a financial analyst. Answer the question about a SEC filing using only the excerpts below.
+Each excerpt starts with the page it comes from. If the excerpts do not contain the answer, set found to false.
+
+Question: {question}
+
+Excerpts:
+{chr(10).join(excerpts)}
+    """
+
+def ask_filing(question: str, file_path: Optional[str] = None, document: Optional[FilingDocument] = None,
+               k: int = retrieval.TOP_K, use_cache: bool = True) -> FilingAnswer:
+    # Sends only the top-k chunks of the filing's retrieval index (built at extraction time),
+    # so cost and latency depend on k, not on the filing's length
+    document = resolve_document(file_path, None, document)
+    with tracing.span("retrieve", pages=document.page_count, k=k) as span:
+        hits = retrieval.retrieve(document, question, k)
+        excerpts = [f"[Page {chunk.page + 1}]\n{text}" for chunk, text, _ in hits]
+        prompt = build_question_prompt(question, excerpts)
+        span.set(chunks=len(hits), bytes_out=len(prompt), prompt_tokens=approx_tokens(prompt))
+    if not hits:
+        return FilingAnswer(found=False)
+
+    cache = get_response_cache() if use_cache else None
+    route = routing.model_key("qa", count_tokens(prompt))
+    cache_key = ResponseCache.make_key(prompt, PROMPT_VERSION_QA, route)
+    answer = load_cached_report(cache, cache_key, FilingAnswer)
+    if answer is None:
+        try:
+            answer = generate_report(prompt, FilingAnswer, "qa")
+            store_cached_report(cache, cache_key, answer, route)
+        except Exception as e:
+            print(f"Error answering question: {e}")
+            answer = FilingAnswer()
+    return answer
 
 
 # Example usage ama guiyle deniyom
@@ -0,0 +1,72 @@
+import budget
+from extraction import FilingDocument
+from sections import build_prompt_text
+
+
+def _filing() -> FilingDocument:
+    # Cover, Item 1 (pages 1-7), Item 7 (8-11), Item 8 with its statements (12-14), notes (15-19)
+    pages = ["ACME CORP\nANNUAL REPORT ON FORM 10-K\nFiscal year ended December 31, 2024\n"]
+    for i in range(1, 20):
+        lines = []
+        if i == 1:
+            lines.append("Item 1. Business")
+        elif i == 8:
+            lines.append("Item 7. Management's Discussion and Analysis")
+        elif i == 12:
+            lines.append("Item 8. Financial Statements and Supplementary Data")
+        elif i == 13:
+            lines.append("CONSOLIDATED BALANCE SHEETS")
+        elif i == 14:
+            lines.append("CONSOLIDATED STATEMENTS OF OPERATIONS")
+        lines += [f"Page {i} line {n} of the filing text goes here." for n in range(20)]
+        pages.append("\n".join(lines) + "\n")
+    return FilingDocument(pages=pages)
+
+
+def _counts(document: FilingDocument):
+    return [len(p) // 4 for p in document.pages]
+
+
+def test_statement_pages_survive_trimming():
+    document = _filing()
+    caps = {"cover": 1500, "1": 100000, "7": 100000, "8": 100000}
+    text = build_prompt_text(document.text, "10-K", caps)
+    counts = _counts(document)
+    values = budget.page_values(document, "10-K", caps)
+    protected = budget.protected_pages(document)
+    assert {0, 13, 14} <= protected
+
+    trimmed, kept_tokens, dropped = budget.trim_text(text, document, counts, values, sum(counts) // 2, protected)
+
+    assert kept_tokens <= sum(counts) // 2
+    assert "Page 13 line 19" in trimmed and "Page 14 line 19" in trimmed
+    assert "ACME CORP" in trimmed
+    missing = [i for i in range(1, 20) if f"Page {i} line 0 " not in trimmed]
+    assert dropped == len(missing) > 0
+    assert "pages omitted" in trimmed
+
+
+def test_capped_section_lines_keep_their_pages():
+    document = _filing()
+    # Item 1 is cut short mid-line on page 2 and ends with the cap marker
+    caps = {"cover": 1500, "1": 300, "7": 100000, "8": 100000}
+    text = build_prompt_text(document.text, "10-K", caps)
+    assert "[...truncated]" in text
+
+    lines = budget.text_lines(text, document)
+    pages = {line: page for line, page in lines}
+    assert pages["[...truncated]"] is None
+    assert pages["=== Item 8. Financial Statements and Supplementary Data ==="] is None
+    cut = [line for line, _ in lines if line.startswith("Page 2 line") and not line.endswith("here.")]
+    assert cut and pages[cut[0]] == 2
+    assert all(page is not None for line, page in lines
+               if line.startswith("Page ") and line.endswith("here."))
+
+    # Dropping Item 1 takes the cut line with it instead of keeping it as untrimmable text
+    counts = _counts(document)
+    values = budget.page_values(document, "10-K", caps)
+    values[1] = values[2] = 0.0
+    trimmed, _, dropped = budget.trim_text(text, document, counts, values, budget.estimate_text_tokens(
+        text, document, counts) - 250, budget.protected_pages(document))
+    assert "Page 1 line" not in trimmed and "Page 2 line" not in trimmed
+    assert dropped == 2
@@ -0,0 +1,34 @@
+import os
+
+from cache import TextCache
+
+
+def test_evict_counts_sidecars_and_drops_whole_filings(tmp_path):
+    cache = TextCache(tmp_path, max_bytes=10**9)
+    old, new = "a" * 64, "b" * 64
+    for sha in (old, new):
+        cache.put(sha, "fitz-1", ["page one", "page two"])
+        cache.put_token_counts(sha, "fitz-1", "o200k_base", [3, 3])
+        cache.put_index(sha, "fitz-1", "bm25-1", {"terms": os.urandom(5000).hex()})
+    os.utime(tmp_path / f"{old}-fitz-1.json.z", (1, 1))
+    os.utime(tmp_path / f"{old}-fitz-1.o200k_base.tokens.json", (1, 1))
+    os.utime(tmp_path / f"{old}-fitz-1.bm25-1.idx.z", (1, 1))
+
+    # Room for the newer filing only; the page lists alone stay under the limit
+    cache.max_bytes = sum(p.stat().st_size for p in tmp_path.glob(new + "*"))
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.json.z")) < cache.max_bytes
+    cache.evict()
+
+    remaining = sorted(p.name for p in tmp_path.iterdir())
+    assert not any(name.startswith(old) for name in remaining)
+    assert len([name for name in remaining if name.startswith(new)]) == 3
+    assert cache.get(new, "fitz-1") == ["page one", "page two"]
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = TextCache(tmp_path)
+    pages = ['Quote " and\nnewline', "Ünicode page", "", "x" * 5000]
+    cache.put("c" * 64, "fitz-1", pages)
+    assert cache.get("c" * 64, "fitz-1") == pages
+    cache.put("d" * 64, "fitz-1", [])
+    assert cache.get("d" * 64, "fitz-1") == []
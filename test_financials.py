@@ -0,0 +1,60 @@
+from extraction import FilingDocument
+from financials import _rows_from_words, find_statement_pages, is_complete, parse_statement
+
+
+def test_parse_income_statement_rows():
+    rows = [
+        ["CONSOLIDATED", "STATEMENTS", "OF", "OPERATIONS"],
+        ["(in", "millions)"],
+        ["Year", "Ended", "December", "31,", "2024", "2023", "2022"],
+        ["Revenue", "$", "1,200", "$", "1,000", "$", "900"],
+        ["Cost", "of", "revenue", "700", "600", "550"],
+        ["Net", "income", "(loss)", "(50)", "120", "—"],
+    ]
+    parsed = parse_statement(rows, "income")
+    assert parsed[2024] == {"Total Revenue": 1200.0, "Net Income": -50.0}
+    assert parsed[2023] == {"Total Revenue": 1000.0, "Net Income": 120.0}
+    assert parsed[2022]["Net Income"] == 0.0
+
+
+def test_higher_priority_label_wins_and_wrapped_labels_join():
+    rows = [
+        ["2024", "2023"],
+        ["Net", "revenues", "500", "400"],
+        ["Total", "revenues", "520", "410"],
+        ["Total", "stockholders’"],
+        ["equity", "300", "250"],
+    ]
+    assert parse_statement(rows, "income")[2024]["Total Revenue"] == 520.0
+    assert parse_statement(rows, "balance")[2023]["Equity"] == 250.0
+
+
+def test_rows_from_words_groups_by_line_and_orders_left_to_right():
+    words = [
+        (200, 10, 240, 20, "1,200"), (10, 11, 60, 21, "Revenue"),
+        (10, 30, 60, 40, "Net"), (62, 31, 100, 41, "income"), (200, 30, 240, 40, "300"),
+    ]
+    assert _rows_from_words(words) == [["Revenue", "1,200"], ["Net", "income", "300"]]
+
+
+def test_find_statement_pages_skips_index_pages():
+    document = FilingDocument(pages=[
+        "Index to Consolidated Financial Statements\nConsolidated Balance Sheets 45\n",
+        "CONSOLIDATED BALANCE SHEETS\n(in millions)\n",
+        "Consolidated Statements of Cash Flows\n",
+        "Notes to the financial statements mention consolidated balance sheets only here.\n" + "x" * 700
+        + "\nConsolidated Statements of Operations",
+    ])
+    pages = find_statement_pages(document)
+    assert pages["balance"] == [1, 3]
+    assert pages["cash_flow"] == [2]
+    assert pages["income"] == []
+
+
+def test_is_complete_needs_two_full_years():
+    rows = [{"Year": 2024, "Total Revenue": 1.0, "Net Income": 0.1},
+            {"Year": 2023, "Total Revenue": 1.0, "Net Income": None}]
+    assert not is_complete({"historical_financials": rows})
+    rows[1]["Net Income"] = 0.2
+    assert is_complete({"historical_financials": rows})
+    assert not is_complete(None)
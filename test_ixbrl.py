@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from ixbrl import extract_ixbrl_document, facts_to_fields, is_html_filing
+
+
+FILING = """<html><head><title>10-K</title><style>p {}</style></head><body>
+<div style="display:none"><ix:header><ix:hidden>
+<ix:nonNumeric name="dei:DocumentType" contextRef="c1">10-K</ix:nonNumeric>
+<ix:nonNumeric name="dei:EntityCentralIndexKey" contextRef="c1">0000123456</ix:nonNumeric>
+</ix:hidden><ix:resources>
+<xbrli:context id="c1"><xbrli:period><xbrli:startDate>2024-01-01</xbrli:startDate><xbrli:endDate>2024-12-31</xbrli:endDate></xbrli:period></xbrli:context>
+<xbrli:context id="c2"><xbrli:period><xbrli:startDate>2023-01-01</xbrli:startDate><xbrli:endDate>2023-12-31</xbrli:endDate></xbrli:period></xbrli:context>
+<xbrli:context id="q4"><xbrli:period><xbrli:startDate>2024-10-01</xbrli:startDate><xbrli:endDate>2024-12-31</xbrli:endDate></xbrli:period></xbrli:context>
+<xbrli:context id="i1"><xbrli:period><xbrli:instant>2024-12-31</xbrli:instant></xbrli:period></xbrli:context>
+<xbrli:context id="s1"><xbrli:entity><xbrli:segment><xbrldi:explicitMember>Seg</xbrldi:explicitMember></xbrli:segment></xbrli:entity>
+<xbrli:period><xbrli:startDate>2024-01-01</xbrli:startDate><xbrli:endDate>2024-12-31</xbrli:endDate></xbrli:period></xbrli:context>
+</ix:resources></ix:header></div>
+<p>ACME CORP <ix:nonNumeric name="dei:EntityRegistrantName" contextRef="c1">Acme Corp</ix:nonNumeric></p>
+<div style="page-break-after:always"></div>
+<p>Item 1. Business</p><p>We build &amp; sell widgets.</p>
+<table>
+<tr><td>Revenue</td><td><ix:nonFraction name="us-gaap:Revenues" contextRef="c1" scale="6">1,200</ix:nonFraction></td>
+<td><ix:nonFraction name="us-gaap:Revenues" contextRef="c2" scale="6">1,000</ix:nonFraction></td>
+<td><ix:nonFraction name="us-gaap:Revenues" contextRef="q4" scale="6">350</ix:nonFraction></td></tr>
+<tr><td>Net loss</td><td><ix:nonFraction name="us-gaap:NetIncomeLoss" contextRef="c1" scale="6" sign="-">50</ix:nonFraction></td>
+<td><ix:nonFraction name="us-gaap:NetIncomeLoss" contextRef="c2" scale="6" format="ixt:fixed-zero">—</ix:nonFraction></td>
+<td><ix:nonFraction name="us-gaap:NetIncomeLoss" contextRef="s1" scale="6">7</ix:nonFraction></td></tr>
+<tr><td>Assets</td><td><ix:nonFraction name="us-gaap:Assets" contextRef="i1" scale="3" format="ixt:num-comma-decimal">2.500,5</ix:nonFraction></td></tr>
+</table>
+</body></html>
+"""
+
+
+def test_extract_ixbrl_document(tmp_path):
+    path = tmp_path / "acme-10k.htm"
+    path.write_text(FILING, encoding="utf-8")
+    assert is_html_filing(str(path)) and not is_html_filing("acme.pdf")
+
+    # Small chunks: tags and facts split across feeds must still parse
+    document = extract_ixbrl_document(str(path), chunk_size=64)
+
+    assert document.page_count == 2
+    assert document.pages[0] == "ACME CORP Acme Corp\n"
+    assert "We build & sell widgets." in document.pages[1]
+    assert "10-K" not in document.text and "p {}" not in document.text
+    facts = document.facts
+    assert facts["company_name"] == "Acme Corp"
+    assert facts["cik"] == "0000123456"
+    assert facts["document_type"] == "10-K"
+    assert facts["fiscal_year_end"] == datetime(2024, 12, 31)
+    # The quarter and the segment facts are left out
+    assert facts["historical_financials"] == [
+        {"Year": 2023, "Total Revenue": 1.0e9, "Net Income": 0.0},
+        {"Year": 2024, "Total Revenue": 1.2e9, "Net Income": -5.0e7, "Total Assets": 2500.5e3},
+    ]
+    assert facts["total_revenue"] == 1.2e9 and facts["total_assets"] == 2500.5e3
+
+
+def test_higher_priority_concept_wins():
+    contexts = {"c1": {"id": "c1", "start": "2024-01-01", "end": "2024-12-31", "segment": False}}
+    fact = {"context": "c1", "scale": None, "sign": None, "format": ""}
+    facts = [
+        {**fact, "name": "us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax", "text": "90"},
+        {**fact, "name": "us-gaap:Revenues", "text": "100"},
+        {**fact, "name": "us-gaap:SalesRevenueNet", "text": "80"},
+    ]
+    assert facts_to_fields(facts, contexts)["total_revenue"] == 100.0
+
+
+def test_no_facts_gives_no_figures():
+    assert facts_to_fields([], {}) == {}
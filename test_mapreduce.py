@@ -0,0 +1,53 @@
+import asyncio
+
+from mapreduce import chunk_text, map_chunks, merge_partials
+
+
+def test_merge_partials_first_value_wins_and_lists_dedupe():
+    partials = [
+        {"company_name": "Acme Corp", "fiscal_year": None, "risk_factors": ["Supply chain", "FX"],
+         "executive_summary": "Part one."},
+        None,
+        {"company_name": "ACME", "fiscal_year": "2024", "risk_factors": ["fx", "Litigation"],
+         "executive_summary": "Part two."},
+    ]
+    merged = merge_partials(partials)
+    assert merged["company_name"] == "Acme Corp"
+    assert merged["fiscal_year"] == "2024"
+    assert merged["risk_factors"] == ["Supply chain", "FX", "Litigation"]
+    assert merged["executive_summary"] == "Part one.\n\nPart two."
+
+
+def test_merge_partials_joins_historical_rows_by_year():
+    partials = [
+        {"historical_financials": [{"Year": 2024, "Total Revenue": 100.0, "Net Income": None}]},
+        {"historical_financials": [{"Year": "2024", "Total Revenue": 90.0, "Net Income": 10.0},
+                                   {"Year": "n/a", "Total Revenue": 80.0}]},
+    ]
+    hist = merge_partials(partials)["historical_financials"]
+    # One row per year; rows without a readable year are skipped
+    assert hist == [{"Year": 2024, "Total Revenue": 100.0, "Net Income": 10.0}]
+
+
+def test_merge_partials_empty():
+    assert merge_partials([None, None]) == {}
+
+
+def test_chunk_text_splits_on_paragraphs_with_overlap():
+    text = "\n\n".join(f"Paragraph {i} " + "x" * 300 for i in range(20))
+    chunks = chunk_text(text, max_tokens=400, overlap_tokens=10)
+    assert len(chunks) > 1
+    assert all(len(c) <= 1600 for c in chunks)
+    assert chunks[0].endswith("x")
+    assert "Paragraph 19" in chunks[-1]
+
+
+def test_map_chunks_keeps_order_and_isolates_failures():
+    async def call(prompt: str):
+        await asyncio.sleep(0.01 * (3 - int(prompt)))
+        if prompt == "1":
+            raise ValueError("bad chunk")
+        return {"n": int(prompt)}
+
+    results = asyncio.run(map_chunks(call, ["0", "1", "2"], concurrency=2))
+    assert results == [{"n": 0}, None, {"n": 2}]
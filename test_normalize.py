@@ -0,0 +1,51 @@
+from extraction import FilingDocument
+from normalize import NORMALIZER_VERSION, clean_document, clean_pages
+
+
+def _page(n: int, body: str) -> str:
+    return f"ACME CORP | 2024 Annual Report\n{body}\nPage {n} of 12\n"
+
+
+def test_running_headers_and_page_numbers_are_dropped():
+    topics = ["revenue", "margins", "costs", "debt", "cash", "staff", "plants", "sales", "taxes", "leases", "risks", "audit"]
+    pages = [_page(n, f"This page discusses {topic}.") for n, topic in enumerate(topics, 1)]
+    cleaned, stats = clean_pages(pages)
+    assert len(cleaned) == len(pages)
+    assert cleaned[0] == "This page discusses revenue.\n"
+    # "Page n of 12" repeats too once digits are masked, so it goes as furniture
+    assert stats.header_lines == 24
+    assert stats.chars_saved > 0
+
+
+def test_headers_are_kept_on_short_documents_but_page_numbers_go():
+    pages = [_page(n, f"Body {n}.") for n in range(1, 4)]
+    cleaned, stats = clean_pages(pages)
+    assert cleaned[1] == "ACME CORP | 2024 Annual Report\nBody 2.\n"
+    assert stats.header_lines == 0 and stats.page_numbers == 3
+
+
+def test_toc_and_forward_looking_block_are_dropped():
+    toc = "Table of Contents\nItem 1. Business 3\nItem 1A. Risk Factors 10\nItem 7. MD&A 25\nItem 8. Financial Statements 40\n"
+    fls = ("Forward-Looking Statements\n" + "This report contains forward-looking statements that involve risks.\n" * 5
+           + "Item 1. Business\nWe make widgets.\n")
+    cleaned, stats = clean_pages([toc, fls])
+    assert cleaned[0] == ""
+    assert "forward-looking statements that involve" not in cleaned[1]
+    assert cleaned[1] == "Item 1. Business\nWe make widgets.\n"
+    assert stats.toc_lines == 5 and stats.boilerplate_lines == 6
+
+
+def test_exhibit_index_is_dropped_up_to_signatures():
+    page = "Exhibit Index\n3.1 Articles of Incorporation\n10.1 Credit Agreement\nSIGNATURES\nJane Doe, CEO\n"
+    cleaned, _ = clean_pages([page])
+    assert cleaned[0] == "SIGNATURES\nJane Doe, CEO\n"
+
+
+def test_clean_document_resets_derived_state():
+    document = FilingDocument(pages=["A  line\twith   spaces\n", "Second page\n"], sha256="abc")
+    document.token_counts["o200k_base"] = [1, 1]
+    cleaned, _ = clean_document(document)
+    assert cleaned.pages == ["A line with spaces\n", "Second page\n"]
+    assert cleaned.offsets == [0, len("A line with spaces\n")]
+    assert cleaned.token_counts == {} and cleaned.variant == NORMALIZER_VERSION
+    assert cleaned.sha256 == "abc"
@@ -0,0 +1,52 @@
+import json
+
+from extraction import FilingDocument
+from retrieval import RetrievalIndex, chunk_pages, retrieve, tokenize
+
+
+PAGES = [
+    "ACME CORP\nAnnual Report\n\nWe design and sell industrial widgets.\n",
+    "Human Capital\n\nAs of December 31, 2024 we had 12,500 full-time employees.\n\nOur culture values safety.\n",
+    "Debt\n\nThe notes mature in 2029. Scheduled maturities of long-term debt total $1,234.5 million.\n",
+]
+
+
+def test_tokenize_folds_plurals_and_keeps_numbers():
+    assert tokenize("How many employees?") == ["employee"]
+    assert tokenize("Debt maturities of $1,234.5 million") == ["debt", "maturity", "1,234.5", "million"]
+    assert tokenize("num_employees") == ["num", "employee"]
+
+
+def test_chunks_stay_on_one_page_and_split_long_paragraphs():
+    pages = ["short\n\n" + "line of text\n" * 50, "next page"]
+    chunks = chunk_pages(pages, max_chars=100)
+    assert {c.page for c in chunks} == {0, 1}
+    assert all(c.end - c.start <= 100 for c in chunks)
+    assert all(pages[c.page][c.start:c.end].strip() for c in chunks)
+    # Chunks cover the page text in order without overlap
+    page0 = [c for c in chunks if c.page == 0]
+    assert all(a.end <= b.start for a, b in zip(page0, page0[1:]))
+
+
+def test_search_ranks_the_matching_chunk_first():
+    index = RetrievalIndex.build(PAGES, max_chars=200)
+    (score, cid), *_ = index.search("How many employees did the company have?")
+    assert score > 0
+    assert index.chunks[cid].page == 1
+    assert index.search("nothing relevant here xyzzy") == []
+
+
+def test_index_round_trips_through_json():
+    index = RetrievalIndex.build(PAGES)
+    restored = RetrievalIndex.from_json(json.loads(json.dumps(index.to_json())))
+    assert restored.chunks == index.chunks
+    assert restored.search("debt maturities") == index.search("debt maturities")
+    assert RetrievalIndex.from_json({**index.to_json(), "version": "old"}) is None
+
+
+def test_retrieve_returns_hits_in_page_order():
+    document = FilingDocument(pages=PAGES)
+    hits = retrieve(document, "widgets employees debt maturities", k=3)
+    assert [chunk.page for chunk, _, _ in hits] == sorted(chunk.page for chunk, _, _ in hits)
+    assert any("12,500 full-time employees" in text for _, text, _ in hits)
+    assert document.retrieval_index is not None
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+for module in ("pydantic", "tenacity", "dotenv"):
+    pytest.importorskip(module)
+
+import summarizer  # noqa: E402
+
+
+def test_pack_texts_respects_budget_and_filing_limit():
+    assert summarizer.pack_texts([400, 400, 400, 900, 100], token_budget=1000, max_filings=8) == [[0, 1], [2], [3, 4]]
+    assert summarizer.pack_texts([10] * 5, token_budget=1000, max_filings=2) == [[0, 1], [2, 3], [4]]
+    # A filing over the budget still gets a pack of its own
+    assert summarizer.pack_texts([5000, 10], token_budget=1000, max_filings=8) == [[0], [1]]
+    assert summarizer.pack_texts([]) == []
+
+
+def test_split_pack_response_matches_ids_and_skips_bad_entries():
+    response = json.dumps({"reports": [
+        {"document_id": "D2", "company_name": "Beta Inc", "impact": "Low"},
+        {"document_id": "<<<DOCUMENT D1>>>", "company_name": "Alpha Corp", "event_description": "CEO resigned"},
+        {"document_id": "D1", "company_name": "Duplicate"},
+        {"document_id": "D9", "company_name": "Not in this pack"},
+        {"document_id": "D3"},
+        {"document_id": "D3", "filing_date": "not a date"},
+    ]})
+    found = summarizer.split_pack_response(response, ["D1", "D2", "D3"])
+    assert sorted(found) == ["D1", "D2"]
+    assert found["D1"].company_name == "Alpha Corp"
+    assert found["D2"].company_name == "Beta Inc"
+    assert isinstance(found["D1"], summarizer.EightKReport)
+    assert not isinstance(found["D1"], summarizer.PackedEightKReport)
+
+
+def test_split_pack_response_tolerates_broken_json():
+    assert summarizer.split_pack_response("not json", ["D1"]) == {}
+    assert summarizer.split_pack_response(json.dumps({"reports": "nope"}), ["D1"]) == {}
+
+
+def test_fake_backend_answers_in_the_requested_schema():
+    backend = summarizer.llm.FakeBackend()
+    config = summarizer.llm.json_config(summarizer.FilingAnswer)
+    answer = summarizer.FilingAnswer.model_validate_json(
+        backend.generate("fake", "Question: revenue?\n\nExcerpts:\n[Page 12]\nRevenue was $5 million.", config, 1))
+    assert answer.found and answer.pages == [12] and answer.answer
+    missing = summarizer.FilingAnswer.model_validate_json(backend.generate("fake", "Excerpts:\n", config, 1))
+    assert missing.found is False
+
+    ek = summarizer.EightKReport.model_validate_json(
+        backend.generate("fake", "any prompt", summarizer.llm.json_config(summarizer.EightKReport), 1))
+    assert ek.event_description
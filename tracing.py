@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import cancellation
+
+
+# TRACE_EXPORT: comma separated exporters, e.g. "jsonl:traces.jsonl,prometheus:metrics.prom".
+# Unset means tracing is a no-op.
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+
+# Span attributes that are summed into Prometheus counters
+NUMERIC_ATTRS = ("bytes_in", "bytes_out", "pages", "prompt_tokens", "response_tokens", "cache_hit")
+
+
+@dataclass
+class Span:
+    name: str
+    start: float = field(default_factory=time.time)
+    duration: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    # Shared by every span when nothing is exported, so instrumentation costs one call
+
+    __slots__ = ()
+    attrs: Dict[str, Any] = {}
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+# Exporters
+# ------------------------------
+class Exporter:
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlExporter(Exporter):
+    # One JSON object per finished span, appended to `path`
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        record = {"name": span.name, "start": round(span.start, 6), "duration": round(span.duration, 6),
+                  **span.attrs}
+        if span.error:
+            record["error"] = span.error
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusExporter(Exporter):
+    # Aggregates spans per stage and rewrites `path` in the Prometheus text format
+    # (for node_exporter's textfile collector or a scrape endpoint via render()).
+
+    PREFIX = "report_stage"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._count: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._seconds: Dict[str, float] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._count[span.name] = self._count.get(span.name, 0) + 1
+            self._seconds[span.name] = self._seconds.get(span.name, 0.0) + span.duration
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            totals = self._totals.setdefault(span.name, {})
+            for key in NUMERIC_ATTRS:
+                value = span.attrs.get(key)
+                if isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0.0) + float(value)
+            text = self._render()
+        if self.path is not None:
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, self.path)
+
+    def _render(self) -> str:
+        p = self.PREFIX
+        lines = [f"# TYPE {p}_calls_total counter"]
+        lines += [f'{p}_calls_total{{stage="{s}"}} {n}' for s, n in sorted(self._count.items())]
+        lines.append(f"# TYPE {p}_seconds_total counter")
+        lines += [f'{p}_seconds_total{{stage="{s}"}} {v:.6f}' for s, v in sorted(self._seconds.items())]
+        lines.append(f"# TYPE {p}_errors_total counter")
+        lines += [f'{p}_errors_total{{stage="{s}"}} {self._errors.get(s, 0)}' for s in sorted(self._count)]
+        for key in NUMERIC_ATTRS:
+            rows = [(s, t[key]) for s, t in sorted(self._totals.items()) if key in t]
+            if rows:
+                lines.append(f"# TYPE {p}_{key}_total counter")
+                lines += [f'{p}_{key}_total{{stage="{s}"}} {v:g}' for s, v in rows]
+        return "\n".join(lines) + "\n"
+
+    def render(self) -> str:
+        with self._lock:
+            return self._render()
+
+
+# Tracer
+# ------------------------------
+class Tracer:
+    def __init__(self, exporters: Optional[List[Exporter]] = None):
+        self.exporters = list(exporters or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def span(self, name: str, **attrs):
+        # Disabled tracing hands back the shared no-op span (no generator, no timing)
+        if not self.exporters:
+            return _NOOP
+        return self._span(name, attrs)
+
+    @contextmanager
+    def _span(self, name: str, attrs: Dict[str, Any]):
+        span = Span(name, attrs=attrs)
+        t = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - t
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception as e:
+                    print(f"Trace export error: {e}")
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            exporter.close()
+
+
+def exporters_from_spec(spec: str) -> List[Exporter]:
+    exporters: List[Exporter] = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        kind, _, path = item.partition(":")
+        if kind == "jsonl":
+            exporters.append(JsonlExporter(path or "traces.jsonl"))
+        elif kind == "prometheus":
+            exporters.append(PrometheusExporter(path or None))
+        else:
+            print(f"Unknown trace exporter: {kind}")
+    return exporters
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(exporters_from_spec(TRACE_EXPORT))
+    return _tracer
+
+
+def set_exporters(exporters: Optional[List[Exporter]]) -> None:
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(exporters)
+
+
+def span(name: str, **attrs):
+    # `with tracing.span("generate", model=m) as s: ...; s.set(response_tokens=n)`
+    # Every traced stage is also a cancellation checkpoint / progress event for queued jobs
+    cancellation.checkpoint(name)
+    return get_tracer().span(name, **attrs)